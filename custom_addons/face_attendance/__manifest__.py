@@ -1,10 +1,11 @@
 {
     "name": "Face Attendance",
-    "version": "1.0.4",
+    "version": "1.0.12",
     "category": "Human Resources",
     "summary": "Face login and face embedding registration for employees",
     "depends": ["base", "web", "hr_attendance"],
     "data": [
+        "data/hr_attendance_cron.xml",
         "views/login_templates.xml",
         "views/hr_employee_views.xml",
         "views/hr_attendance_views.xml",
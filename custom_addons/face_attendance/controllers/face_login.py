@@ -2,6 +2,8 @@ from odoo import http
 from odoo.addons.web.controllers.utils import ensure_db
 from odoo.http import request
 
+from ..grpc.tracing import start_trace
+
 
 class RespFaceLoginController(http.Controller):
     @http.route(
@@ -12,6 +14,10 @@ class RespFaceLoginController(http.Controller):
         csrf=True,
     )
     def verify_face_login(self, **kwargs):
+        with start_trace("face_login.verify", request.httprequest.headers.get("traceparent")):
+            return self._verify_face_login()
+
+    def _verify_face_login(self):
         ensure_db()
         users = request.env["res.users"].sudo()
         if not users._face_scan_registered_employees():
@@ -33,3 +39,37 @@ class RespFaceLoginController(http.Controller):
                 upload.content_type or "video/webm",
             )
         )
+
+    @http.route(
+        "/resp_face_attendance/face_login/verify_frames",
+        type="http",
+        auth="public",
+        methods=["POST"],
+        csrf=True,
+    )
+    def verify_face_login_frames(self, **kwargs):
+        with start_trace("face_login.verify_frames", request.httprequest.headers.get("traceparent")):
+            return self._verify_face_login_frames()
+
+    def _verify_face_login_frames(self):
+        ensure_db()
+        users = request.env["res.users"].sudo()
+        if not users._face_scan_registered_employees():
+            return request.make_json_response({
+                "ok": False,
+                "message": "No registered face profiles are available from this network.",
+            })
+
+        uploads = request.httprequest.files.getlist("face_frames")
+        if not uploads:
+            return request.make_json_response({
+                "ok": False,
+                "message": "No verification frames received.",
+            })
+
+        return request.make_json_response(
+            users.verify_face_scan_frames(
+                [upload.read() for upload in uploads],
+                uploads[0].content_type or "image/jpeg",
+            )
+        )
@@ -0,0 +1,37 @@
+"""Packed embedding encodings shared with the face AI service.
+
+``int8`` payloads start with a little-endian float32 scale followed by one
+signed byte per dimension; ``float16`` and ``float32`` are plain
+little-endian arrays.
+"""
+import struct
+
+FLOAT32 = "float32"
+FLOAT16 = "float16"
+INT8 = "int8"
+ENCODINGS = (FLOAT32, FLOAT16, INT8)
+_FORMATS = {FLOAT32: "f", FLOAT16: "e", INT8: "b"}
+_SCALE_BYTES = 4
+
+
+def encode_embedding(values, encoding=FLOAT16):
+    values = [float(value) for value in values]
+    if encoding == INT8:
+        peak = max((abs(value) for value in values), default=0.0)
+        scale = peak / 127.0 if peak > 0 else 1.0
+        quantized = [max(-127, min(127, round(value / scale))) for value in values]
+        return struct.pack("<f", scale) + struct.pack("<%db" % len(quantized), *quantized)
+    if encoding not in _FORMATS:
+        raise ValueError("Unsupported embedding encoding: %s" % encoding)
+    return struct.pack("<%d%s" % (len(values), _FORMATS[encoding]), *values)
+
+
+def decode_embedding(packed, encoding):
+    if encoding == INT8:
+        scale = struct.unpack("<f", packed[:_SCALE_BYTES])[0]
+        body = packed[_SCALE_BYTES:]
+        return [value * scale for value in struct.unpack("<%db" % len(body), body)]
+    if encoding not in _FORMATS:
+        raise ValueError("Unsupported embedding encoding: %s" % encoding)
+    size = struct.calcsize("<" + _FORMATS[encoding])
+    return list(struct.unpack("<%d%s" % (len(packed) // size, _FORMATS[encoding]), packed))
@@ -1,41 +1,254 @@
+import itertools
+import queue
+import re
+import threading
+import time
+
 import grpc
 
 from . import face_recognition_pb2 as pb2
 from . import face_recognition_pb2_grpc as pb2_grpc
+from .tracing import current_traceparent, span
 
+EJECT_SECONDS = 30
+MAX_ATTEMPTS = 3
+RETRYABLE_CODES = (
+    grpc.StatusCode.UNAVAILABLE,
+    grpc.StatusCode.DEADLINE_EXCEEDED,
+    grpc.StatusCode.RESOURCE_EXHAUSTED,
+)
+CHANNEL_OPTIONS = [
+    # Spreads calls over every address a DNS name resolves to.
+    ("grpc.lb_policy_name", "round_robin"),
+    ("grpc.max_send_message_length", 64 * 1024 * 1024),
+    ("grpc.max_receive_message_length", 64 * 1024 * 1024),
+]
 
-class FaceAiClient:
-    def __init__(self, target, timeout=15):
+_backends = {}
+_backends_lock = threading.Lock()
+_round_robin = itertools.count()
+
+
+def parse_targets(value):
+    if isinstance(value, (list, tuple)):
+        tokens = value
+    else:
+        tokens = re.split(r"[\s,;]+", value or "")
+    targets = []
+    for token in tokens:
+        token = (token or "").strip()
+        if token and token not in targets:
+            targets.append(token)
+    return targets
+
+
+class _Backend:
+    def __init__(self, target):
         self.target = target
+        self.channel = grpc.insecure_channel(target, options=CHANNEL_OPTIONS)
+        self.stub = pb2_grpc.FaceRecognitionStub(self.channel)
+        self.outstanding = 0
+        self.ejected_until = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def healthy(self):
+        return self.ejected_until <= time.monotonic()
+
+    def acquire(self):
+        with self._lock:
+            self.outstanding += 1
+
+    def release(self):
+        with self._lock:
+            self.outstanding = max(0, self.outstanding - 1)
+
+    def eject(self):
+        self.ejected_until = time.monotonic() + EJECT_SECONDS
+
+    def restore(self):
+        self.ejected_until = 0.0
+
+
+def _backend(target):
+    with _backends_lock:
+        if target not in _backends:
+            _backends[target] = _Backend(target)
+        return _backends[target]
+
+
+class FaceAiClient:
+    def __init__(self, target, timeout=15, hedge_delay=None):
+        self.targets = parse_targets(target)
+        self.target = ",".join(self.targets)
         self.timeout = timeout
+        self.hedge_delay = hedge_delay
 
     def register_face(self, employee_id, image_bytes, image_mime="image/png"):
-        with grpc.insecure_channel(self.target) as channel:
-            stub = pb2_grpc.FaceRecognitionStub(channel)
-            return stub.RegisterFace(
-                pb2.RegisterFaceRequest(
-                    employee_id=int(employee_id),
-                    image_bytes=image_bytes,
-                    image_mime=image_mime or "image/png",
-                ),
-                timeout=self.timeout,
+        return self._call_with_failover(
+            "RegisterFace",
+            pb2.RegisterFaceRequest(
+                employee_id=int(employee_id),
+                image_bytes=image_bytes,
+                image_mime=image_mime or "image/png",
+            ),
+        )
+
+    def register_faces(self, items, timeout=None):
+        # Kept by employee so a retried stream resends only the unanswered ones.
+        pending = {
+            int(employee_id): pb2.RegisterFaceRequest(
+                employee_id=int(employee_id),
+                image_bytes=image_bytes,
+                image_mime=image_mime or "image/png",
             )
+            for employee_id, image_bytes, image_mime in items
+        }
+        last_error = None
+        for backend in self._ordered_backends()[:MAX_ATTEMPTS]:
+            if not pending:
+                return
+            requests = list(pending.values())
+            backend.acquire()
+            try:
+                for response in backend.stub.RegisterFaces(iter(requests), timeout=timeout, metadata=self._metadata()):
+                    pending.pop(int(response.employee_id), None)
+                    yield response
+            except grpc.RpcError as exc:
+                if exc.code() not in RETRYABLE_CODES:
+                    raise
+                backend.eject()
+                last_error = exc
+                continue
+            finally:
+                backend.release()
+            backend.restore()
+            return
+        if last_error is not None:
+            raise last_error
 
-    def analyze_face(self, video_bytes, video_mime, candidates, max_frames=7):
+    def analyze_face(self, video_bytes, video_mime, candidates, max_frames=7, verbosity="", top_k=0):
         request = pb2.AnalyzeFaceRequest(
             video_bytes=video_bytes,
             video_mime=video_mime or "video/webm",
             max_frames=int(max_frames or 7),
+            verbosity=verbosity or "",
+            top_k=int(top_k or 0),
         )
-        for candidate in candidates:
-            request.candidates.append(
-                pb2.Candidate(
-                    user_id=int(candidate["user_id"]),
-                    employee_id=int(candidate["employee_id"]),
-                    registered_embedding=[float(value) for value in candidate["registered_embedding"]],
-                    threshold=float(candidate["threshold"]),
-                )
-            )
-        with grpc.insecure_channel(self.target) as channel:
-            stub = pb2_grpc.FaceRecognitionStub(channel)
-            return stub.AnalyzeFace(request, timeout=self.timeout)
+        request.candidates.extend(self._candidate_message(candidate) for candidate in candidates)
+        return self._call_hedged("AnalyzeFace", request)
+
+    def analyze_face_frames(self, frames, frame_mime, candidates, max_frames=7, verbosity="", top_k=0):
+        request = pb2.AnalyzeFaceFramesRequest(
+            frames=list(frames),
+            frame_mime=frame_mime or "image/jpeg",
+            max_frames=int(max_frames or 7),
+            verbosity=verbosity or "",
+            top_k=int(top_k or 0),
+        )
+        request.candidates.extend(self._candidate_message(candidate) for candidate in candidates)
+        return self._call_hedged("AnalyzeFaceFrames", request)
+
+    def _ordered_backends(self):
+        if not self.targets:
+            raise ValueError("No face AI gRPC target is configured.")
+        backends = [_backend(target) for target in self.targets]
+        offset = next(_round_robin) % len(backends)
+        backends = backends[offset:] + backends[:offset]
+        healthy = [backend for backend in backends if backend.healthy]
+        ejected = [backend for backend in backends if not backend.healthy]
+        return sorted(healthy, key=lambda backend: backend.outstanding) + ejected
+
+    @staticmethod
+    def _metadata():
+        traceparent = current_traceparent()
+        return (("traceparent", traceparent),) if traceparent else None
+
+    def _call_with_failover(self, method, request):
+        with span("face_ai." + method, targets=self.target):
+            return self._call_with_failover_untraced(method, request)
+
+    def _call_with_failover_untraced(self, method, request):
+        last_error = None
+        for backend in self._ordered_backends()[:MAX_ATTEMPTS]:
+            backend.acquire()
+            try:
+                response = getattr(backend.stub, method)(request, timeout=self.timeout, metadata=self._metadata())
+            except grpc.RpcError as exc:
+                if exc.code() not in RETRYABLE_CODES:
+                    raise
+                backend.eject()
+                last_error = exc
+                continue
+            finally:
+                backend.release()
+            backend.restore()
+            return response
+        raise last_error
+
+    def _call_hedged(self, method, request):
+        with span("face_ai." + method, targets=self.target):
+            return self._call_hedged_untraced(method, request)
+
+    def _call_hedged_untraced(self, method, request):
+        backends = self._ordered_backends()[:MAX_ATTEMPTS]
+        metadata = self._metadata()
+        completed = queue.Queue()
+        pending = {}
+
+        def start(backend):
+            backend.acquire()
+            future = getattr(backend.stub, method).future(request, timeout=self.timeout, metadata=metadata)
+            pending[future] = backend
+
+            def on_done(done):
+                backend.release()
+                completed.put(done)
+
+            future.add_done_callback(on_done)
+
+        start(backends.pop(0))
+        deadline = time.monotonic() + self.timeout
+        last_error = None
+        try:
+            while pending:
+                remaining = max(0.0, deadline - time.monotonic())
+                can_hedge = bool(backends and self.hedge_delay)
+                try:
+                    future = completed.get(timeout=min(remaining, self.hedge_delay) if can_hedge else remaining)
+                except queue.Empty:
+                    if not can_hedge or time.monotonic() >= deadline:
+                        break
+                    start(backends.pop(0))
+                    continue
+                backend = pending.pop(future)
+                error = future.exception()
+                if error is None:
+                    backend.restore()
+                    return future.result()
+                if error.code() not in RETRYABLE_CODES:
+                    raise error
+                backend.eject()
+                last_error = error
+                if not pending and backends:
+                    start(backends.pop(0))
+        finally:
+            for future in pending:
+                future.cancel()
+        if last_error is not None:
+            raise last_error
+        raise TimeoutError("Face AI %s did not complete within %ss." % (method, self.timeout))
+
+    @staticmethod
+    def _candidate_message(candidate):
+        message = pb2.Candidate(
+            user_id=int(candidate["user_id"]),
+            employee_id=int(candidate["employee_id"]),
+            threshold=float(candidate["threshold"]),
+        )
+        if candidate.get("packed_embedding"):
+            message.embedding_encoding = candidate["embedding_encoding"]
+            message.packed_embedding = candidate["packed_embedding"]
+        else:
+            message.registered_embedding.extend(float(value) for value in candidate["registered_embedding"])
+        return message
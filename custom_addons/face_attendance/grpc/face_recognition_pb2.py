@@ -37,6 +37,8 @@ def _build_file():
     _field(msg, "employee_id", 2, 3)
     _field(msg, "registered_embedding", 3, 2, label=3)
     _field(msg, "threshold", 4, 2)
+    _field(msg, "embedding_encoding", 5, 9)
+    _field(msg, "packed_embedding", 6, 12)
 
     msg = file_proto.message_type.add()
     msg.name = "CandidateSimilarity"
@@ -62,6 +64,10 @@ def _build_file():
     _field(msg, "spoofing_detected", 4, 8)
     _field(msg, "error_code", 5, 9)
     _field(msg, "similarity_by_candidate", 6, 11, label=3, type_name=".resp.face.CandidateSimilarity")
+    _field(msg, "skip_reasons", 7, 9, label=3)
+    _field(msg, "blur_score", 8, 2)
+    _field(msg, "brightness_score", 9, 2)
+    _field(msg, "spoofing_checked", 10, 8)
 
     msg = file_proto.message_type.add()
     msg.name = "RegisterFaceRequest"
@@ -81,6 +87,7 @@ def _build_file():
     _field(msg, "face_box", 8, 11, type_name=".resp.face.FaceBox")
     _field(msg, "blur_score", 9, 2)
     _field(msg, "brightness_score", 10, 2)
+    _field(msg, "employee_id", 11, 3)
 
     msg = file_proto.message_type.add()
     msg.name = "AnalyzeFaceRequest"
@@ -88,6 +95,17 @@ def _build_file():
     _field(msg, "video_mime", 2, 9)
     _field(msg, "max_frames", 3, 5)
     _field(msg, "candidates", 4, 11, label=3, type_name=".resp.face.Candidate")
+    _field(msg, "verbosity", 5, 9)
+    _field(msg, "top_k", 6, 5)
+
+    msg = file_proto.message_type.add()
+    msg.name = "AnalyzeFaceFramesRequest"
+    _field(msg, "frames", 1, 12, label=3)
+    _field(msg, "frame_mime", 2, 9)
+    _field(msg, "max_frames", 3, 5)
+    _field(msg, "candidates", 4, 11, label=3, type_name=".resp.face.Candidate")
+    _field(msg, "verbosity", 5, 9)
+    _field(msg, "top_k", 6, 5)
 
     msg = file_proto.message_type.add()
     msg.name = "AnalyzeFaceResponse"
@@ -117,6 +135,16 @@ def _build_file():
     method.name = "AnalyzeFace"
     method.input_type = ".resp.face.AnalyzeFaceRequest"
     method.output_type = ".resp.face.AnalyzeFaceResponse"
+    method = service.method.add()
+    method.name = "RegisterFaces"
+    method.input_type = ".resp.face.RegisterFaceRequest"
+    method.output_type = ".resp.face.RegisterFaceResponse"
+    method.client_streaming = True
+    method.server_streaming = True
+    method = service.method.add()
+    method.name = "AnalyzeFaceFrames"
+    method.input_type = ".resp.face.AnalyzeFaceFramesRequest"
+    method.output_type = ".resp.face.AnalyzeFaceResponse"
     return file_proto
 
 
@@ -145,4 +173,5 @@ FrameMetrics = _message_class("FrameMetrics")
 RegisterFaceRequest = _message_class("RegisterFaceRequest")
 RegisterFaceResponse = _message_class("RegisterFaceResponse")
 AnalyzeFaceRequest = _message_class("AnalyzeFaceRequest")
+AnalyzeFaceFramesRequest = _message_class("AnalyzeFaceFramesRequest")
 AnalyzeFaceResponse = _message_class("AnalyzeFaceResponse")
@@ -16,3 +16,13 @@ class FaceRecognitionStub:
             request_serializer=face__recognition__pb2.AnalyzeFaceRequest.SerializeToString,
             response_deserializer=face__recognition__pb2.AnalyzeFaceResponse.FromString,
         )
+        self.RegisterFaces = channel.stream_stream(
+            "/resp.face.FaceRecognition/RegisterFaces",
+            request_serializer=face__recognition__pb2.RegisterFaceRequest.SerializeToString,
+            response_deserializer=face__recognition__pb2.RegisterFaceResponse.FromString,
+        )
+        self.AnalyzeFaceFrames = channel.unary_unary(
+            "/resp.face.FaceRecognition/AnalyzeFaceFrames",
+            request_serializer=face__recognition__pb2.AnalyzeFaceFramesRequest.SerializeToString,
+            response_deserializer=face__recognition__pb2.AnalyzeFaceResponse.FromString,
+        )
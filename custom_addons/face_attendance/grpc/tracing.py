@@ -0,0 +1,161 @@
+"""Minimal W3C trace-context spans shared with the Odoo addon.
+
+A trace is opened with ``start_trace`` (continuing an incoming
+``traceparent`` when there is one) and nested work is wrapped in ``span``.
+Finished traces are appended as JSON lines to ``TRACE_FILE`` and/or posted
+as OTLP/HTTP JSON to ``TRACE_OTLP_ENDPOINT``. Outside an open trace,
+``span`` does nothing.
+"""
+import contextlib
+import contextvars
+import json
+import logging
+import os
+import re
+import threading
+import time
+import urllib.request
+
+TRACE_FILE = os.getenv("TRACE_FILE", "")
+TRACE_OTLP_ENDPOINT = os.getenv("TRACE_OTLP_ENDPOINT", "")
+TRACE_SERVICE_NAME = os.getenv("TRACE_SERVICE_NAME", "odoo")
+_TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$")
+_current = contextvars.ContextVar("face_trace_span", default=None)
+_file_lock = threading.Lock()
+_logger = logging.getLogger(__name__)
+
+
+class Span:
+    def __init__(self, name, trace_id, parent_id=None, attributes=None, spans=None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.attributes = dict(attributes or {})
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.spans = spans if spans is not None else []
+        self.spans.append(self)
+
+    @property
+    def traceparent(self):
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def as_dict(self):
+        return {
+            "service": TRACE_SERVICE_NAME,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_span_id": self.parent_id or "",
+            "name": self.name,
+            "start_time_unix_nano": self.start_ns,
+            "end_time_unix_nano": self.end_ns,
+            "duration_ms": round((self.end_ns - self.start_ns) / 1e6, 3) if self.end_ns else None,
+            "attributes": self.attributes,
+        }
+
+
+def parse_traceparent(value):
+    match = _TRACEPARENT.match((value or "").strip().lower())
+    if not match or set(match.group(1)) == {"0"}:
+        return None, None
+    return match.group(1), match.group(2)
+
+
+def current_span():
+    return _current.get()
+
+
+def current_traceparent():
+    span = _current.get()
+    return span.traceparent if span is not None else None
+
+
+@contextlib.contextmanager
+def start_trace(name, traceparent=None, **attributes):
+    trace_id, parent_id = parse_traceparent(traceparent)
+    root = Span(name, trace_id or os.urandom(16).hex(), parent_id, attributes)
+    token = _current.set(root)
+    try:
+        yield root
+    finally:
+        root.end_ns = time.time_ns()
+        _current.reset(token)
+        _export(root.spans)
+
+
+@contextlib.contextmanager
+def span(name, **attributes):
+    parent = _current.get()
+    if parent is None:
+        yield None
+        return
+    child = Span(name, parent.trace_id, parent.span_id, attributes, parent.spans)
+    token = _current.set(child)
+    try:
+        yield child
+    finally:
+        child.end_ns = time.time_ns()
+        _current.reset(token)
+
+
+def _export(spans):
+    if not TRACE_FILE and not TRACE_OTLP_ENDPOINT:
+        return
+    records = [item.as_dict() for item in spans if item.end_ns]
+    if TRACE_FILE:
+        try:
+            with _file_lock, open(TRACE_FILE, "a") as handle:
+                for record in records:
+                    handle.write(json.dumps(record, default=str) + "\n")
+        except OSError as exc:
+            _logger.error("TRACE_FILE_WRITE_FAILED: %s", exc)
+    if TRACE_OTLP_ENDPOINT:
+        threading.Thread(target=_post_otlp, args=(records,), daemon=True).start()
+
+
+def _post_otlp(records):
+    payload = {
+        "resourceSpans": [{
+            "resource": {"attributes": [_otlp_attribute("service.name", TRACE_SERVICE_NAME)]},
+            "scopeSpans": [{
+                "scope": {"name": "face_attendance.tracing"},
+                "spans": [
+                    {
+                        "traceId": record["trace_id"],
+                        "spanId": record["span_id"],
+                        "parentSpanId": record["parent_span_id"],
+                        "name": record["name"],
+                        "kind": 1,
+                        "startTimeUnixNano": str(record["start_time_unix_nano"]),
+                        "endTimeUnixNano": str(record["end_time_unix_nano"]),
+                        "attributes": [_otlp_attribute(key, value) for key, value in record["attributes"].items()],
+                    }
+                    for record in records
+                ],
+            }],
+        }],
+    }
+    try:
+        request = urllib.request.Request(
+            TRACE_OTLP_ENDPOINT,
+            data=json.dumps(payload).encode(),
+            headers={"Content-Type": "application/json"},
+            method="POST",
+        )
+        urllib.request.urlopen(request, timeout=5).close()
+    except Exception as exc:
+        _logger.warning("TRACE_OTLP_EXPORT_FAILED: %s", exc)
+
+
+def _otlp_attribute(key, value):
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
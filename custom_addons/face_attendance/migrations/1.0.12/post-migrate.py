@@ -0,0 +1,13 @@
+from odoo import SUPERUSER_ID, api
+
+
+def migrate(cr, version):
+    # 1.0.11 fixed the channel order and 1.0.12 unified the recognizer path,
+    # so older embeddings are stale. The upgrade must not wait on the AI
+    # service: queue the re-registration cron to run as soon as possible.
+    if not version:
+        return
+    env = api.Environment(cr, SUPERUSER_ID, {})
+    cron = env.ref("face_attendance.ir_cron_register_stale_face_embeddings", raise_if_not_found=False)
+    if cron:
+        cron._trigger()
@@ -1,4 +1,8 @@
-from odoo import fields, models
+from collections import defaultdict
+from datetime import timedelta
+
+from odoo import api, fields, models
+from odoo.tools import sql
 
 
 class HrAttendance(models.Model):
@@ -15,3 +19,41 @@ class HrAttendance(models.Model):
             "has_not_checkout": "set default",
         },
     )
+
+    def init(self):
+        super().init()
+        sql.create_index(
+            self.env.cr,
+            "hr_attendance_open_employee_check_in_index",
+            self._table,
+            ["employee_id", "check_in"],
+            where="check_out IS NULL",
+        )
+
+    def _close_stale_face_attendances(self, today_start):
+        self.write({
+            "check_out": today_start - timedelta(seconds=1),
+            "in_mode": "has_not_checkout",
+            "out_mode": "auto_check_out",
+        })
+
+    @api.model
+    def _cron_close_stale_face_attendances(self):
+        # Same scope as the check-in path: every open attendance of a
+        # face-registered employee, whatever its mode, once its day is over.
+        users = self.env["res.users"]
+        day_starts = {}
+        stale_by_day_start = defaultdict(lambda: self.browse())
+        open_attendances = self.search([
+            ("check_out", "=", False),
+            ("employee_id.is_face_registered", "=", True),
+            ("check_in", "<", fields.Datetime.now()),
+        ])
+        for attendance in open_attendances:
+            employee = attendance.employee_id
+            if employee.id not in day_starts:
+                day_starts[employee.id] = users._face_scan_employee_day_bounds(employee)[0]
+            if attendance.check_in < day_starts[employee.id]:
+                stale_by_day_start[day_starts[employee.id]] |= attendance
+        for today_start, attendances in stale_by_day_start.items():
+            attendances._close_stale_face_attendances(today_start)
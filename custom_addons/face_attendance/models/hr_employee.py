@@ -1,9 +1,19 @@
 import base64
+from collections import defaultdict
+import hashlib
 import json
 
 from odoo import api, fields, models
 
-from ..grpc.face_ai_client import FaceAiClient
+from ..grpc.embedding_codec import ENCODINGS, FLOAT16, FLOAT32, decode_embedding, encode_embedding
+
+LEGACY_EMBEDDING_VERSION = "v1"
+PACKED_EMBEDDING_VERSION_PREFIX = "v2:"
+# Suffix of model names whose embeddings match the AI service's current
+# preprocessing; keep in sync with EMBEDDING_PIPELINE in face_ai_solver/app/inference/face.py.
+FACE_EMBEDDING_PIPELINE = "p3"
+# Failures worth retrying for the same image; other error codes depend only on the image.
+TRANSIENT_REGISTER_ERRORS = ("INTERNAL_ERROR",)
 
 
 class HrEmployee(models.Model):
@@ -14,6 +24,7 @@ class HrEmployee(models.Model):
     face_embedding_dim = fields.Integer(readonly=True, groups="hr.group_hr_user")
     face_embedding_model = fields.Char(readonly=True, groups="hr.group_hr_user")
     face_embedding_version = fields.Char(readonly=True, groups="hr.group_hr_user")
+    face_image_digest = fields.Char(readonly=True, groups="hr.group_hr_user")
     face_registered_at = fields.Datetime(readonly=True, groups="hr.group_hr_user")
     face_register_status = fields.Selection(
         [
@@ -45,8 +56,7 @@ class HrEmployee(models.Model):
         return res
 
     def _face_ai_client(self):
-        company = self.company_id or self.env.company
-        return FaceAiClient(company.face_ai_grpc_target)
+        return (self.company_id or self.env.company)._face_ai_client()
 
     @staticmethod
     def _decode_binary(binary_value):
@@ -60,36 +70,48 @@ class HrEmployee(models.Model):
             return b""
 
     @staticmethod
-    def _encode_embedding(values):
-        payload = json.dumps([float(value) for value in values]).encode()
-        return base64.b64encode(payload)
+    def _encode_embedding(values, encoding=FLOAT16):
+        return base64.b64encode(encode_embedding(values, encoding))
+
+    @staticmethod
+    def _embedding_encoding(version):
+        if version and version.startswith(PACKED_EMBEDDING_VERSION_PREFIX):
+            return version[len(PACKED_EMBEDDING_VERSION_PREFIX):]
+        return ""
 
     @staticmethod
-    def decode_face_embedding(binary_value):
+    def decode_face_embedding(binary_value, version=LEGACY_EMBEDDING_VERSION):
         raw = HrEmployee._decode_binary(binary_value)
         if not raw:
             return []
         try:
+            encoding = HrEmployee._embedding_encoding(version)
+            if encoding:
+                return decode_embedding(raw, encoding)
             return [float(value) for value in json.loads(raw.decode())]
         except Exception:
             return []
 
+    def _face_embedding_payload(self):
+        """Return ``(encoding, packed_bytes)`` ready to send to the AI service."""
+        self.ensure_one()
+        encoding = self._embedding_encoding(self.face_embedding_version)
+        if encoding in ENCODINGS:
+            return encoding, self._decode_binary(self.face_embedding)
+        embedding = self.decode_face_embedding(self.face_embedding, self.face_embedding_version)
+        if not embedding:
+            return "", b""
+        return FLOAT32, encode_embedding(embedding, FLOAT32)
+
     def _register_face_from_employee_image(self):
         for employee in self.sudo():
             image_bytes = self._decode_binary(employee.image_1920)
-            if not image_bytes:
-                employee.with_context(_skip_face_registration=True).write({
-                    "is_face_registered": False,
-                    "face_register_status": "skipped",
-                    "face_register_message": "Employee has no image_1920",
-                })
+            skip_values = self._face_registration_skip_values(image_bytes)
+            if skip_values:
+                employee.with_context(_skip_face_registration=True).write(skip_values)
                 continue
-            if image_bytes.lstrip().startswith(b"<svg"):
-                employee.with_context(_skip_face_registration=True).write({
-                    "is_face_registered": False,
-                    "face_register_status": "skipped",
-                    "face_register_message": "Generated SVG avatar skipped",
-                })
+            digest = self._face_image_digest(image_bytes)
+            if employee._face_registration_is_current(digest):
                 continue
 
             try:
@@ -100,27 +122,126 @@ class HrEmployee(models.Model):
                 )
             except Exception as exc:
                 employee.with_context(_skip_face_registration=True).write({
+                    "face_image_digest": False,
                     "face_register_status": "failed",
                     "face_register_message": "AI service unavailable: %s" % exc,
                 })
                 continue
 
-            if response.status == "OK" and response.embedding:
-                employee.with_context(_skip_face_registration=True).write({
-                    "is_face_registered": True,
-                    "face_embedding": self._encode_embedding(response.embedding),
-                    "face_embedding_dim": response.embedding_dim,
-                    "face_embedding_model": response.model_name,
-                    "face_embedding_version": "v1",
-                    "face_registered_at": fields.Datetime.now(),
-                    "face_register_status": "success",
-                    "face_register_message": response.message,
-                })
-            else:
-                values = {
-                    "face_register_status": "failed",
-                    "face_register_message": response.message or response.error_code,
-                }
-                if not employee.face_embedding:
-                    values["is_face_registered"] = False
-                employee.with_context(_skip_face_registration=True).write(values)
+            employee._write_face_registration(response, digest)
+
+    def action_register_faces_bulk(self):
+        employees_by_target = defaultdict(lambda: self.env["hr.employee"])
+        images = {}
+        for employee in self.sudo():
+            image_bytes = self._decode_binary(employee.image_1920)
+            skip_values = self._face_registration_skip_values(image_bytes)
+            if skip_values:
+                employee.with_context(_skip_face_registration=True).write(skip_values)
+                continue
+            images[employee.id] = image_bytes
+            employees_by_target[employee._face_ai_client().target] |= employee
+
+        for target, employees in employees_by_target.items():
+            client = employees[:1]._face_ai_client()
+            pending = {employee.id: employee for employee in employees}
+            try:
+                responses = client.register_faces(
+                    ((employee.id, images[employee.id], "image/png") for employee in employees),
+                    timeout=client.timeout * len(employees),
+                )
+                for response in responses:
+                    employee = pending.pop(int(response.employee_id), None)
+                    if employee:
+                        employee._write_face_registration(response, self._face_image_digest(images[employee.id]))
+            except Exception as exc:
+                for employee in pending.values():
+                    employee.with_context(_skip_face_registration=True).write({
+                        "face_image_digest": False,
+                        "face_register_status": "failed",
+                        "face_register_message": "AI service unavailable: %s" % exc,
+                    })
+        return True
+
+    @staticmethod
+    def _face_registration_skip_values(image_bytes):
+        if not image_bytes:
+            return {
+                "is_face_registered": False,
+                "face_register_status": "skipped",
+                "face_register_message": "Employee has no image_1920",
+            }
+        if image_bytes.lstrip().startswith(b"<svg"):
+            return {
+                "is_face_registered": False,
+                "face_register_status": "skipped",
+                "face_register_message": "Generated SVG avatar skipped",
+            }
+        return {}
+
+    @staticmethod
+    def _face_image_digest(image_bytes):
+        return hashlib.sha256(image_bytes).hexdigest()
+
+    def _face_registration_is_current(self, digest):
+        self.ensure_one()
+        if self.face_image_digest != digest:
+            return False
+        if self.face_register_status == "failed":
+            return True
+        # An embedding from another model (or none reported yet) is stale even for the same image.
+        current_model = (self.company_id or self.env.company).face_ai_model_name
+        return (
+            self.face_register_status == "success"
+            and bool(current_model)
+            and self.face_embedding_model == current_model
+            and not self._face_embedding_is_stale()
+        )
+
+    def _face_embedding_is_stale(self):
+        self.ensure_one()
+        if not self.face_embedding:
+            return False
+        model = self.face_embedding_model or ""
+        current_model = (self.company_id or self.env.company).face_ai_model_name
+        return not model.endswith("@" + FACE_EMBEDDING_PIPELINE) or (bool(current_model) and model != current_model)
+
+    @api.model
+    def _register_stale_face_embeddings(self):
+        employees = self.sudo().search([("is_face_registered", "=", True), ("face_embedding", "!=", False)])
+        stale = employees.filtered(lambda employee: employee._face_embedding_is_stale())
+        if stale:
+            stale.action_register_faces_bulk()
+        return len(stale)
+
+    def _write_face_registration(self, response, digest):
+        self.ensure_one()
+        self.with_context(_skip_face_registration=True).write(self._face_registration_values(response, digest))
+        company = self.company_id or self.env.company
+        if response.status == "OK" and response.model_name and company.face_ai_model_name != response.model_name:
+            company.sudo().face_ai_model_name = response.model_name
+
+    def _face_registration_values(self, response, digest):
+        self.ensure_one()
+        if response.status == "OK" and response.embedding:
+            encoding = (self.company_id or self.env.company).face_embedding_precision or FLOAT16
+            return {
+                "is_face_registered": True,
+                "face_image_digest": digest,
+                "face_embedding": self._encode_embedding(response.embedding, encoding),
+                "face_embedding_dim": response.embedding_dim,
+                "face_embedding_model": response.model_name,
+                "face_embedding_version": PACKED_EMBEDDING_VERSION_PREFIX + encoding,
+                "face_registered_at": fields.Datetime.now(),
+                "face_register_status": "success",
+                "face_register_message": response.message,
+            }
+        values = {
+            # A transient failure must not mark this image as handled, or it is never retried.
+            "face_image_digest": False if response.error_code in TRANSIENT_REGISTER_ERRORS else digest,
+            "face_register_status": "failed",
+            "face_register_message": response.message or response.error_code,
+        }
+        if not self.face_embedding:
+            values["is_face_registered"] = False
+        return values
@@ -5,12 +5,26 @@ import re
 from odoo import fields, models
 from odoo.http import request
 
+from ..grpc.face_ai_client import FaceAiClient, parse_targets
+
 
 class ResCompany(models.Model):
     _inherit = "res.company"
 
     face_ai_grpc_target = fields.Char(default=lambda self: os.getenv("FACE_AI_GRPC_TARGET", "localhost:50051"))
+    face_ai_hedge_delay_ms = fields.Integer(default=1500)
     face_default_threshold = fields.Float(default=0.5)
+    # Model name the AI service reported with its latest successful registration.
+    face_ai_model_name = fields.Char(readonly=True)
+    face_embedding_precision = fields.Selection(
+        [
+            ("float32", "Float32"),
+            ("float16", "Float16"),
+            ("int8", "Int8"),
+        ],
+        default="float16",
+        required=True,
+    )
     face_min_valid_frames = fields.Integer(default=1)
     face_max_spoofing_error_rate = fields.Float(default=0.0)
     face_max_video_size_mb = fields.Integer(default=8)
@@ -18,6 +32,13 @@ class ResCompany(models.Model):
     face_allowed_ip_list = fields.Text(default="")
     face_blocked_ip_list = fields.Text(default="")
 
+    def _face_ai_client(self, timeout=15):
+        targets = []
+        for company in self:
+            targets.extend(parse_targets(company.face_ai_grpc_target))
+        hedge_delays = [company.face_ai_hedge_delay_ms for company in self if company.face_ai_hedge_delay_ms > 0]
+        return FaceAiClient(targets, timeout=timeout, hedge_delay=min(hedge_delays) / 1000.0 if hedge_delays else None)
+
     def is_face_attendance_ip_allowed(self):
         self.ensure_one()
         if not self.face_ip_restriction_enabled:
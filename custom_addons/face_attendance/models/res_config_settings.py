@@ -5,7 +5,9 @@ class ResConfigSettings(models.TransientModel):
     _inherit = "res.config.settings"
 
     face_ai_grpc_target = fields.Char(related="company_id.face_ai_grpc_target", readonly=False)
+    face_ai_hedge_delay_ms = fields.Integer(related="company_id.face_ai_hedge_delay_ms", readonly=False)
     face_default_threshold = fields.Float(related="company_id.face_default_threshold", readonly=False)
+    face_embedding_precision = fields.Selection(related="company_id.face_embedding_precision", readonly=False)
     face_min_valid_frames = fields.Integer(related="company_id.face_min_valid_frames", readonly=False)
     face_max_spoofing_error_rate = fields.Float(related="company_id.face_max_spoofing_error_rate", readonly=False)
     face_max_video_size_mb = fields.Integer(related="company_id.face_max_video_size_mb", readonly=False)
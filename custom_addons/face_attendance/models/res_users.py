@@ -4,8 +4,13 @@ import pytz
 from odoo import api, fields, models
 from odoo.http import request
 
-from .hr_employee import HrEmployee
-from ..grpc.face_ai_client import FaceAiClient
+from ..grpc.tracing import span
+
+FACE_SCAN_MAX_FRAMES = 7
+# Candidates come back ranked by margin over their threshold, so the top two
+# are enough for _select_face_scan_match to tell a unique match from none or several.
+FACE_SCAN_VERBOSITY = "top_k"
+FACE_SCAN_TOP_K = 2
 
 
 class ResUsers(models.Model):
@@ -13,6 +18,35 @@ class ResUsers(models.Model):
 
     @api.model
     def verify_face_scan_bytes(self, video_bytes, video_mime="video/webm"):
+        return self._verify_face_scan(
+            [video_bytes] if video_bytes else [],
+            lambda client, candidates: client.analyze_face(
+                video_bytes=video_bytes,
+                video_mime=video_mime or "video/webm",
+                candidates=candidates,
+                max_frames=FACE_SCAN_MAX_FRAMES,
+                verbosity=FACE_SCAN_VERBOSITY,
+                top_k=FACE_SCAN_TOP_K,
+            ),
+        )
+
+    @api.model
+    def verify_face_scan_frames(self, frames, frame_mime="image/jpeg"):
+        frames = [frame for frame in (frames or []) if frame][:FACE_SCAN_MAX_FRAMES]
+        return self._verify_face_scan(
+            frames,
+            lambda client, candidates: client.analyze_face_frames(
+                frames=frames,
+                frame_mime=frame_mime or "image/jpeg",
+                candidates=candidates,
+                max_frames=FACE_SCAN_MAX_FRAMES,
+                verbosity=FACE_SCAN_VERBOSITY,
+                top_k=FACE_SCAN_TOP_K,
+            ),
+        )
+
+    @api.model
+    def _verify_face_scan(self, payloads, analyze):
         registered_employees = self._face_scan_registered_employees()
         if not registered_employees:
             return self._face_scan_error("No registered face profiles are available.")
@@ -20,20 +54,17 @@ class ResUsers(models.Model):
         companies = registered_employees.mapped("company_id")
         max_size = max(max(1, int(company.face_max_video_size_mb)) for company in companies) * 1024 * 1024
 
-        if not video_bytes or len(video_bytes) > max_size:
+        payload_size = sum(len(payload) for payload in payloads)
+        if not payload_size or payload_size > max_size:
             return self._face_scan_error("Invalid verification video.")
 
-        candidates = self._build_face_candidates(registered_employees)
+        with span("build_candidates", employee_count=len(registered_employees)):
+            candidates = self._build_face_candidates(registered_employees)
         if not candidates:
             return self._face_scan_error("No registered face profiles are available.")
 
         try:
-            response = FaceAiClient(self._face_scan_ai_target(companies)).analyze_face(
-                video_bytes=video_bytes,
-                video_mime=video_mime or "video/webm",
-                candidates=candidates,
-                max_frames=7,
-            )
+            response = analyze(companies._face_ai_client(), candidates)
         except Exception:
             return self._face_scan_error("Face verification service is unavailable.")
 
@@ -52,8 +83,10 @@ class ResUsers(models.Model):
         if not employee.exists() or employee.user_id != user:
             return self._face_scan_error("Unable to verify face.")
 
-        self._check_in_face_scan_employee(employee)
-        self._login_face_scan_user(user)
+        with span("attendance_write", employee_id=employee.id):
+            self._check_in_face_scan_employee(employee)
+        with span("login", user_id=user.id):
+            self._login_face_scan_user(user)
         return {
             "ok": True,
             "message": "Login successful.",
@@ -72,11 +105,6 @@ class ResUsers(models.Model):
         ])
         return employees.filtered(lambda employee: employee.company_id and employee.company_id.is_face_attendance_ip_allowed())
 
-    @api.model
-    def _face_scan_ai_target(self, companies):
-        company = companies.filtered("face_ai_grpc_target")[:1]
-        return company.face_ai_grpc_target if company else ""
-
     @api.model
     def _build_face_candidates(self, employees):
         candidates = []
@@ -84,14 +112,15 @@ class ResUsers(models.Model):
         for employee in employees:
             if not employee.user_id or employee.id in seen_employees:
                 continue
-            embedding = HrEmployee.decode_face_embedding(employee.face_embedding)
-            if not embedding:
+            encoding, packed_embedding = employee._face_embedding_payload()
+            if not packed_embedding:
                 continue
             candidates.append({
                 "user_id": employee.user_id.id,
                 "employee_id": employee.id,
                 "company_id": employee.company_id.id,
-                "registered_embedding": embedding,
+                "embedding_encoding": encoding,
+                "packed_embedding": packed_embedding,
                 "threshold": float(employee.company_id.face_default_threshold),
                 "min_valid_frames": max(1, int(employee.company_id.face_min_valid_frames)),
                 "max_spoofing_error_rate": float(employee.company_id.face_max_spoofing_error_rate),
@@ -138,17 +167,20 @@ class ResUsers(models.Model):
     @api.model
     def _check_in_face_scan_employee(self, employee):
         today_start, tomorrow_start = self._face_scan_employee_day_bounds(employee)
-        self._close_previous_day_open_face_attendances(employee, today_start)
-        open_attendance = self.env["hr.attendance"].sudo().search([
+        attendances = self.env["hr.attendance"].sudo()
+        open_attendance = attendances.search([
             ("employee_id", "=", employee.id),
             ("check_out", "=", False),
-            ("check_in", ">=", today_start),
             ("check_in", "<", tomorrow_start),
-        ], limit=1)
-        if open_attendance:
+        ], order="check_in desc", limit=1)
+        if open_attendance and open_attendance.check_in >= today_start:
             return open_attendance
 
-        return self.env["hr.attendance"].sudo().create({
+        # Stale records of face-registered employees, in any mode, are normally
+        # closed by the scheduled job; this only catches ones it has not
+        # reached yet so the new check-in stays valid.
+        open_attendance._close_stale_face_attendances(today_start)
+        return attendances.create({
             "employee_id": employee.id,
             "check_in": fields.Datetime.now(),
             "in_mode": "face_scan",
@@ -157,19 +189,6 @@ class ResUsers(models.Model):
             "note": "Checked in by face scan login.",
         })
 
-    @api.model
-    def _close_previous_day_open_face_attendances(self, employee, today_start):
-        previous_open_attendances = self.env["hr.attendance"].sudo().search([
-            ("employee_id", "=", employee.id),
-            ("check_out", "=", False),
-            ("check_in", "<", today_start),
-        ])
-        previous_open_attendances.write({
-            "check_out": today_start - timedelta(seconds=1),
-            "in_mode": "has_not_checkout",
-            "out_mode": "auto_check_out",
-        })
-
     @api.model
     def _face_scan_employee_day_bounds(self, employee):
         user_tz = pytz.timezone(employee.user_id.tz or self.env.user.tz or "UTC")
@@ -1,6 +1,12 @@
 (function () {
     "use strict";
 
+    const RECORD_DURATION_MS = 2500;
+    const FRAME_COUNT = 7;
+    const FRAME_INTERVAL_MS = RECORD_DURATION_MS / FRAME_COUNT;
+    const FRAME_MAX_SIDE = 640;
+    const FRAME_JPEG_QUALITY = 0.85;
+
     function csrfToken() {
         const input = document.querySelector("input[name='csrf_token']");
         return input ? input.value : "";
@@ -38,11 +44,47 @@
         });
     }
 
-    async function submitVideo(blob) {
-        const formData = new FormData();
+    function supportsFrameCapture() {
+        return Boolean(window.HTMLCanvasElement && HTMLCanvasElement.prototype.toBlob);
+    }
+
+    function canvasToJpeg(canvas) {
+        return new Promise((resolve, reject) => {
+            canvas.toBlob(
+                (blob) => (blob ? resolve(blob) : reject(new Error("Unable to encode face frame"))),
+                "image/jpeg",
+                FRAME_JPEG_QUALITY
+            );
+        });
+    }
+
+    function wait(durationMs) {
+        return new Promise((resolve) => window.setTimeout(resolve, durationMs));
+    }
+
+    async function captureFrames(video, count, intervalMs) {
+        const width = video.videoWidth || 640;
+        const height = video.videoHeight || 480;
+        const scale = Math.min(1, FRAME_MAX_SIDE / Math.max(width, height));
+        const canvas = document.createElement("canvas");
+        canvas.width = Math.round(width * scale);
+        canvas.height = Math.round(height * scale);
+        const context = canvas.getContext("2d");
+        const frames = [];
+        for (let index = 0; index < count; index++) {
+            if (index) {
+                await wait(intervalMs);
+            }
+            context.drawImage(video, 0, 0, canvas.width, canvas.height);
+            // toBlob snapshots the bitmap synchronously, so encoding can overlap the next capture.
+            frames.push(canvasToJpeg(canvas));
+        }
+        return Promise.all(frames);
+    }
+
+    async function postVerification(url, formData) {
         formData.append("csrf_token", csrfToken());
-        formData.append("face_video", blob, "face-login.webm");
-        const response = await fetch("/resp_face_attendance/face_login/verify", {
+        const response = await fetch(url, {
             method: "POST",
             body: formData,
             credentials: "same-origin",
@@ -53,6 +95,29 @@
         return response.json();
     }
 
+    function submitVideo(blob) {
+        const formData = new FormData();
+        formData.append("face_video", blob, "face-login.webm");
+        return postVerification("/resp_face_attendance/face_login/verify", formData);
+    }
+
+    function submitFrames(frames) {
+        const formData = new FormData();
+        frames.forEach((frame, index) => formData.append("face_frames", frame, `face-login-${index}.jpg`));
+        return postVerification("/resp_face_attendance/face_login/verify_frames", formData);
+    }
+
+    async function captureVerification(video, stream, status) {
+        if (supportsFrameCapture()) {
+            const frames = await captureFrames(video, FRAME_COUNT, FRAME_INTERVAL_MS);
+            status.textContent = "Verifying...";
+            return () => submitFrames(frames);
+        }
+        const blob = await recordVideo(stream, RECORD_DURATION_MS);
+        status.textContent = "Verifying...";
+        return () => submitVideo(blob);
+    }
+
     async function openCamera(video) {
         const stream = await navigator.mediaDevices.getUserMedia({ video: true, audio: false });
         video.srcObject = stream;
@@ -82,12 +147,11 @@
             }
             status.textContent = "Keep your face inside the frame...";
 
-            const blob = await recordVideo(stream, 2500);
-            status.textContent = "Verifying...";
+            const submit = await captureVerification(video, stream, status);
 
             let result = null;
             try {
-                result = await submitVideo(blob);
+                result = await submit();
             } catch (error) {
                 console.error("Face login verification request failed", error);
                 status.textContent = "Unable to send verification video.";
@@ -128,7 +192,7 @@
 
         if (event.target.closest(".o_resp_face_login_btn")) {
             event.preventDefault();
-            if (!navigator.mediaDevices || !window.MediaRecorder) {
+            if (!navigator.mediaDevices || !(supportsFrameCapture() || window.MediaRecorder)) {
                 window.alert("This browser does not support face scan.");
                 return;
             }
@@ -17,6 +17,16 @@ class FaceRecognitionStub:
             request_serializer=face__recognition__pb2.AnalyzeFaceRequest.SerializeToString,
             response_deserializer=face__recognition__pb2.AnalyzeFaceResponse.FromString,
         )
+        self.RegisterFaces = channel.stream_stream(
+            "/resp.face.FaceRecognition/RegisterFaces",
+            request_serializer=face__recognition__pb2.RegisterFaceRequest.SerializeToString,
+            response_deserializer=face__recognition__pb2.RegisterFaceResponse.FromString,
+        )
+        self.AnalyzeFaceFrames = channel.unary_unary(
+            "/resp.face.FaceRecognition/AnalyzeFaceFrames",
+            request_serializer=face__recognition__pb2.AnalyzeFaceFramesRequest.SerializeToString,
+            response_deserializer=face__recognition__pb2.AnalyzeFaceResponse.FromString,
+        )
 
 
 class FaceRecognitionServicer:
@@ -30,6 +40,16 @@ class FaceRecognitionServicer:
         context.set_details("Method not implemented")
         raise NotImplementedError("Method not implemented")
 
+    def RegisterFaces(self, request_iterator, context):
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details("Method not implemented")
+        raise NotImplementedError("Method not implemented")
+
+    def AnalyzeFaceFrames(self, request, context):
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details("Method not implemented")
+        raise NotImplementedError("Method not implemented")
+
 
 def add_FaceRecognitionServicer_to_server(servicer, server):
     rpc_method_handlers = {
@@ -43,6 +63,16 @@ def add_FaceRecognitionServicer_to_server(servicer, server):
             request_deserializer=face__recognition__pb2.AnalyzeFaceRequest.FromString,
             response_serializer=face__recognition__pb2.AnalyzeFaceResponse.SerializeToString,
         ),
+        "RegisterFaces": grpc.stream_stream_rpc_method_handler(
+            servicer.RegisterFaces,
+            request_deserializer=face__recognition__pb2.RegisterFaceRequest.FromString,
+            response_serializer=face__recognition__pb2.RegisterFaceResponse.SerializeToString,
+        ),
+        "AnalyzeFaceFrames": grpc.unary_unary_rpc_method_handler(
+            servicer.AnalyzeFaceFrames,
+            request_deserializer=face__recognition__pb2.AnalyzeFaceFramesRequest.FromString,
+            response_serializer=face__recognition__pb2.AnalyzeFaceResponse.SerializeToString,
+        ),
     }
     generic_handler = grpc.method_handlers_generic_handler(
         "resp.face.FaceRecognition", rpc_method_handlers
@@ -0,0 +1,112 @@
+"""Preload-then-fork gRPC workers that share model weights copy-on-write."""
+import logging
+import os
+import signal
+import time
+
+from app.grpc.server import FaceRecognitionGrpcService, create_grpc_server
+from app.inference.models import model_providers, preload_models
+from app.inference.threads import apply_thread_budget
+
+_logger = logging.getLogger(__name__)
+
+
+def memory_usage():
+    """Resident, proportional and shared memory of this process in MiB (Linux only)."""
+    usage = {}
+    try:
+        with open("/proc/self/smaps_rollup") as handle:
+            for line in handle:
+                key, _, value = line.partition(":")
+                if key in ("Rss", "Pss", "Shared_Clean", "Shared_Dirty", "Private_Clean", "Private_Dirty"):
+                    usage[key.lower() + "_mib"] = round(int(value.split()[0]) / 1024, 1)
+    except OSError:
+        pass
+    return usage
+
+
+def serve_preforked(address, worker_count, thread_budget=None):
+    started_at = time.perf_counter()
+    # Builds the inference service and loads every model before forking. No
+    # gRPC server or channel may exist in the parent, as gRPC is not fork-safe.
+    servicer = FaceRecognitionGrpcService()
+    preload_models()
+    _logger.info("AI gRPC preload finished: %s", {
+        "workers": worker_count,
+        "preload_seconds": round(time.perf_counter() - started_at, 2),
+        "memory": memory_usage(),
+        "providers": model_providers(),
+        "thread_budget": thread_budget.as_dict() if thread_budget is not None else None,
+    })
+
+    children = {}
+    stopping = False
+
+    def spawn(slot):
+        forked_at = time.perf_counter()
+        pid = os.fork()
+        if pid:
+            children[pid] = slot
+            return
+        exit_code = 0
+        try:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            _serve_worker(servicer, address, slot, forked_at, thread_budget)
+        except Exception:
+            _logger.exception("AI gRPC worker %s crashed", slot)
+            exit_code = 1
+        finally:
+            os._exit(exit_code)
+
+    def stop(signum, _frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for slot in range(worker_count):
+        spawn(slot)
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        slot = children.pop(pid, None)
+        if slot is None or stopping:
+            continue
+        _logger.error("AI gRPC worker exited, restarting: %s", {"worker": slot, "pid": pid, "status": status})
+        spawn(slot)
+
+
+def _serve_worker(servicer, address, slot, forked_at, thread_budget):
+    # Pools are sized after fork; OpenCV and torch start theirs lazily.
+    threads = apply_thread_budget(thread_budget, slot) if thread_budget is not None else None
+    server = create_grpc_server(servicer, options=[("grpc.so_reuseport", 1)])
+    server.add_insecure_port(address)
+    server.start()
+    _logger.info("AI gRPC worker started: %s", {
+        "worker": slot,
+        "pid": os.getpid(),
+        "startup_ms": round((time.perf_counter() - forked_at) * 1000, 1),
+        "memory": memory_usage(),
+        "threads": threads,
+    })
+
+    def stop(signum, _frame):
+        server.stop(grace=5)
+
+    signal.signal(signal.SIGTERM, stop)
+    server.wait_for_termination()
+    try:
+        servicer.inference.save_gallery_snapshot()
+    except Exception:
+        _logger.exception("AI gRPC worker %s could not save the gallery snapshot", slot)
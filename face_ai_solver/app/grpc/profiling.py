@@ -0,0 +1,77 @@
+"""Opt-in per-request cProfile capture for gRPC handlers."""
+import contextlib
+import cProfile
+import hmac
+import logging
+import os
+import random
+import threading
+
+PROFILE_METADATA_KEY = "x-face-ai-profile"
+PROFILING_ALLOW_METADATA = os.getenv("PROFILING_ALLOW_METADATA", "0").lower() in ("1", "true", "yes")
+PROFILING_TOKEN = os.getenv("PROFILING_TOKEN", "")
+PROFILING_SAMPLE_RATE = float(os.getenv("PROFILING_SAMPLE_RATE", "0"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "/tmp/face_ai_profiles")
+PROFILE_RING_SIZE = max(1, int(os.getenv("PROFILE_RING_SIZE", "50")))
+_ring_lock = threading.Lock()
+_logger = logging.getLogger(__name__)
+
+
+class RequestProfile:
+    def __init__(self, reason=""):
+        self.reason = reason
+        self.path = None
+
+
+def redact_profile_token(metadata):
+    if PROFILE_METADATA_KEY not in metadata:
+        return metadata
+    return {**metadata, PROFILE_METADATA_KEY: "***"}
+
+
+def profile_reason(metadata):
+    requested = metadata.get(PROFILE_METADATA_KEY)
+    if requested and PROFILING_ALLOW_METADATA:
+        if not PROFILING_TOKEN or hmac.compare_digest(str(requested), PROFILING_TOKEN):
+            return "metadata"
+    if PROFILING_SAMPLE_RATE > 0 and random.random() < PROFILING_SAMPLE_RATE:
+        return "sampled"
+    return ""
+
+
+@contextlib.contextmanager
+def request_profile(metadata, request_id, method):
+    """Profile the handler body when asked to and store it in the on-disk ring.
+
+    cProfile only sees the calling thread, so work handed to executors (the
+    RegisterFaces decode pool) shows up as waiting time.
+    """
+    profile = RequestProfile(profile_reason(metadata))
+    if not profile.reason:
+        yield profile
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profile
+    finally:
+        profiler.disable()
+        try:
+            profile.path = _write_profile(profiler, request_id, method)
+        except Exception as exc:
+            _logger.error("PROFILE_WRITE_FAILED: %s", exc)
+
+
+def _write_profile(profiler, request_id, method):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    path = os.path.join(PROFILE_DIR, f"{method}-{request_id}.prof")
+    profiler.dump_stats(path)
+    with _ring_lock:
+        profiles = sorted(
+            (entry for entry in os.scandir(PROFILE_DIR) if entry.name.endswith(".prof")),
+            key=lambda entry: entry.stat().st_mtime,
+        )
+        for entry in profiles[:-PROFILE_RING_SIZE]:
+            with contextlib.suppress(OSError):
+                os.remove(entry.path)
+    return path
@@ -5,10 +5,16 @@ import time
 import uuid
 
 import grpc
+import numpy as np
 
 from app.grpc.generated import face_recognition_pb2 as pb2
 from app.grpc.generated import face_recognition_pb2_grpc as pb2_grpc
+from app.grpc.profiling import redact_profile_token, request_profile
+from app.inference.embedding_codec import FLOAT32, decode_embedding, embedding_digest
+from app.inference.models import model_providers
 from app.inference.service import FaceInferenceService
+from app.inference.threads import GRPC_MAX_WORKERS
+from app.inference.tracing import span, start_trace
 
 _logger = logging.getLogger(__name__)
 
@@ -37,6 +43,174 @@ def _face_box_payload(face_box):
     }
 
 
+def _register_face_response(employee_id, result):
+    response = pb2.RegisterFaceResponse(
+        status=result.get("status", ""),
+        error_code=result.get("error_code", ""),
+        message=result.get("message", ""),
+        embedding=result.get("embedding", []),
+        embedding_dim=result.get("embedding_dim", 0),
+        model_name=result.get("model_name", ""),
+        face_count=result.get("face_count", 0),
+        blur_score=result.get("blur_score", 0.0),
+        brightness_score=result.get("brightness_score", 0.0),
+        employee_id=int(employee_id),
+    )
+    if result.get("face_box"):
+        response.face_box.CopyFrom(pb2.FaceBox(**result["face_box"]))
+    return response
+
+
+def _register_face_response_log_payload(response):
+    return {
+        "employee_id": response.employee_id,
+        "status": response.status,
+        "error_code": response.error_code,
+        "message": response.message,
+        "embedding_dim": response.embedding_dim,
+        "embedding": _embedding_summary(response.embedding),
+        "model_name": response.model_name,
+        "face_count": response.face_count,
+        "face_box": _face_box_payload(response.face_box) if response.HasField("face_box") else None,
+        "blur_score": response.blur_score,
+        "brightness_score": response.brightness_score,
+    }
+
+
+def _candidate_embedding(item):
+    if not item.embedding_encoding:
+        return np.asarray(item.registered_embedding, dtype=np.float32)
+    try:
+        return decode_embedding(item.packed_embedding, item.embedding_encoding)
+    except Exception as exc:
+        _logger.warning("Invalid packed embedding for employee %s: %s", item.employee_id, exc)
+        return np.zeros(0, dtype=np.float32)
+
+
+def _request_candidates(request):
+    candidates = []
+    for item in request.candidates:
+        embedding = _candidate_embedding(item)
+        candidates.append({
+            "user_id": item.user_id,
+            "employee_id": item.employee_id,
+            "registered_embedding": embedding,
+            # Hashed once here, from the bytes on the wire, for the analyze cache key.
+            "embedding_digest": (
+                embedding_digest(item.packed_embedding, item.embedding_encoding)
+                if item.embedding_encoding else embedding_digest(embedding.tobytes(), FLOAT32)
+            ),
+            "threshold": item.threshold,
+        })
+    return candidates
+
+
+def _analyze_request_log_payload(request):
+    payload = {
+        "max_frames": request.max_frames,
+        "verbosity": request.verbosity or "full",
+        "top_k": request.top_k,
+        "candidate_count": len(request.candidates),
+    }
+    if request.verbosity not in ("", "full"):
+        return payload
+    return {
+        **payload,
+        "candidates": [
+            {
+                "user_id": item.user_id,
+                "employee_id": item.employee_id,
+                "threshold": item.threshold,
+                "embedding_encoding": item.embedding_encoding or "repeated_float",
+                "embedding": (
+                    {"packed_size_bytes": len(item.packed_embedding)}
+                    if item.embedding_encoding
+                    else _embedding_summary(item.registered_embedding)
+                ),
+            }
+            for item in request.candidates
+        ],
+    }
+
+
+def _analyze_face_response(result):
+    response = pb2.AnalyzeFaceResponse(
+        status=result.get("status", ""),
+        error_code=result.get("error_code", ""),
+        message=result.get("message", ""),
+        processed_frame_count=result.get("processed_frame_count", 0),
+        valid_frame_count=result.get("valid_frame_count", 0),
+        spoofed_frame_count=result.get("spoofed_frame_count", 0),
+        spoofing_error_rate=result.get("spoofing_error_rate", 0.0),
+        best_candidate_user_id=result.get("best_candidate_user_id", 0),
+        best_candidate_employee_id=result.get("best_candidate_employee_id", 0),
+        max_similarity=result.get("max_similarity", 0.0),
+        avg_similarity=result.get("avg_similarity", 0.0),
+        min_similarity=result.get("min_similarity", 0.0),
+        best_frame_index=result.get("best_frame_index", -1),
+    )
+    response.candidates.extend(pb2.CandidateMetrics(**item) for item in result.get("candidates", []))
+    for item in result.get("frames", []):
+        item = dict(item)
+        similarities = item.pop("similarity_by_candidate", [])
+        frame = pb2.FrameMetrics(**item)
+        frame.similarity_by_candidate.extend(pb2.CandidateSimilarity(**similarity) for similarity in similarities)
+        response.frames.append(frame)
+    return response
+
+
+def _analyze_face_response_log_payload(response):
+    return {
+        "status": response.status,
+        "error_code": response.error_code,
+        "message": response.message,
+        "processed_frame_count": response.processed_frame_count,
+        "valid_frame_count": response.valid_frame_count,
+        "spoofed_frame_count": response.spoofed_frame_count,
+        "spoofing_error_rate": response.spoofing_error_rate,
+        "best_candidate_user_id": response.best_candidate_user_id,
+        "best_candidate_employee_id": response.best_candidate_employee_id,
+        "max_similarity": response.max_similarity,
+        "avg_similarity": response.avg_similarity,
+        "min_similarity": response.min_similarity,
+        "best_frame_index": response.best_frame_index,
+        "candidate_metrics": [
+            {
+                "user_id": item.user_id,
+                "employee_id": item.employee_id,
+                "threshold": item.threshold,
+                "max_similarity": item.max_similarity,
+                "avg_similarity": item.avg_similarity,
+                "min_similarity": item.min_similarity,
+                "similarity_margin": item.similarity_margin,
+            }
+            for item in response.candidates
+        ],
+        "frame_metrics": [
+            {
+                "frame_index": item.frame_index,
+                "valid": item.valid,
+                "face_count": item.face_count,
+                "spoofing_detected": item.spoofing_detected,
+                "spoofing_checked": item.spoofing_checked,
+                "error_code": item.error_code,
+                "skip_reasons": list(item.skip_reasons),
+                "blur_score": item.blur_score,
+                "brightness_score": item.brightness_score,
+                "similarity_by_candidate": [
+                    {
+                        "user_id": similarity.user_id,
+                        "employee_id": similarity.employee_id,
+                        "similarity": similarity.similarity,
+                    }
+                    for similarity in item.similarity_by_candidate
+                ],
+            }
+            for item in response.frames
+        ],
+    }
+
+
 class FaceRecognitionGrpcService(pb2_grpc.FaceRecognitionServicer):
     def __init__(self):
         self.inference = FaceInferenceService()
@@ -44,151 +218,138 @@ class FaceRecognitionGrpcService(pb2_grpc.FaceRecognitionServicer):
     def RegisterFace(self, request, context):
         request_id = uuid.uuid4().hex
         started_at = time.perf_counter()
+        metadata = _context_metadata(context)
         _logger.info("AI gRPC RegisterFace request: %s", {
             "request_id": request_id,
             "peer": context.peer(),
-            "metadata": _context_metadata(context),
+            "metadata": redact_profile_token(metadata),
             "employee_id": request.employee_id,
             "image_mime": request.image_mime,
             "image_size_bytes": len(request.image_bytes or b""),
         })
-        result = self.inference.register(request.image_bytes, request_id=request_id)
-        response = pb2.RegisterFaceResponse(
-            status=result.get("status", ""),
-            error_code=result.get("error_code", ""),
-            message=result.get("message", ""),
-            embedding=result.get("embedding", []),
-            embedding_dim=result.get("embedding_dim", 0),
-            model_name=result.get("model_name", ""),
-            face_count=result.get("face_count", 0),
-            blur_score=result.get("blur_score", 0.0),
-            brightness_score=result.get("brightness_score", 0.0),
-        )
-        if result.get("face_box"):
-            response.face_box.CopyFrom(pb2.FaceBox(**result["face_box"]))
+        with request_profile(metadata, request_id, "RegisterFace") as profile, start_trace(
+            "grpc.RegisterFace", metadata.get("traceparent"), request_id=request_id, employee_id=request.employee_id,
+        ) as trace:
+            result = self.inference.register(request.image_bytes, request_id=request_id)
+            response = _register_face_response(request.employee_id, result)
         _logger.info("AI gRPC RegisterFace response: %s", {
             "request_id": request_id,
             "peer": context.peer(),
             "duration_ms": round((time.perf_counter() - started_at) * 1000, 2),
-            "employee_id": request.employee_id,
-            "status": response.status,
-            "error_code": response.error_code,
-            "message": response.message,
-            "embedding_dim": response.embedding_dim,
-            "embedding": _embedding_summary(response.embedding),
-            "model_name": response.model_name,
-            "face_count": response.face_count,
-            "face_box": _face_box_payload(response.face_box) if response.HasField("face_box") else None,
-            "blur_score": response.blur_score,
-            "brightness_score": response.brightness_score,
+            "profile_path": profile.path,
+            "trace_id": trace.trace_id,
+            **_register_face_response_log_payload(response),
         })
         return response
 
+    def RegisterFaces(self, request_iterator, context):
+        request_id = uuid.uuid4().hex
+        started_at = time.perf_counter()
+        metadata = _context_metadata(context)
+        _logger.info("AI gRPC RegisterFaces request: %s", {
+            "request_id": request_id,
+            "peer": context.peer(),
+            "metadata": redact_profile_token(metadata),
+        })
+        items = ((request.employee_id, request.image_bytes) for request in request_iterator)
+        response_count = 0
+        with request_profile(metadata, request_id, "RegisterFaces") as profile, start_trace(
+            "grpc.RegisterFaces", metadata.get("traceparent"), request_id=request_id,
+        ) as trace:
+            for employee_id, result in self.inference.register_many(items, request_id=request_id):
+                response = _register_face_response(employee_id, result)
+                response_count += 1
+                _logger.info("AI gRPC RegisterFaces item response: %s", {
+                    "request_id": request_id,
+                    **_register_face_response_log_payload(response),
+                })
+                yield response
+        _logger.info("AI gRPC RegisterFaces response: %s", {
+            "request_id": request_id,
+            "peer": context.peer(),
+            "duration_ms": round((time.perf_counter() - started_at) * 1000, 2),
+            "profile_path": profile.path,
+            "trace_id": trace.trace_id,
+            "response_count": response_count,
+        })
+
     def AnalyzeFace(self, request, context):
         request_id = uuid.uuid4().hex
         started_at = time.perf_counter()
+        metadata = _context_metadata(context)
         _logger.info("AI gRPC AnalyzeFace request: %s", {
             "request_id": request_id,
             "peer": context.peer(),
-            "metadata": _context_metadata(context),
+            "metadata": redact_profile_token(metadata),
             "video_mime": request.video_mime,
             "video_size_bytes": len(request.video_bytes or b""),
-            "max_frames": request.max_frames,
-            "candidate_count": len(request.candidates),
-            "candidates": [
-                {
-                    "user_id": item.user_id,
-                    "employee_id": item.employee_id,
-                    "threshold": item.threshold,
-                    "embedding": _embedding_summary(item.registered_embedding),
-                }
-                for item in request.candidates
-            ],
+            **_analyze_request_log_payload(request),
         })
-        candidates = [
-            {
-                "user_id": item.user_id,
-                "employee_id": item.employee_id,
-                "registered_embedding": item.registered_embedding,
-                "threshold": item.threshold,
-            }
-            for item in request.candidates
-        ]
-        result = self.inference.analyze(request.video_bytes, candidates, request.max_frames, request_id=request_id)
-        response = pb2.AnalyzeFaceResponse(
-            status=result.get("status", ""),
-            error_code=result.get("error_code", ""),
-            message=result.get("message", ""),
-            processed_frame_count=result.get("processed_frame_count", 0),
-            valid_frame_count=result.get("valid_frame_count", 0),
-            spoofed_frame_count=result.get("spoofed_frame_count", 0),
-            spoofing_error_rate=result.get("spoofing_error_rate", 0.0),
-            best_candidate_user_id=result.get("best_candidate_user_id", 0),
-            best_candidate_employee_id=result.get("best_candidate_employee_id", 0),
-            max_similarity=result.get("max_similarity", 0.0),
-            avg_similarity=result.get("avg_similarity", 0.0),
-            min_similarity=result.get("min_similarity", 0.0),
-            best_frame_index=result.get("best_frame_index", -1),
-        )
-        response.candidates.extend(pb2.CandidateMetrics(**item) for item in result.get("candidates", []))
-        for item in result.get("frames", []):
-            item = dict(item)
-            similarities = item.pop("similarity_by_candidate", [])
-            frame = pb2.FrameMetrics(**item)
-            frame.similarity_by_candidate.extend(pb2.CandidateSimilarity(**similarity) for similarity in similarities)
-            response.frames.append(frame)
+        with request_profile(metadata, request_id, "AnalyzeFace") as profile, start_trace(
+            "grpc.AnalyzeFace", metadata.get("traceparent"), request_id=request_id,
+        ) as trace:
+            result = self.inference.analyze(
+                request.video_bytes,
+                _request_candidates(request),
+                request.max_frames,
+                request_id=request_id,
+                verbosity=request.verbosity,
+                top_k=request.top_k,
+            )
+            with span("serialization"):
+                response = _analyze_face_response(result)
         _logger.info("AI gRPC AnalyzeFace response: %s", {
             "request_id": request_id,
             "peer": context.peer(),
             "duration_ms": round((time.perf_counter() - started_at) * 1000, 2),
-            "status": response.status,
-            "error_code": response.error_code,
-            "message": response.message,
-            "processed_frame_count": response.processed_frame_count,
-            "valid_frame_count": response.valid_frame_count,
-            "spoofed_frame_count": response.spoofed_frame_count,
-            "spoofing_error_rate": response.spoofing_error_rate,
-            "best_candidate_user_id": response.best_candidate_user_id,
-            "best_candidate_employee_id": response.best_candidate_employee_id,
-            "max_similarity": response.max_similarity,
-            "avg_similarity": response.avg_similarity,
-            "min_similarity": response.min_similarity,
-            "best_frame_index": response.best_frame_index,
-            "candidate_metrics": [
-                {
-                    "user_id": item.user_id,
-                    "employee_id": item.employee_id,
-                    "threshold": item.threshold,
-                    "max_similarity": item.max_similarity,
-                    "avg_similarity": item.avg_similarity,
-                    "min_similarity": item.min_similarity,
-                    "similarity_margin": item.similarity_margin,
-                }
-                for item in response.candidates
-            ],
-            "frame_metrics": [
-                {
-                    "frame_index": item.frame_index,
-                    "valid": item.valid,
-                    "face_count": item.face_count,
-                    "spoofing_detected": item.spoofing_detected,
-                    "error_code": item.error_code,
-                    "similarity_by_candidate": [
-                        {
-                            "user_id": similarity.user_id,
-                            "employee_id": similarity.employee_id,
-                            "similarity": similarity.similarity,
-                        }
-                        for similarity in item.similarity_by_candidate
-                    ],
-                }
-                for item in response.frames
-            ],
+            "profile_path": profile.path,
+            "trace_id": trace.trace_id,
+            **_analyze_face_response_log_payload(response),
+            "analyze_cache": self.inference.analyze_cache_metrics(),
+            "providers": model_providers(),
+        })
+        return response
+
+    def AnalyzeFaceFrames(self, request, context):
+        request_id = uuid.uuid4().hex
+        started_at = time.perf_counter()
+        metadata = _context_metadata(context)
+        _logger.info("AI gRPC AnalyzeFaceFrames request: %s", {
+            "request_id": request_id,
+            "peer": context.peer(),
+            "metadata": redact_profile_token(metadata),
+            "frame_mime": request.frame_mime,
+            "frame_count": len(request.frames),
+            "frames_size_bytes": sum(len(frame) for frame in request.frames),
+            **_analyze_request_log_payload(request),
+        })
+        with request_profile(metadata, request_id, "AnalyzeFaceFrames") as profile, start_trace(
+            "grpc.AnalyzeFaceFrames", metadata.get("traceparent"), request_id=request_id,
+        ) as trace:
+            result = self.inference.analyze_frames(
+                list(request.frames),
+                _request_candidates(request),
+                request.max_frames,
+                request_id=request_id,
+                verbosity=request.verbosity,
+                top_k=request.top_k,
+            )
+            with span("serialization"):
+                response = _analyze_face_response(result)
+        _logger.info("AI gRPC AnalyzeFaceFrames response: %s", {
+            "request_id": request_id,
+            "peer": context.peer(),
+            "duration_ms": round((time.perf_counter() - started_at) * 1000, 2),
+            "profile_path": profile.path,
+            "trace_id": trace.trace_id,
+            **_analyze_face_response_log_payload(response),
+            "analyze_cache": self.inference.analyze_cache_metrics(),
+            "providers": model_providers(),
         })
         return response
 
 
-def create_grpc_server():
-    server = grpc.server(futures.ThreadPoolExecutor(max_workers=4))
-    pb2_grpc.add_FaceRecognitionServicer_to_server(FaceRecognitionGrpcService(), server)
+def create_grpc_server(servicer=None, options=None):
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=GRPC_MAX_WORKERS), options=options)
+    pb2_grpc.add_FaceRecognitionServicer_to_server(servicer or FaceRecognitionGrpcService(), server)
     return server
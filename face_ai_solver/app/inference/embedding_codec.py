@@ -0,0 +1,45 @@
+"""Packed embedding encodings shared with the Odoo addon.
+
+``int8`` payloads start with a little-endian float32 scale followed by one
+signed byte per dimension; ``float16`` and ``float32`` are plain
+little-endian arrays.
+"""
+import hashlib
+
+import numpy as np
+
+FLOAT32 = "float32"
+FLOAT16 = "float16"
+INT8 = "int8"
+ENCODINGS = (FLOAT32, FLOAT16, INT8)
+_SCALE_BYTES = 4
+
+
+def encode_embedding(values, encoding: str = FLOAT16) -> bytes:
+    vector = np.asarray(values, dtype=np.float32).ravel()
+    if encoding == FLOAT32:
+        return vector.astype("<f4").tobytes()
+    if encoding == FLOAT16:
+        return vector.astype("<f2").tobytes()
+    if encoding == INT8:
+        peak = float(np.max(np.abs(vector))) if vector.size else 0.0
+        scale = peak / 127.0 if peak > 0 else 1.0
+        quantized = np.clip(np.rint(vector / scale), -127, 127).astype(np.int8)
+        return np.asarray([scale], dtype="<f4").tobytes() + quantized.tobytes()
+    raise ValueError(f"Unsupported embedding encoding: {encoding}")
+
+
+def decode_embedding(packed: bytes, encoding: str) -> np.ndarray:
+    if encoding == FLOAT32:
+        return np.frombuffer(packed, dtype="<f4").astype(np.float32)
+    if encoding == FLOAT16:
+        return np.frombuffer(packed, dtype="<f2").astype(np.float32)
+    if encoding == INT8:
+        scale = np.frombuffer(packed[:_SCALE_BYTES], dtype="<f4")[0]
+        return np.frombuffer(packed[_SCALE_BYTES:], dtype=np.int8).astype(np.float32) * scale
+    raise ValueError(f"Unsupported embedding encoding: {encoding}")
+
+
+def embedding_digest(packed: bytes, encoding: str = FLOAT32) -> bytes:
+    """Short identity of one encoded embedding; cache keys use it instead of the vector."""
+    return hashlib.blake2b(encoding.encode() + b"\0" + packed, digest_size=8).digest()
@@ -1,25 +1,51 @@
 """Stateless face detection, alignment, embedding, and comparison."""
 import os
-from typing import Optional
+import threading
+from typing import List, Optional
 
 import cv2
 import numpy as np
 
-STANDARD_FACE_SIZE_VALUE = int(os.getenv("STANDARD_FACE_SIZE", "112"))
-STANDARD_FACE_SIZE = (STANDARD_FACE_SIZE_VALUE, STANDARD_FACE_SIZE_VALUE)
+try:
+    from insightface.app.common import Face
+    from insightface.utils import face_align
+except Exception:
+    Face = None
+    face_align = None
+
 MIN_FACE_SIZE = (int(os.getenv("MIN_FACE_WIDTH", "80")), int(os.getenv("MIN_FACE_HEIGHT", "80")))
 SCALE_FACTOR = float(os.getenv("SCALE_FACTOR", "1.05"))
 MIN_NEIGHBORS = int(os.getenv("MIN_NEIGHBORS", "6"))
 FACE_CROP_MARGIN = float(os.getenv("FACE_CROP_MARGIN", "0.15"))
-from app.inference.models import get_face_app
+# "insightface" uses the full model pack with Haar as fallback. "lite" detects
+# with Haar only; embedding still needs the model pack, since each Haar box gets
+# its landmarks from a small SCRFD pass on its crop (see _face_landmarks).
+FACE_DETECTOR = os.getenv("FACE_DETECTOR", "insightface").lower()
+# Longest image side fed to the Haar cascade; 0 (default) keeps full resolution.
+HAAR_MAX_SIDE = int(os.getenv("HAAR_MAX_SIDE", "0"))
+HAAR_CASCADE_PATH = cv2.data.haarcascades + "haarcascade_frontalface_default.xml"
+DET_ADAPTIVE_SIZE = os.getenv("DET_ADAPTIVE_SIZE", "0").lower() in ("1", "true", "yes")
+# Smallest face, in detector input pixels, that SCRFD still finds reliably.
+DET_MIN_FACE_PX = int(os.getenv("DET_MIN_FACE_PX", "40"))
+# Smallest face worth finding, as a share of the shorter image side.
+DET_EXPECTED_FACE_RATIO = float(os.getenv("DET_EXPECTED_FACE_RATIO", "0.15"))
+DET_MIN_INPUT_SIZE = int(os.getenv("DET_MIN_INPUT_SIZE", "160"))
+# Bumped whenever preprocessing changes the embeddings a model produces; it is
+# part of the reported model name, so Odoo re-registers older embeddings.
+# p2: frames are fed in their tagged channel order instead of a guessed one.
+# p3: one landmark-aligned, batched recognizer path for registration and analysis.
+EMBEDDING_PIPELINE = "p3"
+from app.inference.media import BGR, RGB
+from app.inference.models import INSIGHTFACE_DET_SIZE, get_face_app
+_haar = threading.local()
 
 
 def detect_faces(image: np.ndarray):
-    app = get_face_app()
+    app = get_face_app() if FACE_DETECTOR != "lite" else None
     if app is not None:
         try:
             faces = []
-            for face in app.get(image):
+            for face in _app_faces(app, _as_bgr_uint8(image)):
                 x, y, x2, y2 = face.bbox.astype(int)
                 faces.append((x, y, x2 - x, y2 - y, face))
             return faces
@@ -29,24 +55,45 @@ def detect_faces(image: np.ndarray):
 
 
 def extract_embedding(image: np.ndarray, face_info: tuple) -> Optional[np.ndarray]:
-    app = get_face_app()
-    if app is None or image is None or image.size == 0:
-        return None
+    return extract_embeddings([(image, face_info)])[0]
 
-    for candidate in (_align_face(image, face_info), _as_bgr_uint8(image), _crop_face(image, face_info)):
-        if candidate is None:
+
+def extract_embeddings(items) -> List[Optional[np.ndarray]]:
+    """Embed ``(image, face_info)`` pairs; the only alignment and recognition path.
+
+    Each face is warped onto the recognizer template from its five landmarks
+    with ``norm_crop``, as ``FaceAnalysis.get`` does, and all crops run through
+    the recognizer as one batch. Boxes without landmarks (Haar) get them from
+    a small detection on their crop first.
+    """
+    app = get_face_app()
+    recognizer = app.models.get("recognition") if app is not None and face_align is not None else None
+    embeddings = [None] * len(items)
+    if recognizer is None:
+        return embeddings
+    aligned = []
+    positions = []
+    for position, (image, face_info) in enumerate(items):
+        if image is None or image.size == 0:
             continue
         try:
-            faces = app.get(candidate)
-            if not faces:
+            image = _as_bgr_uint8(image)
+            landmarks = _face_landmarks(app, image, face_info)
+            if landmarks is None:
                 continue
-            face = max(faces, key=lambda item: (item.bbox[2] - item.bbox[0]) * (item.bbox[3] - item.bbox[1]))
-            embedding = normalize_embedding(face.normed_embedding)
-            if embedding is not None:
-                return embedding
+            aligned.append(face_align.norm_crop(image, landmark=landmarks, image_size=recognizer.input_size[0]))
+            positions.append(position)
         except Exception:
             pass
-    return None
+
+    if aligned:
+        try:
+            features = recognizer.get_feat(aligned)
+        except Exception:
+            return embeddings
+        for position, feature in zip(positions, features):
+            embeddings[position] = normalize_embedding(np.asarray(feature).ravel())
+    return embeddings
 
 
 def compare_embeddings(left: np.ndarray, right: np.ndarray) -> float:
@@ -65,66 +112,99 @@ def normalize_embedding(embedding) -> Optional[np.ndarray]:
     return None if norm <= 0 else embedding / norm
 
 
-def _detect_faces_opencv(image: np.ndarray):
+def detection_input_size(image_shape):
+    height, width = image_shape[:2]
+    expected_face = max(min(MIN_FACE_SIZE), DET_EXPECTED_FACE_RATIO * min(height, width))
+    scale = min(1.0, DET_MIN_FACE_PX / expected_face, INSIGHTFACE_DET_SIZE / max(height, width))
+    scale = max(scale, DET_MIN_INPUT_SIZE / max(height, width))
+    return tuple(max(32, int(np.ceil(side * scale / 32.0)) * 32) for side in (width, height))
+
+
+def _app_faces(app, image: np.ndarray):
+    if Face is None:
+        return app.get(image)
+    # FaceAnalysis.get without the recognizer: embeddings come from
+    # extract_embeddings, so faces that are later rejected are never embedded.
+    # The adaptive input size changes only the detector input; boxes and
+    # landmarks come back in source pixels.
+    input_size = detection_input_size(image.shape) if DET_ADAPTIVE_SIZE else None
+    bboxes, kpss = app.det_model.detect(image, input_size=input_size, max_num=0, metric="default")
+    faces = []
+    for position in range(bboxes.shape[0]):
+        face = Face(
+            bbox=bboxes[position, 0:4],
+            kps=kpss[position] if kpss is not None else None,
+            det_score=bboxes[position, 4],
+        )
+        for task_name, model in app.models.items():
+            if task_name not in ("detection", "recognition"):
+                model.get(image, face)
+        faces.append(face)
+    return faces
+
+
+def _face_landmarks(app, image: np.ndarray, face_info: tuple) -> Optional[np.ndarray]:
+    face = face_info[4] if len(face_info) > 4 else None
+    if getattr(face, "kps", None) is not None:
+        return np.asarray(face.kps, dtype=np.float32)
+    # Haar boxes: find the landmarks on a padded crop at the smallest detector input.
+    x, y, w, h = face_info[:4]
+    margin = int(max(w, h) * FACE_CROP_MARGIN)
+    x1, y1 = max(0, x - margin), max(0, y - margin)
+    crop = image[y1:min(image.shape[0], y + h + margin), x1:min(image.shape[1], x + w + margin)]
+    if crop.size == 0:
+        return None
+    size = max(32, int(np.ceil(DET_MIN_INPUT_SIZE / 32.0)) * 32)
+    _bboxes, kpss = app.det_model.detect(crop, input_size=(size, size), max_num=1, metric="default")
+    if kpss is None or not len(kpss):
+        return None
+    return kpss[0].astype(np.float32) + np.array([x1, y1], dtype=np.float32)
+
+
+def _haar_cascade():
+    # CascadeClassifier is not safe to share across threads, so each worker keeps its own.
+    cascade = getattr(_haar, "cascade", None)
+    if cascade is None:
+        cascade = _haar.cascade = cv2.CascadeClassifier(HAAR_CASCADE_PATH)
+    return cascade
+
+
+def _detect_faces_opencv(image: np.ndarray, max_side: int = HAAR_MAX_SIDE):
     try:
         bgr = _as_bgr_uint8(image)
         gray = cv2.cvtColor(bgr, cv2.COLOR_BGR2GRAY)
-        cascade = cv2.CascadeClassifier(cv2.data.haarcascades + "haarcascade_frontalface_default.xml")
-        faces = cascade.detectMultiScale(
+        scale = 1.0
+        if max_side and max(gray.shape) > max_side:
+            scale = max_side / float(max(gray.shape))
+            gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        faces = _haar_cascade().detectMultiScale(
             gray,
             scaleFactor=SCALE_FACTOR,
             minNeighbors=MIN_NEIGHBORS,
-            minSize=MIN_FACE_SIZE,
+            minSize=tuple(max(1, int(side * scale)) for side in MIN_FACE_SIZE),
             flags=cv2.CASCADE_SCALE_IMAGE,
         )
-        return [(x, y, w, h, None) for x, y, w, h in faces]
+        return [
+            (int(x / scale), int(y / scale), int(w / scale), int(h / scale), None)
+            for x, y, w, h in faces
+        ]
     except Exception:
         return []
 
 
-def _align_face(image: np.ndarray, face_info: tuple) -> Optional[np.ndarray]:
-    try:
-        x, y, w, h, face = face_info
-        if face is None or getattr(face, "kps", None) is None:
-            return _resize_face(image, (x, y, w, h))
-        landmarks = face.kps.astype(np.float32)
-        standard = np.array([
-            [38.2946, 51.6963],
-            [73.5318, 51.5014],
-            [56.0252, 71.7366],
-            [41.5493, 92.3655],
-            [70.7299, 92.2041],
-        ], dtype=np.float32)
-        transform = cv2.estimateAffinePartial2D(landmarks, standard)[0]
-        return _as_bgr_uint8(cv2.warpAffine(image, transform, STANDARD_FACE_SIZE))
-    except Exception:
-        return _crop_face(image, face_info)
-
-
-def _crop_face(image: np.ndarray, face_info: tuple) -> Optional[np.ndarray]:
-    try:
-        return _resize_face(image, face_info[:4], margin=0.2)
-    except Exception:
-        return None
-
-
-def _resize_face(image: np.ndarray, face_box: tuple, margin: float = FACE_CROP_MARGIN) -> np.ndarray:
-    x, y, w, h = face_box
-    x_margin = int(w * margin)
-    y_margin = int(h * margin)
-    x1 = max(0, x - x_margin)
-    y1 = max(0, y - y_margin)
-    x2 = min(image.shape[1], x + w + x_margin)
-    y2 = min(image.shape[0], y + h + y_margin)
-    crop = image[y1:y2, x1:x2]
-    if crop.shape[0] < 50 or crop.shape[1] < 50:
-        return None
-    return _as_bgr_uint8(cv2.resize(crop, STANDARD_FACE_SIZE, interpolation=cv2.INTER_LINEAR))
-
-
 def _as_bgr_uint8(image: np.ndarray) -> np.ndarray:
-    prepared = (image * 255).astype(np.uint8) if image.max() <= 1.0 else image.astype(np.uint8)
+    channel_order = getattr(image, "channel_order", None)
+    if channel_order == BGR and image.dtype == np.uint8:
+        return image.view(np.ndarray)
+    if image.dtype == np.uint8:
+        prepared = image.view(np.ndarray)
+    else:
+        prepared = (image * 255).astype(np.uint8) if image.max() <= 1.0 else image.astype(np.uint8)
+        prepared = prepared.view(np.ndarray)
     if len(prepared.shape) == 3 and prepared.shape[2] == 3:
-        if np.mean(prepared[:, :, 0]) < np.mean(prepared[:, :, 2]):
+        if channel_order == RGB:
+            return cv2.cvtColor(prepared, cv2.COLOR_RGB2BGR)
+        # Untagged arrays keep the historical guess.
+        if channel_order is None and np.mean(prepared[:, :, 0]) < np.mean(prepared[:, :, 2]):
             return cv2.cvtColor(prepared, cv2.COLOR_RGB2BGR)
     return prepared
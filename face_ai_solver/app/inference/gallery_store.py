@@ -0,0 +1,141 @@
+"""Memory-mapped on-disk snapshots of the gallery index.
+
+A snapshot is two files next to each other::
+
+    gallery.json                 sidecar: format version, generation, keys, metadata
+    gallery.<generation>.f32     64-byte header, then fixed-stride float32 rows
+
+The matrix file holds the row vectors, then the IVF centroids, then one int32
+list id per row when the index was trained. It is mapped read-only, so every
+process that opens the same generation shares one copy in the page cache.
+Writers never touch a published matrix file: they write a new generation and
+atomically replace the sidecar, which is the only file readers look up.
+Publishing holds an exclusive ``flock`` on ``<stem>.lock`` in the same
+directory, so several workers sharing one path take turns, and each publish
+removes every matrix file the new sidecar does not reference.
+"""
+import fcntl
+import glob
+import json
+import os
+import struct
+import time
+import uuid
+
+import numpy as np
+
+SNAPSHOT_FORMAT_VERSION = 1
+_MAGIC = b"FAGALLRY"
+# magic, format version, dimension, rows, centroids, generation; padded to 64 bytes.
+_HEADER = struct.Struct("<8sIIQQ16s")
+_HEADER_SIZE = 64
+
+
+class GallerySnapshot:
+    def __init__(self, path, generation, keys, vectors, centroids, list_ids, metadata):
+        self.path = path
+        self.generation = generation
+        self.keys = keys
+        self.vectors = vectors
+        self.centroids = centroids
+        self.list_ids = list_ids
+        self.metadata = metadata
+
+    def __len__(self):
+        return len(self.keys)
+
+
+def write_gallery_snapshot(path, keys, vectors, centroids=None, list_ids=None, metadata=None):
+    """Publish a new snapshot generation at ``path`` (the sidecar) and return it."""
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    rows, dim = vectors.shape
+    if len(keys) != rows:
+        raise ValueError("Gallery snapshot needs one key per row.")
+    centroids = np.zeros((0, dim), dtype=np.float32) if centroids is None else np.ascontiguousarray(centroids, dtype=np.float32)
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, f"{_stem(path)}.lock"), "a") as lock:
+        fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+        try:
+            return _publish(path, directory, keys, vectors, centroids, list_ids, metadata)
+        finally:
+            fcntl.flock(lock.fileno(), fcntl.LOCK_UN)
+
+
+def _publish(path, directory, keys, vectors, centroids, list_ids, metadata):
+    rows, dim = vectors.shape
+    generation = uuid.uuid4()
+    matrix_file = f"{_stem(path)}.{generation.hex}.f32"
+    matrix_path = os.path.join(directory, matrix_file)
+    pending = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(matrix_path, "wb") as handle:
+            handle.write(_HEADER.pack(_MAGIC, SNAPSHOT_FORMAT_VERSION, dim, rows, len(centroids), generation.bytes).ljust(_HEADER_SIZE, b"\0"))
+            handle.write(vectors.tobytes())
+            handle.write(centroids.tobytes())
+            if len(centroids):
+                handle.write(np.ascontiguousarray(list_ids, dtype=np.int32).tobytes())
+            handle.flush()
+            os.fsync(handle.fileno())
+        with open(pending, "w") as handle:
+            json.dump({
+                "format_version": SNAPSHOT_FORMAT_VERSION,
+                "generation": generation.hex,
+                "matrix_file": matrix_file,
+                "rows": rows,
+                "dim": dim,
+                "created_at": time.time(),
+                "metadata": metadata or {},
+                "keys": [list(key) if isinstance(key, tuple) else key for key in keys],
+            }, handle)
+            handle.flush()
+            os.fsync(handle.fileno())
+        os.replace(pending, path)
+    except BaseException:
+        for leftover in (pending, matrix_path):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+        raise
+    # Processes still mapping an old generation keep it until they unmap it.
+    for orphan in glob.glob(os.path.join(glob.escape(directory), f"{glob.escape(_stem(path))}.{'[0-9a-f]' * 32}.f32")):
+        if os.path.basename(orphan) != matrix_file:
+            try:
+                os.remove(orphan)
+            except FileNotFoundError:
+                pass
+    return generation.hex
+
+
+def read_gallery_snapshot(path):
+    """Map the snapshot published at ``path`` read-only; None when there is none."""
+    try:
+        with open(path) as handle:
+            sidecar = json.load(handle)
+    except FileNotFoundError:
+        return None
+    if sidecar.get("format_version") != SNAPSHOT_FORMAT_VERSION:
+        raise ValueError(f"Unsupported gallery snapshot format: {sidecar.get('format_version')}")
+    matrix_path = os.path.join(os.path.dirname(os.path.abspath(path)), sidecar["matrix_file"])
+    with open(matrix_path, "rb") as handle:
+        magic, version, dim, rows, centroid_count, generation = _HEADER.unpack(handle.read(_HEADER.size))
+    if magic != _MAGIC or version != SNAPSHOT_FORMAT_VERSION:
+        raise ValueError(f"Not a gallery snapshot matrix: {matrix_path}")
+    if generation.hex() != sidecar["generation"] or rows != sidecar["rows"] or dim != sidecar["dim"]:
+        raise ValueError(f"Gallery snapshot sidecar does not match {matrix_path}")
+    expected_size = _HEADER_SIZE + 4 * ((rows + centroid_count) * dim + (rows if centroid_count else 0))
+    if os.path.getsize(matrix_path) != expected_size:
+        raise ValueError(f"Truncated gallery snapshot matrix: {matrix_path}")
+
+    vectors = np.memmap(matrix_path, dtype=np.float32, mode="r", offset=_HEADER_SIZE, shape=(rows, dim)) if rows else np.zeros((0, dim), dtype=np.float32)
+    centroids, list_ids = None, None
+    if centroid_count:
+        offset = _HEADER_SIZE + 4 * rows * dim
+        centroids = np.array(np.memmap(matrix_path, dtype=np.float32, mode="r", offset=offset, shape=(centroid_count, dim)))
+        list_ids = np.memmap(matrix_path, dtype=np.int32, mode="r", offset=offset + 4 * centroid_count * dim, shape=(rows,))
+    keys = [tuple(key) if isinstance(key, list) else key for key in sidecar["keys"]]
+    return GallerySnapshot(path, sidecar["generation"], keys, vectors, centroids, list_ids, sidecar.get("metadata", {}))
+
+
+def _stem(path):
+    stem, extension = os.path.splitext(os.path.basename(path))
+    return stem if extension == ".json" else os.path.basename(path)
@@ -10,25 +10,113 @@ MAX_ANALYZE_FRAMES = int(os.getenv("MAX_ANALYZE_FRAMES", "7"))
 PHOTO_ASPECT_RATIO = float(os.getenv("PHOTO_ASPECT_RATIO", "0.75"))
 PHOTO_ASPECT_RATIO_TOLERANCE = float(os.getenv("PHOTO_ASPECT_RATIO_TOLERANCE", "0.08"))
 PHOTO_BACKGROUND_MIN_COVERAGE = float(os.getenv("PHOTO_BACKGROUND_MIN_COVERAGE", "0.55"))
+FRAME_MIN_BLUR_SCORE = float(os.getenv("FRAME_MIN_BLUR_SCORE", "15"))
+FRAME_MIN_BRIGHTNESS = float(os.getenv("FRAME_MIN_BRIGHTNESS", "0.12"))
+FRAME_MAX_BRIGHTNESS = float(os.getenv("FRAME_MAX_BRIGHTNESS", "0.97"))
+FRAME_MIN_FACE_SIZE = int(os.getenv("FRAME_MIN_FACE_SIZE", "48"))
+# Extra frames kept per sampled frame as replacements for low-quality ones.
+FRAME_SPARES_PER_SAMPLE = int(os.getenv("FRAME_SPARES_PER_SAMPLE", "2"))
+
+BGR = "BGR"
+RGB = "RGB"
+
+BLURRY = "BLURRY"
+TOO_DARK = "TOO_DARK"
+TOO_BRIGHT = "TOO_BRIGHT"
+FACE_TOO_SMALL = "FACE_TOO_SMALL"
+
+
+class Frame(np.ndarray):
+    """Image array tagged with its channel order, so consumers never guess it.
+
+    Views and slices keep the tag; arrays produced by OpenCV are untagged and
+    have to be re-wrapped with ``Frame.like``.
+    """
+
+    def __new__(cls, pixels, channel_order=BGR):
+        frame = np.asarray(pixels).view(cls)
+        frame.channel_order = channel_order
+        return frame
+
+    def __array_finalize__(self, source):
+        self.channel_order = getattr(source, "channel_order", None)
+
+    @classmethod
+    def like(cls, source, pixels):
+        channel_order = getattr(source, "channel_order", None)
+        return cls(pixels, channel_order) if channel_order else pixels
+
+
+class FramePool:
+    """Sampled frames plus a few unsampled ones that can stand in for rejected frames."""
+
+    def __init__(self, frames, spare_indices=(), load=None):
+        self.frames = frames
+        self._spare_indices = sorted(int(index) for index in spare_indices)
+        self._load = load
+
+    def __len__(self):
+        return len(self.frames)
+
+    def replacement(self, near_index):
+        while self._spare_indices:
+            index = min(self._spare_indices, key=lambda spare: abs(spare - near_index))
+            self._spare_indices.remove(index)
+            frame = self._load(index)
+            if frame is not None:
+                return index, frame
+        return None
 
 
 def decode_image(image_bytes: bytes):
     if not image_bytes:
         return None
-    return cv2.imdecode(np.frombuffer(image_bytes, np.uint8), cv2.IMREAD_COLOR)
+    image = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), cv2.IMREAD_COLOR)
+    return None if image is None else Frame(image, BGR)
 
 
 def sample_video_frames(video_bytes: bytes, max_frames: int = MAX_ANALYZE_FRAMES):
+    return video_frame_pool(video_bytes, max_frames).frames
+
+
+def video_frame_pool(video_bytes: bytes, max_frames: int = MAX_ANALYZE_FRAMES, spares_per_sample: int = 0):
     max_frames = max(1, min(max_frames or MAX_ANALYZE_FRAMES, MAX_ANALYZE_FRAMES))
     with av.open(BytesIO(video_bytes)) as container:
         frames = [
-            (index, cv2.cvtColor(frame.to_ndarray(format="rgb24"), cv2.COLOR_RGB2BGR))
+            (index, Frame(frame.to_ndarray(format="bgr24"), BGR))
             for index, frame in enumerate(container.decode(video=0))
         ]
     if len(frames) <= max_frames:
-        return frames
-    indices = np.linspace(0, len(frames) - 1, num=max_frames, dtype=int)
-    return [frames[int(index)] for index in indices]
+        return FramePool(frames)
+    sampled, spares = _sample_indices(len(frames), max_frames, spares_per_sample)
+    kept = {index: frames[index][1] for index in spares}
+    return FramePool([frames[index] for index in sampled], spares, kept.get)
+
+
+def sample_image_frames(frame_images, max_frames: int = MAX_ANALYZE_FRAMES):
+    return image_frame_pool(frame_images, max_frames).frames
+
+
+def image_frame_pool(frame_images, max_frames: int = MAX_ANALYZE_FRAMES, spares_per_sample: int = 0):
+    max_frames = max(1, min(max_frames or MAX_ANALYZE_FRAMES, MAX_ANALYZE_FRAMES))
+    sampled, spares = range(len(frame_images)), []
+    if len(frame_images) > max_frames:
+        sampled, spares = _sample_indices(len(frame_images), max_frames, spares_per_sample)
+    frames = []
+    for index in sampled:
+        image = decode_image(frame_images[index])
+        if image is not None:
+            frames.append((index, image))
+    return FramePool(frames, spares, lambda index: decode_image(frame_images[index]))
+
+
+def _sample_indices(count, max_frames, spares_per_sample):
+    sampled = [int(index) for index in np.linspace(0, count - 1, num=max_frames, dtype=int)]
+    spare_count = min(count, max_frames * (1 + max(0, spares_per_sample)))
+    candidates = np.linspace(0, count - 1, num=spare_count, dtype=int)
+    chosen = set(sampled)
+    spares = [int(index) for index in dict.fromkeys(candidates.tolist()) if int(index) not in chosen]
+    return sampled, spares
 
 
 def face_quality(image: np.ndarray, face_info):
@@ -43,6 +131,20 @@ def face_quality(image: np.ndarray, face_info):
     }
 
 
+def frame_quality_gate(image: np.ndarray, face_info):
+    quality = face_quality(image, face_info)
+    reasons = []
+    if min(int(face_info[2]), int(face_info[3])) < FRAME_MIN_FACE_SIZE:
+        reasons.append(FACE_TOO_SMALL)
+    if quality["blur_score"] < FRAME_MIN_BLUR_SCORE:
+        reasons.append(BLURRY)
+    if quality["brightness_score"] < FRAME_MIN_BRIGHTNESS:
+        reasons.append(TOO_DARK)
+    elif quality["brightness_score"] > FRAME_MAX_BRIGHTNESS:
+        reasons.append(TOO_BRIGHT)
+    return quality, reasons
+
+
 def portrait_photo_quality(image: np.ndarray, face_info):
     height, width = image.shape[:2]
     aspect_ratio = float(width / height) if height else 0.0
@@ -1,19 +1,31 @@
 """Model initialization and singleton access."""
+import glob
 import logging
 import os
 import threading
 from typing import Optional
 
+from app.inference.ort_session import create_session, provider_chain
+
 os.environ["INSIGHTFACE_USE_TORCH"] = os.getenv("INSIGHTFACE_USE_TORCH", "0")
 os.environ["ONNXRUNTIME_FORCE_CPU"] = os.getenv("ONNXRUNTIME_FORCE_CPU", "1")
 
 INSIGHTFACE_MODEL = os.getenv("INSIGHTFACE_MODEL", "buffalo_l")
 INSIGHTFACE_PROVIDER = os.getenv("INSIGHTFACE_PROVIDER", "CPUExecutionProvider")
-INSIGHTFACE_CTX_ID = int(os.getenv("INSIGHTFACE_CTX_ID", "-1"))
 INSIGHTFACE_DET_SIZE = int(os.getenv("INSIGHTFACE_DET_SIZE", "640"))
+# Only these model-pack tasks are loaded; landmark and gender/age models are unused here.
+INSIGHTFACE_MODULES = [item.strip() for item in os.getenv("INSIGHTFACE_MODULES", "detection,recognition").split(",") if item.strip()]
+# Tasks that load the INT8 model written by tools.quantize_models instead of FP32.
+INSIGHTFACE_INT8 = [item.strip() for item in os.getenv("INSIGHTFACE_INT8", "").split(",") if item.strip()]
+INSIGHTFACE_INT8_DIR = os.path.expanduser(os.getenv("INSIGHTFACE_INT8_DIR", "") or f"~/.insightface/models/{INSIGHTFACE_MODEL}-int8")
 
 try:
+    import onnx
+    import onnxruntime
     from insightface.app import FaceAnalysis
+    from insightface.model_zoo import ArcFaceONNX, Attribute, Landmark, RetinaFace
+    from insightface.model_zoo.model_zoo import PickableInferenceSession
+    from insightface.utils import ensure_available
     _INSIGHTFACE_AVAILABLE = True
 except Exception:
     _INSIGHTFACE_AVAILABLE = False
@@ -34,8 +46,10 @@ def get_face_app() -> Optional["FaceAnalysis"]:
         with _model_lock:
             if _face_app is None:
                 try:
-                    app = FaceAnalysis(name=INSIGHTFACE_MODEL, providers=[INSIGHTFACE_PROVIDER])
-                    app.prepare(ctx_id=INSIGHTFACE_CTX_ID, det_size=(INSIGHTFACE_DET_SIZE, INSIGHTFACE_DET_SIZE))
+                    app = _load_face_analysis()
+                    # Providers are chosen per model at load; a negative ctx_id
+                    # would make insightface reopen every session on CPU.
+                    app.prepare(ctx_id=0, det_size=(INSIGHTFACE_DET_SIZE, INSIGHTFACE_DET_SIZE))
                     _face_app = app
                 except Exception as exc:
                     _logger.error("INSIGHTFACE_INIT_FAILED: %s", exc)
@@ -43,6 +57,88 @@ def get_face_app() -> Optional["FaceAnalysis"]:
     return _face_app
 
 
+def _load_face_analysis():
+    # FaceAnalysis cannot pass SessionOptions to its sessions, so build the
+    # same object model by model and skip tasks that are not configured
+    # before any session is opened.
+    app = FaceAnalysis.__new__(FaceAnalysis)
+    onnxruntime.set_default_logger_severity(3)
+    app.models = {}
+    app.model_dir = ensure_available("models", INSIGHTFACE_MODEL, root="~/.insightface")
+    for onnx_file in sorted(glob.glob(os.path.join(app.model_dir, "*.onnx"))):
+        taskname, model_class = _model_task(onnx_file)
+        if model_class is None or taskname in app.models:
+            continue
+        if INSIGHTFACE_MODULES and taskname not in INSIGHTFACE_MODULES:
+            continue
+        providers = provider_chain(taskname, INSIGHTFACE_PROVIDER)
+        session = create_session(_session_model_file(onnx_file, taskname), taskname, providers, PickableInferenceSession)
+        # The FP32 file stays the model_file: ArcFaceONNX reads its input
+        # normalization from the first graph nodes, which quantization rewrites.
+        app.models[taskname] = model_class(model_file=onnx_file, session=session)
+    app.det_model = app.models["detection"]
+    return app
+
+
+def quantized_model_file(onnx_file):
+    return os.path.join(INSIGHTFACE_INT8_DIR, os.path.basename(onnx_file))
+
+
+def _session_model_file(onnx_file, taskname):
+    if taskname not in INSIGHTFACE_INT8:
+        return onnx_file
+    quantized = quantized_model_file(onnx_file)
+    if not os.path.exists(quantized):
+        raise FileNotFoundError(f"INT8 {taskname} model {quantized} not found; run tools.quantize_models first")
+    return quantized
+
+
+def _model_task(onnx_file):
+    # Same routing as insightface's ModelRouter, read from the graph
+    # signature instead of an inference session.
+    graph = onnx.load(onnx_file, load_external_data=False).graph
+    initializers = {item.name for item in graph.initializer}
+    inputs = [item for item in graph.input if item.name not in initializers]
+    input_shape = [dim.dim_value for dim in inputs[0].type.tensor_type.shape.dim]
+    output_size = graph.output[0].type.tensor_type.shape.dim[1].dim_value if graph.output else 0
+    if len(graph.output) >= 5:
+        return "detection", RetinaFace
+    if input_shape[2] == 192 and input_shape[3] == 192:
+        return ("landmark_3d_68" if output_size == 3309 else f"landmark_2d_{output_size // 2}"), Landmark
+    if input_shape[2] == 96 and input_shape[3] == 96:
+        return ("genderage" if output_size == 3 else f"attribute_{output_size}"), Attribute
+    if len(inputs) == 1 and input_shape[2] == input_shape[3] >= 112 and input_shape[2] % 16 == 0:
+        return "recognition", ArcFaceONNX
+    return None, None
+
+
+def validate_providers():
+    """Resolve every model's provider chain now, so a bad ``ORT_PROVIDERS`` fails at startup."""
+    if not _INSIGHTFACE_AVAILABLE:
+        return {}
+    roles = INSIGHTFACE_MODULES or ["detection", "recognition"]
+    chains = {role: provider_chain(role, INSIGHTFACE_PROVIDER) for role in roles}
+    from app.inference.yolo_detector import YOLO_MODEL
+    if YOLO_MODEL.endswith(".onnx"):
+        chains["yolo"] = provider_chain("yolo")
+    return chains
+
+
+def model_providers():
+    """Provider each loaded model actually runs on."""
+    providers = {}
+    if _face_app is not None:
+        providers.update({task: model.session.get_providers()[0] for task, model in _face_app.models.items()})
+    if _yolo_detector is not None and _yolo_detector.model_loaded:
+        providers["yolo"] = _yolo_detector.provider
+    return providers
+
+
+def preload_models():
+    get_face_app()
+    get_yolo_detector()
+
+
 def is_insightface_available() -> bool:
     return _INSIGHTFACE_AVAILABLE
 
@@ -0,0 +1,239 @@
+"""ONNX Runtime providers and session options per model role, and optimized-graph caching.
+
+Every ``ORT_*`` setting takes either a single value or a comma-separated list
+with per-role overrides, e.g. ``ORT_INTRA_OP_THREADS=2,recognition=4``. Roles
+are the InsightFace task names (``detection``, ``recognition``, ...) and
+``yolo``. ``ORT_PROVIDERS`` values are ``|``-separated fallback chains, e.g.
+``ORT_PROVIDERS=openvino|cpu,yolo=cpu``.
+"""
+import functools
+import hashlib
+import logging
+import os
+import platform
+import time
+
+try:
+    import onnxruntime
+except Exception:
+    onnxruntime = None
+
+ORT_PROVIDERS = os.getenv("ORT_PROVIDERS", "")
+ORT_OPENVINO_DEVICE = os.getenv("ORT_OPENVINO_DEVICE", "CPU")
+ORT_INTRA_OP_THREADS = os.getenv("ORT_INTRA_OP_THREADS", "0")
+ORT_INTER_OP_THREADS = os.getenv("ORT_INTER_OP_THREADS", "0")
+ORT_EXECUTION_MODE = os.getenv("ORT_EXECUTION_MODE", "sequential")
+ORT_GRAPH_OPTIMIZATION = os.getenv("ORT_GRAPH_OPTIMIZATION", "all")
+ORT_CPU_MEM_ARENA = os.getenv("ORT_CPU_MEM_ARENA", "1")
+ORT_MEM_PATTERN = os.getenv("ORT_MEM_PATTERN", "1")
+# Optimized graphs are written here on first load and reused on later starts; empty disables.
+ORT_OPTIMIZED_MODEL_DIR = os.path.expanduser(os.getenv("ORT_OPTIMIZED_MODEL_DIR", "~/.insightface/ort_optimized"))
+_TRUE = ("1", "true", "yes")
+_CPU_PROVIDER = "CPUExecutionProvider"
+_PROVIDER_ALIASES = {
+    "cpu": _CPU_PROVIDER,
+    "openvino": "OpenVINOExecutionProvider",
+    "dnnl": "DnnlExecutionProvider",
+    "xnnpack": "XnnpackExecutionProvider",
+    "cuda": "CUDAExecutionProvider",
+}
+_logger = logging.getLogger(__name__)
+
+
+def role_setting(spec, role):
+    """Value of one ``ORT_*`` setting for ``role``: its override, else the default."""
+    default = ""
+    for item in str(spec).split(","):
+        key, separator, value = item.strip().partition("=")
+        if not separator:
+            default = key
+        elif key.strip().lower() == role:
+            return value.strip()
+    return default
+
+
+def provider_chain(role, default=_CPU_PROVIDER):
+    """Ordered providers to try for ``role``; the CPU provider always closes the chain.
+
+    Unknown names raise ``ValueError``; providers missing from this ONNX
+    Runtime build are dropped with a warning.
+    """
+    return parse_provider_chain(role_setting(ORT_PROVIDERS, role) or default, role)
+
+
+def parse_provider_chain(spec, role):
+    chain = []
+    for name in spec.split("|"):
+        name = _PROVIDER_ALIASES.get(name.strip().lower(), name.strip())
+        if not name or name in chain:
+            continue
+        if name not in onnxruntime.get_all_providers():
+            raise ValueError(f"Unknown ONNX Runtime provider {name!r} for {role}")
+        if name not in onnxruntime.get_available_providers():
+            _logger.warning("ORT_PROVIDER_UNAVAILABLE: %s", {"role": role, "provider": name})
+            continue
+        chain.append(name)
+    if _CPU_PROVIDER not in chain:
+        chain.append(_CPU_PROVIDER)
+    return chain
+
+
+def _provider_options(providers):
+    return [{"device_type": ORT_OPENVINO_DEVICE} if name == "OpenVINOExecutionProvider" else {} for name in providers]
+
+
+def _graph_optimization_levels():
+    level = onnxruntime.GraphOptimizationLevel
+    return {
+        "disable": level.ORT_DISABLE_ALL,
+        "basic": level.ORT_ENABLE_BASIC,
+        "extended": level.ORT_ENABLE_EXTENDED,
+        "all": level.ORT_ENABLE_ALL,
+    }
+
+
+def session_options(role):
+    options = onnxruntime.SessionOptions()
+    intra_op_threads = int(role_setting(ORT_INTRA_OP_THREADS, role) or 0)
+    inter_op_threads = int(role_setting(ORT_INTER_OP_THREADS, role) or 0)
+    if intra_op_threads > 0:
+        options.intra_op_num_threads = intra_op_threads
+    if inter_op_threads > 0:
+        options.inter_op_num_threads = inter_op_threads
+    if role_setting(ORT_EXECUTION_MODE, role).lower() == "parallel":
+        options.execution_mode = onnxruntime.ExecutionMode.ORT_PARALLEL
+    else:
+        options.execution_mode = onnxruntime.ExecutionMode.ORT_SEQUENTIAL
+    levels = _graph_optimization_levels()
+    options.graph_optimization_level = levels.get(role_setting(ORT_GRAPH_OPTIMIZATION, role).lower(), levels["all"])
+    options.enable_cpu_mem_arena = role_setting(ORT_CPU_MEM_ARENA, role).lower() in _TRUE
+    options.enable_mem_pattern = role_setting(ORT_MEM_PATTERN, role).lower() in _TRUE
+    return options
+
+
+def create_session(model_path, role, providers, session_class=None):
+    """Open ``model_path`` with the ``role`` options on the first provider that loads it.
+
+    A provider that fails to initialize hands over to the next one in
+    ``providers``.
+    """
+    providers = list(providers)
+    while True:
+        try:
+            return _create_session(model_path, role, providers, session_class)
+        except Exception as exc:
+            if len(providers) <= 1:
+                raise
+            _logger.warning("ORT_PROVIDER_FAILED: %s", {"role": role, "provider": providers[0], "error": str(exc)})
+            providers = providers[1:]
+
+
+def _create_session(model_path, role, providers, session_class=None):
+    # A cached graph is already optimized for this ONNX Runtime build,
+    # provider list and CPU architecture, so it is loaded with graph
+    # optimization turned off. A missing entry is written while the original
+    # model loads.
+    session_class = session_class or onnxruntime.InferenceSession
+    options = session_options(role)
+    load_path, cached, pending = model_path, False, None
+    cache_path = _optimized_model_path(model_path, role, options, providers)
+    if cache_path and os.path.exists(cache_path):
+        load_path, cached = cache_path, True
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_DISABLE_ALL
+    elif cache_path:
+        pending = f"{cache_path}.{os.getpid()}.tmp"
+        options.optimized_model_filepath = pending
+
+    started_at = time.perf_counter()
+    try:
+        session = session_class(
+            load_path,
+            sess_options=options,
+            providers=providers,
+            provider_options=_provider_options(providers),
+        )
+    except Exception:
+        if not cached:
+            raise
+        # A stale or truncated cache entry: drop it and optimize again.
+        _logger.warning("ORT_OPTIMIZED_MODEL_INVALID: %s", cache_path)
+        os.remove(cache_path)
+        return _create_session(model_path, role, providers, session_class)
+    if pending:
+        try:
+            os.replace(pending, cache_path)
+        except OSError as exc:
+            _logger.warning("ORT_OPTIMIZED_MODEL_WRITE_FAILED: %s", exc)
+    _logger.info("ONNX Runtime session ready: %s", {
+        "role": role,
+        "model": os.path.basename(model_path),
+        "provider": session.get_providers()[0],
+        "optimized_cache": "hit" if cached else ("written" if pending else "off"),
+        "load_ms": round((time.perf_counter() - started_at) * 1000, 1),
+        **effective_options(options, session),
+    })
+    return session
+
+
+def effective_options(options, session=None):
+    # Zero thread counts leave the choice to ONNX Runtime (one per physical core).
+    return {
+        "providers": session.get_providers() if session is not None else None,
+        "intra_op_threads": options.intra_op_num_threads or "auto",
+        "inter_op_threads": options.inter_op_num_threads or "auto",
+        "execution_mode": "parallel" if options.execution_mode == onnxruntime.ExecutionMode.ORT_PARALLEL else "sequential",
+        "graph_optimization": next(
+            (name for name, level in _graph_optimization_levels().items() if level == options.graph_optimization_level),
+            str(options.graph_optimization_level),
+        ),
+        "cpu_mem_arena": options.enable_cpu_mem_arena,
+        "mem_pattern": options.enable_mem_pattern,
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def _optimized_model_path(model_path, role, options, providers):
+    if not ORT_OPTIMIZED_MODEL_DIR or options.graph_optimization_level == onnxruntime.GraphOptimizationLevel.ORT_DISABLE_ALL:
+        return None
+    if providers[0] != _CPU_PROVIDER:
+        # Providers such as OpenVINO compile their partitions, which cannot be
+        # serialized back to ONNX.
+        return None
+    try:
+        stat = os.stat(model_path)
+        os.makedirs(ORT_OPTIMIZED_MODEL_DIR, exist_ok=True)
+    except OSError as exc:
+        _logger.warning("ORT_OPTIMIZED_MODEL_DIR_UNAVAILABLE: %s", exc)
+        return None
+    key = "|".join(str(part) for part in (
+        os.path.realpath(model_path),
+        stat.st_size,
+        stat.st_mtime_ns,
+        onnxruntime.__version__,
+        ",".join(providers or ()),
+        int(options.graph_optimization_level),
+        platform.machine(),
+        # "all" bakes in layout transforms for the host's instruction set, so
+        # a graph saved on an AVX-512 host must not load on an AVX2-only one.
+        _cpu_features(),
+    ))
+    digest = hashlib.sha1(key.encode()).hexdigest()[:16]
+    stem = os.path.splitext(os.path.basename(model_path))[0]
+    return os.path.join(ORT_OPTIMIZED_MODEL_DIR, f"{stem}-{role}-{digest}.onnx")
+
+
+@functools.lru_cache(maxsize=1)
+def _cpu_features():
+    flags = set()
+    try:
+        with open("/proc/cpuinfo") as handle:
+            for line in handle:
+                name, separator, value = line.partition(":")
+                # "flags" on x86, "Features" on ARM.
+                if separator and name.strip() in ("flags", "Features"):
+                    flags.update(value.split())
+    except OSError:
+        pass
+    if not flags:
+        return platform.processor()
+    return hashlib.sha1(" ".join(sorted(flags)).encode()).hexdigest()[:16]
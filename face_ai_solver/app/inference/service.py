@@ -1,21 +1,46 @@
 """Pure face inference workflows used by transport adapters."""
 from collections import defaultdict
+from concurrent import futures
+import contextvars
+import hashlib
+import heapq
 import logging
 import os
+import struct
+import threading
+import time
 
 import numpy as np
 
-from app.inference.face import compare_embeddings, detect_faces, extract_embedding
-from app.inference.media import decode_image, face_quality, portrait_photo_quality, sample_video_frames
-from app.inference.spoofing import AntiSpoofingVerifier
+from app.inference.cache import LruCache, SingleFlight
+from app.inference.embedding_codec import FLOAT32, embedding_digest
+from app.inference.face import EMBEDDING_PIPELINE, detect_faces, extract_embedding, extract_embeddings
+from app.inference.gallery import CandidateGallery, IvfFlatIndex
+from app.inference.gallery_store import read_gallery_snapshot, write_gallery_snapshot
+from app.inference.media import (
+    FRAME_SPARES_PER_SAMPLE,
+    decode_image,
+    face_quality,
+    frame_quality_gate,
+    image_frame_pool,
+    portrait_photo_quality,
+    video_frame_pool,
+)
+from app.inference.models import INSIGHTFACE_INT8, INSIGHTFACE_MODEL
+from app.inference.spoofing import AntiSpoofingVerifier, SpoofingSampler
+from app.inference.tracing import span
+from app.inference.tracking import FACE_TRACKING, FaceTracker, TrackedFace
+from app.inference.threads import GRPC_MAX_WORKERS
 from app.inference.status import (
     EMBEDDING_FAILED,
     ERROR,
     INTERNAL_ERROR,
     INVALID_PHOTO_ASPECT_RATIO,
     INVALID_PHOTO_BACKGROUND,
+    INVALID_FRAMES,
     INVALID_IMAGE,
     INVALID_VIDEO,
+    LOW_QUALITY_FRAME,
     MULTIPLE_FACES,
     NO_CANDIDATES,
     NO_FACE,
@@ -25,12 +50,60 @@ from app.inference.status import (
 
 _logger = logging.getLogger(__name__)
 
-MODEL_NAME = f"insightface/{os.getenv('INSIGHTFACE_MODEL', 'buffalo_l')}"
+MODEL_NAME = f"insightface/{INSIGHTFACE_MODEL}" + ("-int8" if "recognition" in INSIGHTFACE_INT8 else "") + f"@{EMBEDDING_PIPELINE}"
+REGISTER_DECODE_WORKERS = max(1, int(os.getenv("REGISTER_DECODE_WORKERS", "4")))
+REGISTER_BATCH_SIZE = max(1, int(os.getenv("REGISTER_BATCH_SIZE", "16")))
+REGISTER_CACHE_SIZE = int(os.getenv("REGISTER_CACHE_SIZE", "512"))
+FRAME_REPLACEMENT_BUDGET = int(os.getenv("FRAME_REPLACEMENT_BUDGET", "3"))
+ANALYZE_CACHE_SIZE = int(os.getenv("ANALYZE_CACHE_SIZE", "256"))
+ANALYZE_CACHE_TTL_SECONDS = float(os.getenv("ANALYZE_CACHE_TTL_SECONDS", "30"))
+GALLERY_INDEX = os.getenv("GALLERY_INDEX", "exact").lower()
+GALLERY_TOP_K = int(os.getenv("GALLERY_TOP_K", "10"))
+GALLERY_IVF_NLIST = int(os.getenv("GALLERY_IVF_NLIST", "0"))
+GALLERY_IVF_NPROBE = int(os.getenv("GALLERY_IVF_NPROBE", "8"))
+GALLERY_IVF_MIN_SIZE = int(os.getenv("GALLERY_IVF_MIN_SIZE", "2000"))
+GALLERY_INDEX_DTYPE = os.getenv("GALLERY_INDEX_DTYPE", "float32")
+# Keys no analyze request has sent for this long leave the shared index; 0 keeps them.
+GALLERY_INDEX_MAX_IDLE_SECONDS = float(os.getenv("GALLERY_INDEX_MAX_IDLE_SECONDS", "604800"))
+# Sidecar path of the IVF gallery snapshot; empty keeps the index in memory only.
+GALLERY_SNAPSHOT_PATH = os.path.expanduser(os.getenv("GALLERY_SNAPSHOT_PATH", ""))
+GALLERY_SNAPSHOT_INTERVAL_SECONDS = float(os.getenv("GALLERY_SNAPSHOT_INTERVAL_SECONDS", "300"))
+# Candidates returned for verbosity "top_k" when the request leaves top_k at 0.
+ANALYZE_TOP_K = max(1, int(os.getenv("ANALYZE_TOP_K", "3")))
+# Runs the YOLO device check beside face detection and embedding within a frame.
+SPOOFING_PARALLEL = os.getenv("SPOOFING_PARALLEL", "0").lower() in ("1", "true", "yes")
+VERBOSITY_FULL = "full"
+VERBOSITY_TOP_K = "top_k"
+VERBOSITY_DECISION = "decision"
+# user_id, employee_id, threshold of one candidate in the analyze cache key.
+_CANDIDATE_KEY = struct.Struct("<qqd")
 
 
 class FaceInferenceService:
     def __init__(self):
         self.anti_spoofing = AntiSpoofingVerifier()
+        # One device check per concurrent request; threads start on first use,
+        # so none exist yet when a preforking parent forks.
+        self.spoofing_executor = futures.ThreadPoolExecutor(
+            max_workers=GRPC_MAX_WORKERS, thread_name_prefix="spoofing",
+        ) if SPOOFING_PARALLEL else None
+        self.register_cache = LruCache(REGISTER_CACHE_SIZE)
+        self.analyze_cache = LruCache(ANALYZE_CACHE_SIZE, ttl_seconds=ANALYZE_CACHE_TTL_SECONDS)
+        self.analyze_flight = SingleFlight()
+        self.gallery_index = None
+        if GALLERY_INDEX == "ivf":
+            self.gallery_index = IvfFlatIndex(
+                nlist=GALLERY_IVF_NLIST,
+                nprobe=GALLERY_IVF_NPROBE,
+                min_train_size=GALLERY_IVF_MIN_SIZE,
+                dtype=GALLERY_INDEX_DTYPE,
+                max_idle_seconds=GALLERY_INDEX_MAX_IDLE_SECONDS,
+            )
+        self._snapshot_lock = threading.Lock()
+        self._snapshot_revision = None
+        self._snapshot_saved_at = None
+        if self.gallery_index is not None and GALLERY_SNAPSHOT_PATH:
+            self._load_gallery_snapshot()
 
     def register(self, image_bytes: bytes, request_id=None):
         try:
@@ -39,7 +112,17 @@ class FaceInferenceService:
                 "image_size_bytes": len(image_bytes or b""),
                 "model_name": MODEL_NAME,
             })
-            image = decode_image(image_bytes)
+            cache_key = self._register_cache_key(image_bytes)
+            cached = self.register_cache.get(cache_key)
+            if cached is not None:
+                _logger.info("AI inference register cache hit: %s", {
+                    "request_id": request_id,
+                    **self._response_log_payload(cached),
+                })
+                return dict(cached)
+
+            with span("decode", image_size_bytes=len(image_bytes or b"")):
+                image = decode_image(image_bytes)
             if image is None:
                 result = self._error(INVALID_IMAGE)
                 _logger.info("AI inference register response: %s", {
@@ -55,92 +138,270 @@ class FaceInferenceService:
             })
 
             faces, embedding = self._single_embedding(image)
-            _logger.info("AI inference register detected faces: %s", {
+            result = self._register_result(image, faces, embedding, request_id=request_id)
+            self._cache_register_result(cache_key, result)
+            return result
+        except Exception:
+            _logger.exception("AI inference register failed: request_id=%s", request_id)
+            return self._error(INTERNAL_ERROR)
+
+    def register_many(self, items, request_id=None):
+        batch = []
+        pending = set()
+        with futures.ThreadPoolExecutor(max_workers=REGISTER_DECODE_WORKERS) as executor:
+            for employee_id, image_bytes in items:
+                # The copied context keeps the decode and detection spans in this request's trace.
+                pending.add(executor.submit(
+                    contextvars.copy_context().run, self._prepare_registration, employee_id, image_bytes, request_id,
+                ))
+                if len(pending) < REGISTER_BATCH_SIZE * 2:
+                    continue
+                done, pending = futures.wait(pending, return_when=futures.FIRST_COMPLETED)
+                batch.extend(future.result() for future in done)
+                if len(batch) >= REGISTER_BATCH_SIZE:
+                    yield from self._finish_registrations(batch, request_id=request_id)
+                    batch = []
+            for future in futures.as_completed(pending):
+                batch.append(future.result())
+                if len(batch) >= REGISTER_BATCH_SIZE:
+                    yield from self._finish_registrations(batch, request_id=request_id)
+                    batch = []
+        if batch:
+            yield from self._finish_registrations(batch, request_id=request_id)
+
+    def _prepare_registration(self, employee_id, image_bytes, request_id=None):
+        item = {
+            "employee_id": int(employee_id),
+            "cache_key": self._register_cache_key(image_bytes),
+            "image": None,
+            "faces": [],
+            "result": None,
+        }
+        try:
+            cached = self.register_cache.get(item["cache_key"])
+            if cached is not None:
+                item["result"] = dict(cached)
+                return item
+            with span("decode", employee_id=int(employee_id), image_size_bytes=len(image_bytes or b"")):
+                image = decode_image(image_bytes)
+            if image is None:
+                item["result"] = self._error(INVALID_IMAGE)
+                return item
+            item["image"] = image
+            with span("detection", employee_id=int(employee_id)):
+                item["faces"] = detect_faces(image)
+        except Exception:
+            _logger.exception("AI inference register prepare failed: %s", {
                 "request_id": request_id,
-                "face_count": len(faces),
-                "faces": [self._face_log_payload(face) for face in faces],
-                "embedding": self._embedding_log_payload(embedding),
+                "employee_id": int(employee_id),
             })
-            if len(faces) == 0:
-                result = self._error(NO_FACE, face_count=0)
-                _logger.info("AI inference register response: %s", {
-                    "request_id": request_id,
-                    **self._response_log_payload(result),
-                })
-                return result
-            if len(faces) > 1:
-                result = self._error(MULTIPLE_FACES, face_count=len(faces))
-                _logger.info("AI inference register response: %s", {
-                    "request_id": request_id,
-                    **self._response_log_payload(result),
-                })
-                return result
-            if embedding is None:
-                result = self._error(EMBEDDING_FAILED, face_count=1, face_box=self._box(faces[0]))
-                _logger.info("AI inference register response: %s", {
-                    "request_id": request_id,
-                    **self._response_log_payload(result),
-                })
-                return result
+            item["result"] = self._error(INTERNAL_ERROR)
+        return item
+
+    def _finish_registrations(self, batch, request_id=None):
+        embeddable = [item for item in batch if item["result"] is None and len(item["faces"]) == 1]
+        try:
+            with span("embedding", batch_size=len(embeddable)):
+                embeddings = extract_embeddings([(item["image"], item["faces"][0]) for item in embeddable])
+        except Exception:
+            _logger.exception("AI inference register batch embedding failed: request_id=%s", request_id)
+            embeddings = [None] * len(embeddable)
+        for item, embedding in zip(embeddable, embeddings):
+            item["embedding"] = embedding
+        _logger.info("AI inference register batch: %s", {
+            "request_id": request_id,
+            "batch_size": len(batch),
+            "embedded_count": sum(1 for embedding in embeddings if embedding is not None),
+        })
+        for item in batch:
+            result = item["result"]
+            if result is None:
+                try:
+                    result = self._register_result(
+                        item["image"],
+                        item["faces"],
+                        item.get("embedding"),
+                        request_id=request_id,
+                    )
+                    self._cache_register_result(item["cache_key"], result)
+                except Exception:
+                    _logger.exception("AI inference register failed: %s", {
+                        "request_id": request_id,
+                        "employee_id": item["employee_id"],
+                    })
+                    result = self._error(INTERNAL_ERROR)
+            yield item["employee_id"], result
+
+    def analyze(self, video_bytes: bytes, candidates, max_frames: int = 7, request_id=None, verbosity=VERBOSITY_FULL, top_k=0):
+        return self._analyze_source(
+            {"video_size_bytes": len(video_bytes or b"")},
+            lambda: hashlib.sha256(video_bytes or b"").digest(),
+            bool(video_bytes),
+            lambda: video_frame_pool(video_bytes, max_frames, FRAME_SPARES_PER_SAMPLE),
+            INVALID_VIDEO,
+            candidates,
+            max_frames,
+            request_id=request_id,
+            candidate_limit=self._candidate_limit(verbosity, top_k),
+        )
+
+    def analyze_frames(self, frame_images, candidates, max_frames: int = 7, request_id=None, verbosity=VERBOSITY_FULL, top_k=0):
+        frame_images = [item for item in (frame_images or []) if item]
+        return self._analyze_source(
+            {
+                "frame_count": len(frame_images),
+                "frames_size_bytes": sum(len(item) for item in frame_images),
+            },
+            lambda: self._frames_digest(frame_images),
+            bool(frame_images),
+            lambda: image_frame_pool(frame_images, max_frames, FRAME_SPARES_PER_SAMPLE),
+            INVALID_FRAMES,
+            candidates,
+            max_frames,
+            request_id=request_id,
+            candidate_limit=self._candidate_limit(verbosity, top_k),
+        )
+
+    def analyze_cache_metrics(self):
+        lookups = self.analyze_cache.hits + self.analyze_cache.misses
+        return {
+            "size": len(self.analyze_cache),
+            "hits": self.analyze_cache.hits,
+            "misses": self.analyze_cache.misses,
+            "hit_rate": round(self.analyze_cache.hits / lookups, 4) if lookups else 0.0,
+            "computations": self.analyze_flight.calls - self.analyze_flight.coalesced,
+            "coalesced": self.analyze_flight.coalesced,
+            "coalesce_rate": round(self.analyze_flight.coalesced / self.analyze_flight.calls, 4) if self.analyze_flight.calls else 0.0,
+        }
+
+    def save_gallery_snapshot(self):
+        """Write the IVF index to GALLERY_SNAPSHOT_PATH if it changed since the last save."""
+        if self.gallery_index is None or not GALLERY_SNAPSHOT_PATH:
+            return None
+        with self._snapshot_lock:
+            revision = self.gallery_index.revision
+            if revision == self._snapshot_revision:
+                return None
+            started_at = time.perf_counter()
+            keys, vectors, centroids, list_ids = self.gallery_index.export()
+            generation = write_gallery_snapshot(
+                GALLERY_SNAPSHOT_PATH, keys, vectors, centroids, list_ids,
+                metadata={"model_name": MODEL_NAME, "index_dtype": GALLERY_INDEX_DTYPE},
+            )
+            self._snapshot_revision = revision
+            self._snapshot_saved_at = time.monotonic()
+        _logger.info("AI gallery snapshot saved: %s", {
+            "path": GALLERY_SNAPSHOT_PATH,
+            "generation": generation,
+            "rows": len(keys),
+            "trained": centroids is not None,
+            "duration_ms": round((time.perf_counter() - started_at) * 1000, 1),
+        })
+        return generation
+
+    def _load_gallery_snapshot(self):
+        started_at = time.perf_counter()
+        try:
+            snapshot = read_gallery_snapshot(GALLERY_SNAPSHOT_PATH)
+        except Exception:
+            _logger.exception("AI gallery snapshot load failed: %s", GALLERY_SNAPSHOT_PATH)
+            return
+        if snapshot is None:
+            return
+        self.gallery_index.restore(snapshot.keys, snapshot.vectors, snapshot.centroids, snapshot.list_ids)
+        self._snapshot_revision = self.gallery_index.revision
+        self._snapshot_saved_at = time.monotonic()
+        _logger.info("AI gallery snapshot loaded: %s", {
+            "path": GALLERY_SNAPSHOT_PATH,
+            "generation": snapshot.generation,
+            "rows": len(snapshot),
+            "trained": snapshot.centroids is not None,
+            "metadata": snapshot.metadata,
+            "load_ms": round((time.perf_counter() - started_at) * 1000, 1),
+        })
+
+    def _schedule_gallery_snapshot(self):
+        if not GALLERY_SNAPSHOT_PATH or self.gallery_index.revision == self._snapshot_revision:
+            return
+        if self._snapshot_lock.locked() or (
+            self._snapshot_saved_at is not None
+            and time.monotonic() - self._snapshot_saved_at < GALLERY_SNAPSHOT_INTERVAL_SECONDS
+        ):
+            return
+        threading.Thread(target=self._save_gallery_snapshot_quietly, daemon=True).start()
 
-            photo_quality = portrait_photo_quality(image, faces[0])
-            _logger.info("AI inference register portrait photo quality: %s", {
+    def _save_gallery_snapshot_quietly(self):
+        try:
+            self.save_gallery_snapshot()
+        except Exception:
+            _logger.exception("AI gallery snapshot save failed: %s", GALLERY_SNAPSHOT_PATH)
+
+    def _analyze_source(
+        self, source_log, source_digest, has_input, load_frames, invalid_code, candidates, max_frames,
+        request_id=None, candidate_limit=None,
+    ):
+        def run():
+            return self._run_analysis(
+                source_log, has_input, load_frames, invalid_code, candidates, max_frames,
+                request_id=request_id, candidate_limit=candidate_limit,
+            )
+
+        if not self.analyze_cache.max_size or not has_input:
+            return run()
+        try:
+            cache_key = self._analyze_cache_key(source_digest(), candidates, max_frames, candidate_limit)
+        except Exception:
+            _logger.exception("AI inference analyze cache key failed: request_id=%s", request_id)
+            return run()
+
+        cached = self.analyze_cache.get(cache_key)
+        if cached is not None:
+            _logger.info("AI inference analyze cache hit: %s", {
                 "request_id": request_id,
-                **photo_quality,
+                **source_log,
+                "cache": self.analyze_cache_metrics(),
             })
-            if not photo_quality["aspect_ratio_ok"]:
-                result = self._error(INVALID_PHOTO_ASPECT_RATIO, face_count=1, face_box=self._box(faces[0]), **photo_quality)
-                _logger.info("AI inference register response: %s", {
-                    "request_id": request_id,
-                    **self._response_log_payload(result),
-                })
-                return result
-            if not photo_quality["background_ok"]:
-                result = self._error(INVALID_PHOTO_BACKGROUND, face_count=1, face_box=self._box(faces[0]), **photo_quality)
-                _logger.info("AI inference register response: %s", {
-                    "request_id": request_id,
-                    **self._response_log_payload(result),
-                })
-                return result
+            return dict(cached)
 
-            embedding = np.asarray(embedding, dtype=np.float32)
-            result = {
-                "status": OK,
-                "message": OK,
-                "embedding": embedding.tolist(),
-                "embedding_dim": int(embedding.shape[0]),
-                "model_name": MODEL_NAME,
-                "face_count": 1,
-                "face_box": self._box(faces[0]),
-                **face_quality(image, faces[0]),
-                **photo_quality,
-            }
-            _logger.info("AI inference register response: %s", {
+        def compute():
+            result = run()
+            if result.get("error_code") != INTERNAL_ERROR:
+                self.analyze_cache.put(cache_key, dict(result))
+            return result
+
+        result, coalesced = self.analyze_flight.do(cache_key, compute)
+        if coalesced:
+            _logger.info("AI inference analyze coalesced: %s", {
                 "request_id": request_id,
-                **self._response_log_payload(result),
+                **source_log,
+                "cache": self.analyze_cache_metrics(),
             })
-            return result
-        except Exception:
-            _logger.exception("AI inference register failed: request_id=%s", request_id)
-            return self._error(INTERNAL_ERROR)
+        return dict(result)
 
-    def analyze(self, video_bytes: bytes, candidates, max_frames: int = 7, request_id=None):
+    def _run_analysis(
+        self, source_log, has_input, load_frames, invalid_code, candidates, max_frames,
+        request_id=None, candidate_limit=None,
+    ):
         try:
             _logger.info("AI inference analyze request: %s", {
                 "request_id": request_id,
-                "video_size_bytes": len(video_bytes or b""),
+                **source_log,
                 "max_frames": int(max_frames or 7),
+                "candidate_limit": candidate_limit,
                 "candidate_count": len(candidates or []),
-                "candidates": [self._candidate_log_payload(candidate) for candidate in (candidates or [])],
+                # Per-candidate detail only when the caller asked for full diagnostics.
+                **({} if candidate_limit is not None else {
+                    "candidates": [self._candidate_log_payload(candidate) for candidate in (candidates or [])],
+                }),
             })
-            if not video_bytes:
-                result = self._error(INVALID_VIDEO)
+            if not has_input:
+                result = self._error(invalid_code)
                 _logger.info("AI inference analyze response: %s", {
                     "request_id": request_id,
                     **self._response_log_payload(result),
                 })
                 return result
-            candidates = [candidate for candidate in candidates if candidate.get("registered_embedding")]
+            candidates = [candidate for candidate in candidates if len(candidate.get("registered_embedding", ()))]
             if not candidates:
                 result = self._error(NO_CANDIDATES)
                 _logger.info("AI inference analyze response: %s", {
@@ -149,9 +410,13 @@ class FaceInferenceService:
                 })
                 return result
 
-            frames = sample_video_frames(video_bytes, max_frames)
+            with span("decode", **source_log) as decode_span:
+                pool = load_frames()
+                if decode_span is not None:
+                    decode_span.set(frame_count=len(pool.frames))
+            frames = pool.frames
             if not frames:
-                result = self._error(INVALID_VIDEO)
+                result = self._error(invalid_code)
                 _logger.info("AI inference analyze response: %s", {
                     "request_id": request_id,
                     **self._response_log_payload(result),
@@ -171,24 +436,69 @@ class FaceInferenceService:
                 ],
             })
 
+            gallery = CandidateGallery(
+                candidates,
+                [self._candidate_key(candidate) for candidate in candidates],
+                index=self.gallery_index,
+                top_k=GALLERY_TOP_K,
+                min_index_size=GALLERY_IVF_MIN_SIZE,
+            )
+            if gallery.approximate:
+                self._schedule_gallery_snapshot()
             scores = defaultdict(list)
             frame_results = []
-            spoofed_count = 0
+            frame_matches = []
             best = {"similarity": -1.0, "frame_index": -1, "candidate": None}
+            replacement_count = 0
+            tracker = FaceTracker() if FACE_TRACKING else None
+            spoofing_sampler = SpoofingSampler()
 
             for frame_index, frame in frames:
-                frame_result, best = self._analyze_frame(frame_index, frame, candidates, scores, best, request_id=request_id)
-                spoofed_count += int(frame_result["spoofing_detected"])
+                frame_result, best, matches = self._analyze_frame(
+                    frame_index, frame, gallery, scores, best,
+                    tracker=tracker, spoofing_sampler=spoofing_sampler, request_id=request_id,
+                    log_limit=candidate_limit,
+                )
+                frame_results.append(frame_result)
+                frame_matches.append(matches)
+                if not frame_result["skip_reasons"] or replacement_count >= FRAME_REPLACEMENT_BUDGET:
+                    continue
+                replacement = pool.replacement(frame_index)
+                if replacement is None:
+                    continue
+                replacement_count += 1
+                _logger.info("AI inference analyze replacement frame: %s", {
+                    "request_id": request_id,
+                    "rejected_frame_index": int(frame_index),
+                    "replacement_frame_index": int(replacement[0]),
+                    "skip_reasons": frame_result["skip_reasons"],
+                })
+                frame_result, best, matches = self._analyze_frame(
+                    *replacement, gallery, scores, best,
+                    tracker=tracker, spoofing_sampler=spoofing_sampler, request_id=request_id,
+                    log_limit=candidate_limit,
+                )
                 frame_results.append(frame_result)
+                frame_matches.append(matches)
+
+            if tracker is not None:
+                _logger.info("AI inference analyze tracking: %s", {
+                    "request_id": request_id,
+                    **tracker.metrics(),
+                })
+
+            spoofed_count = sum(1 for frame in frame_results if frame["spoofing_detected"])
+            spoof_checked_count = sum(1 for frame in frame_results if frame["spoofing_checked"])
 
-            candidate_results, all_scores = self._candidate_results(candidates, scores)
+            candidate_results, all_scores = self._candidate_results(candidates, scores, candidate_limit)
+            self._attach_frame_similarities(gallery, frame_results, frame_matches, candidate_results, candidate_limit)
             result = {
                 "status": OK,
                 "message": OK,
-                "processed_frame_count": len(frames),
+                "processed_frame_count": len(frame_results),
                 "valid_frame_count": sum(1 for frame in frame_results if frame["valid"]),
                 "spoofed_frame_count": spoofed_count,
-                "spoofing_error_rate": float(spoofed_count / len(frames)),
+                "spoofing_error_rate": float(spoofed_count / spoof_checked_count) if spoof_checked_count else 0.0,
                 "best_candidate_user_id": int(best["candidate"]["user_id"]) if best["candidate"] else 0,
                 "best_candidate_employee_id": int(best["candidate"]["employee_id"]) if best["candidate"] else 0,
                 "max_similarity": float(max(all_scores)) if all_scores else 0.0,
@@ -207,17 +517,129 @@ class FaceInferenceService:
             _logger.exception("AI inference analyze failed: request_id=%s", request_id)
             return self._error(INTERNAL_ERROR)
 
-    def _analyze_frame(self, frame_index, frame, candidates, scores, best, request_id=None):
-        spoofing_detected = bool(self.anti_spoofing.verify_no_device_spoofing(frame).get("spoofing_detected"))
-        faces, embedding = self._single_embedding(frame)
-        error_code = self._frame_error(len(faces), spoofing_detected, embedding)
+    def _register_result(self, image, faces, embedding, request_id=None):
+        _logger.info("AI inference register detected faces: %s", {
+            "request_id": request_id,
+            "face_count": len(faces),
+            "faces": [self._face_log_payload(face) for face in faces],
+            "embedding": self._embedding_log_payload(embedding),
+        })
+        if len(faces) == 0:
+            result = self._error(NO_FACE, face_count=0)
+            _logger.info("AI inference register response: %s", {
+                "request_id": request_id,
+                **self._response_log_payload(result),
+            })
+            return result
+        if len(faces) > 1:
+            result = self._error(MULTIPLE_FACES, face_count=len(faces))
+            _logger.info("AI inference register response: %s", {
+                "request_id": request_id,
+                **self._response_log_payload(result),
+            })
+            return result
+        if embedding is None:
+            result = self._error(EMBEDDING_FAILED, face_count=1, face_box=self._box(faces[0]))
+            _logger.info("AI inference register response: %s", {
+                "request_id": request_id,
+                **self._response_log_payload(result),
+            })
+            return result
+
+        photo_quality = portrait_photo_quality(image, faces[0])
+        _logger.info("AI inference register portrait photo quality: %s", {
+            "request_id": request_id,
+            **photo_quality,
+        })
+        if not photo_quality["aspect_ratio_ok"]:
+            result = self._error(INVALID_PHOTO_ASPECT_RATIO, face_count=1, face_box=self._box(faces[0]), **photo_quality)
+            _logger.info("AI inference register response: %s", {
+                "request_id": request_id,
+                **self._response_log_payload(result),
+            })
+            return result
+        if not photo_quality["background_ok"]:
+            result = self._error(INVALID_PHOTO_BACKGROUND, face_count=1, face_box=self._box(faces[0]), **photo_quality)
+            _logger.info("AI inference register response: %s", {
+                "request_id": request_id,
+                **self._response_log_payload(result),
+            })
+            return result
+
+        embedding = np.asarray(embedding, dtype=np.float32)
+        result = {
+            "status": OK,
+            "message": OK,
+            "embedding": embedding.tolist(),
+            "embedding_dim": int(embedding.shape[0]),
+            "model_name": MODEL_NAME,
+            "face_count": 1,
+            "face_box": self._box(faces[0]),
+            **face_quality(image, faces[0]),
+            **photo_quality,
+        }
+        _logger.info("AI inference register response: %s", {
+            "request_id": request_id,
+            **self._response_log_payload(result),
+        })
+        return result
+
+    def _cache_register_result(self, cache_key, result):
+        if result.get("error_code") != INTERNAL_ERROR:
+            self.register_cache.put(cache_key, dict(result))
+
+    def _analyze_frame(
+        self, frame_index, frame, gallery, scores, best,
+        tracker=None, spoofing_sampler=None, request_id=None, log_limit=None,
+    ):
+        spoofing = None
+        frame_faces = futures.Future()
+        if self.spoofing_executor is not None and (spoofing_sampler is None or spoofing_sampler.next_check_due()):
+            # Started before the sampler has seen the faces; dropped below if the frame is not checked.
+            spoofing = self._submit_spoofing(frame_index, frame, frame_faces.result)
+        faces = []
+        try:
+            with span("detection", frame_index=int(frame_index)) as detection_span:
+                faces = tracker.faces(frame) if tracker is not None else detect_faces(frame)
+                tracked = len(faces) == 1 and isinstance(faces[0][4], TrackedFace)
+                quality, skip_reasons = frame_quality_gate(frame, faces[0]) if len(faces) == 1 else ({}, [])
+                if detection_span is not None:
+                    detection_span.set(face_count=len(faces), tracked=tracked, skip_reasons=",".join(skip_reasons))
+        finally:
+            frame_faces.set_result(faces)
+        spoofing_checked = False
+        spoofing_detected = False
+        embedding = None
+        if skip_reasons:
+            error_code = LOW_QUALITY_FRAME
+        else:
+            spoofing_checked = spoofing_sampler is None or spoofing_sampler.should_check(len(faces))
+            if spoofing_checked and spoofing is None:
+                if self.spoofing_executor is not None:
+                    spoofing = self._submit_spoofing(frame_index, frame, frame_faces.result)
+                else:
+                    with span("spoofing", frame_index=int(frame_index)):
+                        spoofing_detected = self._spoofing_detected(frame, frame_faces.result)
+            if len(faces) == 1 and not spoofing_detected:
+                with span("embedding", frame_index=int(frame_index), tracked=tracked):
+                    # Tracked and detected faces both carry landmarks, so they share one alignment path.
+                    embedding = extract_embedding(frame, faces[0])
+            if spoofing_checked and spoofing is not None:
+                spoofing_detected = spoofing.result()
+            error_code = self._frame_error(len(faces), spoofing_detected, embedding)
+        if spoofing is not None and not spoofing_checked:
+            spoofing.cancel()
         result = {
             "frame_index": int(frame_index),
             "valid": not bool(error_code),
             "face_count": len(faces),
             "spoofing_detected": spoofing_detected,
+            "spoofing_checked": spoofing_checked,
             "error_code": error_code,
             "similarity_by_candidate": [],
+            "skip_reasons": skip_reasons,
+            "blur_score": float(quality.get("blur_score", 0.0)),
+            "brightness_score": float(quality.get("brightness_score", 0.0)),
         }
         _logger.info("AI inference analyze frame detection: %s", {
             "request_id": request_id,
@@ -225,40 +647,81 @@ class FaceInferenceService:
             "shape": tuple(int(value) for value in frame.shape),
             "face_count": len(faces),
             "faces": [self._face_log_payload(face) for face in faces],
+            "tracked": tracked,
+            "spoofing_checked": spoofing_checked,
             "spoofing_detected": spoofing_detected,
+            "skip_reasons": skip_reasons,
+            "quality": quality,
             "embedding": self._embedding_log_payload(embedding),
             "error_code": error_code,
         })
         if error_code:
-            return result, best
+            return result, best, []
 
-        current_embedding = np.asarray(embedding, dtype=np.float32)
-        for candidate in candidates:
-            key = self._candidate_key(candidate)
-            similarity = float(compare_embeddings(current_embedding, np.asarray(candidate["registered_embedding"], dtype=np.float32)))
-            scores[key].append(similarity)
-            result["similarity_by_candidate"].append({
-                "user_id": int(candidate["user_id"]),
-                "employee_id": int(candidate["employee_id"]),
-                "similarity": similarity,
-            })
+        with span("scoring", frame_index=int(frame_index), approximate=gallery.approximate):
+            matches = gallery.match(embedding)
+        for position, similarity in matches:
+            candidate = gallery.candidates[position]
+            scores[self._candidate_key(candidate)].append(similarity)
             if similarity > best["similarity"]:
                 best = {"similarity": similarity, "frame_index": int(frame_index), "candidate": candidate}
+        logged = matches if log_limit is None else heapq.nlargest(max(1, log_limit), matches, key=lambda item: item[1])
         _logger.info("AI inference analyze frame similarities: %s", {
             "request_id": request_id,
             "frame_index": int(frame_index),
-            "similarity_by_candidate": result["similarity_by_candidate"],
+            "approximate": gallery.approximate,
+            "match_count": len(matches),
+            "similarity_by_candidate": [self._similarity(gallery.candidates[position], similarity) for position, similarity in logged],
             "best_similarity": best["similarity"],
             "best_candidate": self._candidate_log_payload(best["candidate"]) if best["candidate"] else None,
         })
-        return result, best
+        return result, best, matches
 
-    def _candidate_results(self, candidates, scores):
+    def _submit_spoofing(self, frame_index, frame, frame_faces):
+        def check():
+            with span("spoofing", frame_index=int(frame_index), parallel=True):
+                return self._spoofing_detected(frame, frame_faces)
+
+        # The copied context keeps the span inside this request's trace.
+        return self.spoofing_executor.submit(contextvars.copy_context().run, check)
+
+    def _spoofing_detected(self, frame, frame_faces):
+        return bool(self.anti_spoofing.verify_no_device_spoofing(frame, frame_faces).get("spoofing_detected"))
+
+    def _attach_frame_similarities(self, gallery, frame_results, frame_matches, candidate_results, candidate_limit):
+        if candidate_limit == 0:
+            return
+        kept = None
+        if candidate_limit is not None:
+            kept = {(item["user_id"], item["employee_id"]) for item in candidate_results}
+        for result, matches in zip(frame_results, frame_matches):
+            for position, similarity in matches:
+                candidate = gallery.candidates[position]
+                if kept is None or (int(candidate["user_id"]), int(candidate["employee_id"])) in kept:
+                    result["similarity_by_candidate"].append(self._similarity(candidate, similarity))
+
+    @staticmethod
+    def _similarity(candidate, similarity):
+        return {
+            "user_id": int(candidate["user_id"]),
+            "employee_id": int(candidate["employee_id"]),
+            "similarity": similarity,
+        }
+
+    def _candidate_results(self, candidates, scores, limit=None):
+        all_scores = [value for values in scores.values() for value in values]
+        if limit is not None:
+            # Rank by margin over each candidate's own threshold, so the first
+            # two entries tell whether zero, one or several candidates matched.
+            scored = [candidate for candidate in candidates if scores.get(self._candidate_key(candidate))]
+            candidates = heapq.nlargest(
+                limit,
+                scored,
+                key=lambda candidate: max(scores[self._candidate_key(candidate)]) - float(candidate["threshold"]),
+            )
         results = []
-        all_scores = []
         for candidate in candidates:
             values = scores.get(self._candidate_key(candidate), [])
-            all_scores.extend(values)
             max_similarity = max(values) if values else 0.0
             results.append({
                 "user_id": int(candidate["user_id"]),
@@ -271,10 +734,52 @@ class FaceInferenceService:
             })
         return results, all_scores
 
+    @staticmethod
+    def _register_cache_key(image_bytes):
+        return MODEL_NAME, hashlib.sha256(image_bytes or b"").hexdigest()
+
+    @staticmethod
+    def _frames_digest(frame_images):
+        digest = hashlib.sha256()
+        for item in frame_images:
+            digest.update(len(item).to_bytes(8, "little"))
+            digest.update(item)
+        return digest.digest()
+
+    @staticmethod
+    def _candidate_limit(verbosity, top_k):
+        """None for full diagnostics, otherwise how many candidates to return."""
+        verbosity = (verbosity or VERBOSITY_FULL).lower()
+        if verbosity == VERBOSITY_DECISION:
+            return 0
+        if verbosity == VERBOSITY_TOP_K:
+            return int(top_k) if top_k and int(top_k) > 0 else ANALYZE_TOP_K
+        return None
+
+    @staticmethod
+    def _analyze_cache_key(source_digest, candidates, max_frames, candidate_limit=None):
+        # The candidate set acts as the gallery version: any change to who is
+        # eligible, their threshold, or their embedding yields a new key. Each
+        # embedding contributes its short digest, not its vector.
+        gallery = hashlib.blake2b(digest_size=16)
+        for candidate in candidates or []:
+            digest = candidate.get("embedding_digest")
+            if digest is None:
+                embedding = np.asarray(candidate.get("registered_embedding", ()), dtype=np.float32)
+                digest = embedding_digest(embedding.tobytes(), FLOAT32)
+            gallery.update(_CANDIDATE_KEY.pack(
+                int(candidate["user_id"]), int(candidate["employee_id"]), float(candidate["threshold"]),
+            ) + digest)
+        return MODEL_NAME, source_digest, int(max_frames or 7), candidate_limit, gallery.hexdigest()
+
     @staticmethod
     def _single_embedding(image):
-        faces = detect_faces(image)
-        return faces, extract_embedding(image, faces[0]) if len(faces) == 1 else None
+        with span("detection"):
+            faces = detect_faces(image)
+        if len(faces) != 1:
+            return faces, None
+        with span("embedding"):
+            return faces, extract_embedding(image, faces[0])
 
     @staticmethod
     def _frame_error(face_count, spoofing_detected, embedding):
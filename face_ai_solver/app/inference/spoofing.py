@@ -5,13 +5,15 @@ import os
 import cv2
 import numpy as np
 
-from app.inference.models import get_yolo_detector
+from app.inference.models import get_face_app, get_yolo_detector
 from app.inference.yolo_detector import YOLOv11DeviceDetector
 
 DEVICE_CONFIDENCE_THRESHOLD = float(os.getenv("DEVICE_CONFIDENCE_THRESHOLD", "0.15"))
 DEVICE_DOMINANT_AREA_THRESHOLD = float(os.getenv("DEVICE_DOMINANT_AREA_THRESHOLD", "0.25"))
 FACE_IN_DEVICE_AREA_RATIO = float(os.getenv("FACE_IN_DEVICE_AREA_RATIO", "0.02"))
-INSIGHTFACE_DET_SIZE = int(os.getenv("INSIGHTFACE_DET_SIZE", "640"))
+# "all" checks every frame that passed the quality gate; "faces" only frames with exactly one face.
+SPOOFING_FRAME_POLICY = os.getenv("SPOOFING_FRAME_POLICY", "all").lower()
+SPOOFING_EVERY_N = max(1, int(os.getenv("SPOOFING_EVERY_N", "1")))
 _logger = logging.getLogger(__name__)
 
 
@@ -20,7 +22,9 @@ class AntiSpoofingVerifier:
         self.device_detector = get_yolo_detector() or YOLOv11DeviceDetector()
         self.face_checker = FaceInDeviceChecker()
 
-    def verify_no_device_spoofing(self, image: np.ndarray):
+    def verify_no_device_spoofing(self, image: np.ndarray, frame_faces=None):
+        """``frame_faces`` returns the frame's ``(x, y, w, h, face)`` detections; it is
+        only called once a device needs the face-in-device check."""
         try:
             if not self.device_detector.model_loaded:
                 self.device_detector._load_model_with_progress()
@@ -35,7 +39,7 @@ class AntiSpoofingVerifier:
                 bbox = device["bbox"]
                 if self.device_detector.is_device_dominant(bbox, image.shape[:2], area_threshold=DEVICE_DOMINANT_AREA_THRESHOLD):
                     return self._spoofed(device, "DEVICE_DOMINANT")
-                if self.face_checker.check_face_in_device(image, bbox).get("face_in_device", False):
+                if self.face_checker.check_face_in_device(image, bbox, frame_faces).get("face_in_device", False):
                     return self._spoofed(device, "FACE_IN_DEVICE")
 
             return {"spoofing_detected": False, "reason": "NO_SPOOFING", "verification_passed": True}
@@ -55,36 +59,69 @@ class AntiSpoofingVerifier:
         }
 
 
+class SpoofingSampler:
+    """Per-request choice of which analyzed frames get the device spoofing check."""
+
+    def __init__(self, policy=SPOOFING_FRAME_POLICY, every_n=SPOOFING_EVERY_N):
+        self.policy = policy
+        self.every_n = max(1, int(every_n))
+        self._eligible = 0
+
+    def next_check_due(self):
+        """Whether the next eligible frame will be checked, before its faces are known."""
+        return self._eligible % self.every_n == 0
+
+    def should_check(self, face_count):
+        if self.policy == "faces" and face_count != 1:
+            return False
+        self._eligible += 1
+        return (self._eligible - 1) % self.every_n == 0
+
+
 class FaceInDeviceChecker:
     def __init__(self):
-        try:
-            from insightface.app import FaceAnalysis
-            self.face_detector = FaceAnalysis()
-            self.face_detector.prepare(ctx_id=0, det_size=(INSIGHTFACE_DET_SIZE, INSIGHTFACE_DET_SIZE))
-        except Exception as exc:
-            _logger.error("FACE_IN_DEVICE_INIT_FAILED: %s", exc)
-            self.face_detector = None
-
-    def check_face_in_device(self, image: np.ndarray, device_bbox):
+        # Shares the recognition model pack instead of loading a second copy.
+        self.face_detector = get_face_app()
         if self.face_detector is None:
+            _logger.error("FACE_IN_DEVICE_INIT_FAILED: face model pack unavailable")
+
+    def check_face_in_device(self, image: np.ndarray, device_bbox, frame_faces=None):
+        if self.face_detector is None and frame_faces is None:
             return {"face_in_device": False, "reason": "MODEL_UNAVAILABLE"}
         try:
             region = self._crop(image, device_bbox)
             if not self._active_screen(region):
                 return {"face_in_device": False, "reason": "SCREEN_INACTIVE"}
+            device_area = max(1, (device_bbox[2] - device_bbox[0]) * (device_bbox[3] - device_bbox[1]))
+            # A face the frame detector already found on the screen settles it
+            # without detecting again on the crop.
+            inside = self._faces_inside(frame_faces() if frame_faces is not None else [], device_bbox)
+            if inside:
+                face_area = max(width * height for _x, _y, width, height in inside)
+                return {"face_in_device": face_area / device_area > FACE_IN_DEVICE_AREA_RATIO, "reason": "FRAME_FACE"}
+            if self.face_detector is None:
+                return {"face_in_device": False, "reason": "MODEL_UNAVAILABLE"}
             faces = self.face_detector.get(region)
             if not faces:
                 return {"face_in_device": False, "reason": "NO_FACE_IN_DEVICE"}
 
             face = max(faces, key=lambda item: (item.bbox[2] - item.bbox[0]) * (item.bbox[3] - item.bbox[1]))
             x1, y1, x2, y2 = face.bbox.astype(int)
-            device_area = max(1, (device_bbox[2] - device_bbox[0]) * (device_bbox[3] - device_bbox[1]))
             face_area = max(0, (x2 - x1) * (y2 - y1))
             return {"face_in_device": face_area / device_area > FACE_IN_DEVICE_AREA_RATIO}
         except Exception as exc:
             _logger.error("FACE_IN_DEVICE_CHECK_FAILED: %s", exc)
             return {"face_in_device": False, "reason": "ERROR"}
 
+    @staticmethod
+    def _faces_inside(faces, device_bbox):
+        x1, y1, x2, y2 = device_bbox
+        return [
+            (x, y, width, height)
+            for x, y, width, height, *_face in faces
+            if x1 <= x + width / 2 <= x2 and y1 <= y + height / 2 <= y2
+        ]
+
     @staticmethod
     def _crop(image: np.ndarray, bbox):
         x1, y1, x2, y2 = bbox
@@ -9,5 +9,7 @@ MULTIPLE_FACES = "MULTIPLE_FACES"
 EMBEDDING_FAILED = "EMBEDDING_FAILED"
 INTERNAL_ERROR = "INTERNAL_ERROR"
 INVALID_VIDEO = "INVALID_VIDEO"
+INVALID_FRAMES = "INVALID_FRAMES"
 NO_CANDIDATES = "NO_CANDIDATES"
 SPOOFING_DETECTED = "SPOOFING_DETECTED"
+LOW_QUALITY_FRAME = "LOW_QUALITY_FRAME"
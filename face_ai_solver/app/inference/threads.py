@@ -0,0 +1,135 @@
+"""One thread budget for gRPC handlers, ONNX Runtime, OpenCV and torch.
+
+Every library sizes its own pool to all cores by default, so N concurrent
+requests each fan out to N threads. The planner divides the CPUs this
+container may use among server processes and concurrent requests, and gives
+each request that many threads in every library.
+"""
+import logging
+import os
+
+THREAD_BUDGET = os.getenv("THREAD_BUDGET", "auto").lower()
+# 0 detects the CPUs from the affinity mask and the cgroup CPU quota.
+THREAD_BUDGET_CPUS = int(os.getenv("THREAD_BUDGET_CPUS", "0"))
+GRPC_MAX_WORKERS = max(1, int(os.getenv("GRPC_MAX_WORKERS", "4")))
+CPU_AFFINITY = os.getenv("CPU_AFFINITY", "0").lower() in ("1", "true", "yes")
+_logger = logging.getLogger(__name__)
+
+
+class ThreadBudget:
+    def __init__(self, cpus, processes, grpc_workers, threads_per_request, ort_intra_op, cpu_sets=None):
+        self.cpus = cpus
+        self.processes = processes
+        self.grpc_workers = grpc_workers
+        self.threads_per_request = threads_per_request
+        self.ort_intra_op = ort_intra_op
+        self.ort_inter_op = 1
+        self.cpu_sets = cpu_sets or []
+
+    def as_dict(self):
+        return {
+            "cpus": self.cpus,
+            "processes": self.processes,
+            "grpc_workers": self.grpc_workers,
+            "threads_per_request": self.threads_per_request,
+            "ort_intra_op_threads": self.ort_intra_op,
+            "ort_inter_op_threads": self.ort_inter_op,
+            "cpu_sets": [sorted(cpu_set) for cpu_set in self.cpu_sets],
+        }
+
+
+def available_cpus():
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    quota = _cgroup_cpu_quota()
+    if quota:
+        cpus = min(cpus, max(1, int(quota)))
+    return cpus
+
+
+def _cgroup_cpu_quota():
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as handle:
+            quota, period = handle.read().split()[:2]
+        return None if quota == "max" else int(quota) / int(period)
+    except (OSError, ValueError):
+        pass
+    try:
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as handle:
+            quota = int(handle.read())
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as handle:
+            period = int(handle.read())
+        return quota / period if quota > 0 else None
+    except (OSError, ValueError):
+        return None
+
+
+def plan_thread_budget(processes=1, grpc_workers=GRPC_MAX_WORKERS, cpus=None, forked=False, affinity=CPU_AFFINITY):
+    cpus = cpus or THREAD_BUDGET_CPUS or available_cpus()
+    per_process = max(1, cpus // processes)
+    threads_per_request = max(1, per_process // grpc_workers)
+    # Sessions created before fork lose their intra-op pool threads in the
+    # children, so preforked workers must run ONNX Runtime single-threaded.
+    ort_intra_op = 1 if forked else threads_per_request
+    cpu_sets = []
+    if affinity and processes > 1 and hasattr(os, "sched_getaffinity"):
+        allowed = sorted(os.sched_getaffinity(0))
+        width = max(1, len(allowed) // processes)
+        for slot in range(processes):
+            start = (slot * width) % len(allowed)
+            cpu_sets.append(set(allowed[start:start + width]))
+    return ThreadBudget(cpus, processes, grpc_workers, threads_per_request, ort_intra_op, cpu_sets)
+
+
+def export_ort_environment(budget):
+    """Hand the ONNX Runtime part of ``budget`` to ``ort_session``; call before importing it.
+
+    Explicit ``ORT_*_THREADS`` values are left alone.
+    """
+    for name, value in (("ORT_INTRA_OP_THREADS", budget.ort_intra_op), ("ORT_INTER_OP_THREADS", budget.ort_inter_op)):
+        if os.getenv(name, "").strip() in ("", "0"):
+            os.environ[name] = str(value)
+
+
+def apply_thread_budget(budget, slot=None):
+    """Size the OpenCV and torch pools (and pin CPUs for worker ``slot``) in this process."""
+    if slot is not None and slot < len(budget.cpu_sets):
+        os.sched_setaffinity(0, budget.cpu_sets[slot])
+    import cv2
+    cv2.setNumThreads(budget.threads_per_request)
+    try:
+        import torch
+    except Exception:
+        torch = None
+    if torch is not None:
+        torch.set_num_threads(budget.threads_per_request)
+        try:
+            torch.set_num_interop_threads(1)
+        except RuntimeError:
+            # Only settable before torch runs its first inter-op parallel work.
+            pass
+    return effective_threads()
+
+
+def effective_threads():
+    effective = {
+        "pid": os.getpid(),
+        "ort_intra_op_threads": os.getenv("ORT_INTRA_OP_THREADS", ""),
+        "ort_inter_op_threads": os.getenv("ORT_INTER_OP_THREADS", ""),
+    }
+    try:
+        import cv2
+        effective["opencv_threads"] = cv2.getNumThreads()
+    except Exception:
+        pass
+    try:
+        import torch
+        effective["torch_threads"] = torch.get_num_threads()
+        effective["torch_interop_threads"] = torch.get_num_interop_threads()
+    except Exception:
+        pass
+    if hasattr(os, "sched_getaffinity"):
+        effective["cpu_affinity"] = sorted(os.sched_getaffinity(0))
+    return effective
@@ -0,0 +1,91 @@
+"""Landmark tracking between sampled frames of one analyze request."""
+import os
+
+import cv2
+import numpy as np
+
+from app.inference.face import detect_faces
+
+FACE_TRACKING = os.getenv("FACE_TRACKING", "0").lower() in ("1", "true", "yes")
+FACE_TRACKING_REDETECT_EVERY = max(1, int(os.getenv("FACE_TRACKING_REDETECT_EVERY", "3")))
+FACE_TRACKING_MAX_ERROR = float(os.getenv("FACE_TRACKING_MAX_ERROR", "2.0"))
+_FLOW_PARAMS = {
+    "winSize": (31, 31),
+    "maxLevel": 4,
+    "criteria": (cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 30, 0.01),
+}
+
+
+class TrackedFace:
+    """Detector-free stand-in for an InsightFace face, moved by optical flow."""
+
+    def __init__(self, bbox, kps, det_score):
+        self.bbox = bbox
+        self.kps = kps
+        self.det_score = det_score
+
+
+class FaceTracker:
+    """Runs the detector every few frames and follows the single face in between.
+
+    Landmarks are tracked with pyramidal Lucas-Kanade and checked with a
+    forward-backward pass; any lost point, a drift above ``max_error`` pixels,
+    or a box leaving the frame falls back to full detection.
+    """
+
+    def __init__(self, redetect_every=FACE_TRACKING_REDETECT_EVERY, max_error=FACE_TRACKING_MAX_ERROR):
+        self.redetect_every = max(1, int(redetect_every))
+        self.max_error = float(max_error)
+        self.detections = 0
+        self.tracked = 0
+        self._gray = None
+        self._face = None
+        self._since_detection = 0
+
+    def faces(self, image: np.ndarray):
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+        if self._face is not None and self._since_detection < self.redetect_every:
+            face = self._track(gray)
+            if face is not None:
+                self._remember(gray, face)
+                self._since_detection += 1
+                self.tracked += 1
+                return [face]
+        faces = detect_faces(image)
+        self.detections += 1
+        self._since_detection = 1
+        single = faces[0] if len(faces) == 1 else None
+        if single is not None and getattr(single[4], "kps", None) is not None:
+            self._remember(gray, single)
+        else:
+            self._face = None
+        return faces
+
+    def metrics(self):
+        return {"detections": self.detections, "tracked": self.tracked}
+
+    def _remember(self, gray, face_info):
+        self._gray = gray
+        self._face = face_info
+
+    def _track(self, gray):
+        if self._gray.shape != gray.shape:
+            return None
+        points = np.asarray(self._face[4].kps, dtype=np.float32).reshape(-1, 1, 2)
+        moved, status, _error = cv2.calcOpticalFlowPyrLK(self._gray, gray, points, None, **_FLOW_PARAMS)
+        if moved is None or not status.all():
+            return None
+        back, back_status, _error = cv2.calcOpticalFlowPyrLK(gray, self._gray, moved, None, **_FLOW_PARAMS)
+        if back is None or not back_status.all():
+            return None
+        if float(np.max(np.linalg.norm(back - points, axis=2))) > self.max_error:
+            return None
+
+        shift = np.median((moved - points).reshape(-1, 2), axis=0)
+        x, y, w, h, face = self._face
+        x, y = int(round(x + shift[0])), int(round(y + shift[1]))
+        height, width = gray.shape[:2]
+        if x < 0 or y < 0 or x + w > width or y + h > height:
+            return None
+        bbox = np.array([x, y, x + w, y + h], dtype=np.float32)
+        return x, y, w, h, TrackedFace(bbox, moved.reshape(-1, 2), getattr(face, "det_score", None))
@@ -1,10 +1,15 @@
 import logging
+import os
 from typing import Dict, List, Tuple
 import numpy as np
 
+from app.inference.ort_session import create_session, provider_chain
+
 
 logger = logging.getLogger(__name__)
-YOLO_MODEL = "yolo11n.pt"
+# An exported ``.onnx`` model runs on ONNX Runtime with the "yolo" session options.
+YOLO_MODEL = os.getenv("YOLO_MODEL", "yolo11n.pt")
+YOLO_IMGSZ = int(os.getenv("YOLO_IMGSZ", "640"))
 
 
 class YOLOv11DeviceDetector:
@@ -14,6 +19,7 @@ class YOLOv11DeviceDetector:
         self.model = None
         self.model_loaded = False
         self.device_classes = {}
+        self.provider = "torch"
         self._load_model_with_progress()
 
     def _load_model_with_progress(self):
@@ -30,6 +36,8 @@ class YOLOv11DeviceDetector:
                     self.device_classes["laptop"] = class_id
                 if "tablet" in lower:
                     self.device_classes["tablet"] = class_id
+            if YOLO_MODEL.endswith(".onnx"):
+                self._use_tuned_onnx_session()
             self.model_loaded = True
         except Exception as e:
             logger.error(f"Failed to load YOLO: {e}")
@@ -37,11 +45,30 @@ class YOLOv11DeviceDetector:
             self.device_classes = {}
             self.model_loaded = False
 
+    def _use_tuned_onnx_session(self):
+        # ultralytics opens its own InferenceSession without SessionOptions when
+        # the predictor is first set up; run that once and swap the session.
+        self.model(np.zeros((YOLO_IMGSZ, YOLO_IMGSZ, 3), dtype=np.uint8), imgsz=YOLO_IMGSZ, verbose=False)
+        backend = getattr(self.model.predictor, "model", None)
+        session = getattr(backend, "session", None)
+        if session is None:
+            logger.warning("YOLO ONNX session not found; keeping ultralytics defaults")
+            return
+        backend.session = create_session(YOLO_MODEL, "yolo", provider_chain("yolo", "|".join(session.get_providers())))
+        self.provider = backend.session.get_providers()[0]
+
     def detect_devices(self, image: np.ndarray, confidence_threshold: float = 0.4) -> List[Dict]:
         if not self.model_loaded:
             return []
         try:
-            results = self.model(image, conf=0.1, verbose=False)
+            # Restricting classes inside the call lets NMS skip the other COCO classes.
+            results = self.model(
+                image,
+                conf=0.1,
+                imgsz=YOLO_IMGSZ,
+                classes=sorted(set(self.device_classes.values())) or None,
+                verbose=False,
+            )
             detected = []
             for result in results:
                 boxes = result.boxes
@@ -1,12 +1,30 @@
 import logging
 import os
+import signal
 from pathlib import Path
 
 from dotenv import load_dotenv
 
 load_dotenv(Path(__file__).with_name(".env"))
 
-from app.grpc.server import create_grpc_server
+SERVER_WORKERS = max(1, int(os.getenv("SERVER_WORKERS", "1")))
+PREFORK = SERVER_WORKERS > 1 and hasattr(os, "fork")
+
+from app.inference.threads import THREAD_BUDGET, apply_thread_budget, export_ort_environment, plan_thread_budget
+
+# The ONNX Runtime part of the budget must be in the environment before the
+# inference modules read their settings.
+thread_budget = plan_thread_budget(SERVER_WORKERS, forked=PREFORK)
+if THREAD_BUDGET == "off":
+    thread_budget = None
+    if PREFORK and os.getenv("ORT_INTRA_OP_THREADS", "").strip() in ("", "0"):
+        # ONNX Runtime's intra-op pool threads do not survive fork.
+        os.environ["ORT_INTRA_OP_THREADS"] = "1"
+else:
+    export_ort_environment(thread_budget)
+
+from app.grpc.server import FaceRecognitionGrpcService, create_grpc_server
+from app.inference.models import validate_providers
 
 
 def main():
@@ -14,10 +32,32 @@ def main():
         level=getattr(logging, os.getenv("LOG_LEVEL", "INFO").upper(), logging.INFO),
         format="%(asctime)s %(levelname)s %(name)s %(message)s",
     )
-    server = create_grpc_server()
-    server.add_insecure_port(f"[::]:{os.getenv('GRPC_PORT', '50051')}")
+    address = f"[::]:{os.getenv('GRPC_PORT', '50051')}"
+    logging.getLogger(__name__).info("AI model provider chains: %s", validate_providers())
+    if PREFORK:
+        from app.grpc.prefork import serve_preforked
+        serve_preforked(address, SERVER_WORKERS, thread_budget)
+        return
+    if thread_budget is not None:
+        logging.getLogger(__name__).info("AI thread budget: %s", {
+            **thread_budget.as_dict(),
+            "effective": apply_thread_budget(thread_budget),
+        })
+    servicer = FaceRecognitionGrpcService()
+    server = create_grpc_server(servicer)
+    server.add_insecure_port(address)
     server.start()
+
+    def stop(signum, _frame):
+        server.stop(grace=5)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
     server.wait_for_termination()
+    try:
+        servicer.inference.save_gallery_snapshot()
+    except Exception:
+        logging.getLogger(__name__).exception("AI gRPC server could not save the gallery snapshot")
 
 
 if __name__ == "__main__":
@@ -0,0 +1 @@
+"""Offline benchmarks and maintenance tools for the face AI service."""
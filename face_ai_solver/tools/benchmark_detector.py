@@ -0,0 +1,125 @@
+"""Per-frame latency of the Haar "lite" detector against InsightFace, detection and embedding.
+
+The ``*_detect`` modes time the Haar cascade alone. The ``*_frame`` modes time
+what a frame costs in the service: detection, then ``extract_embeddings`` for
+every face found. For Haar boxes that includes the small SCRFD landmark pass
+on each crop. The frame modes are skipped when the model pack is not loaded.
+Run from ``face_ai_solver``::
+
+    python -m tools.benchmark_detector --size 640x480 1920x1080 --image portrait.jpg
+"""
+import argparse
+import json
+import time
+
+import cv2
+import numpy as np
+
+from app.inference import face
+from app.inference.media import decode_image
+from app.inference.models import get_face_app
+
+
+def uncached_full_resolution(image):
+    # The fallback as it used to be: parse the cascade XML on every call.
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    cascade = cv2.CascadeClassifier(face.HAAR_CASCADE_PATH)
+    return cascade.detectMultiScale(
+        gray,
+        scaleFactor=face.SCALE_FACTOR,
+        minNeighbors=face.MIN_NEIGHBORS,
+        minSize=face.MIN_FACE_SIZE,
+        flags=cv2.CASCADE_SCALE_IMAGE,
+    )
+
+
+def synthetic_image(width, height, seed):
+    random = np.random.default_rng(seed)
+    image = cv2.resize(random.integers(0, 255, (height // 8, width // 8, 3), dtype=np.uint8), (width, height))
+    center = (width // 2, height // 2)
+    axes = (max(1, min(width, height) // 6), max(1, min(width, height) // 5))
+    cv2.ellipse(image, center, axes, 0, 0, 360, (140, 170, 210), -1)
+    return image
+
+
+def time_call(function, image, repeat):
+    function(image)
+    started_at = time.perf_counter()
+    for _ in range(repeat):
+        found = function(image)
+    return (time.perf_counter() - started_at) * 1000 / repeat, len(found)
+
+
+def insightface_faces(image):
+    faces = []
+    for item in face._app_faces(get_face_app(), face._as_bgr_uint8(image)):
+        x, y, x2, y2 = item.bbox.astype(int)
+        faces.append((x, y, x2 - x, y2 - y, item))
+    return faces
+
+
+def whole_frame(detect):
+    def call(image):
+        faces = detect(image)
+        embeddings = face.extract_embeddings([(image, face_info) for face_info in faces])
+        return [embedding for embedding in embeddings if embedding is not None]
+    return call
+
+
+def run(images, repeat, max_side):
+    modes = {
+        "uncached_detect": uncached_full_resolution,
+        "lite_detect": lambda image: face._detect_faces_opencv(image, max_side=0),
+        "lite_downscaled_detect": lambda image: face._detect_faces_opencv(image, max_side=max_side),
+    }
+    if get_face_app() is not None:
+        modes.update({
+            "lite_frame": whole_frame(lambda image: face._detect_faces_opencv(image, max_side=0)),
+            "lite_downscaled_frame": whole_frame(lambda image: face._detect_faces_opencv(image, max_side=max_side)),
+            "insightface_frame": whole_frame(insightface_faces),
+        })
+    rows = []
+    for name, image in images:
+        for mode, function in modes.items():
+            latency_ms, face_count = time_call(function, image, repeat)
+            rows.append({
+                "image": name,
+                "mode": mode,
+                "latency_ms": round(latency_ms, 2),
+                # Faces found by *_detect modes, faces embedded by *_frame modes.
+                "face_count": face_count,
+            })
+    return {"repeat": repeat, "max_side": max_side, "results": rows}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", nargs="*", default=["640x480", "1280x720", "1920x1080"])
+    parser.add_argument("--image", nargs="*", default=[], help="Real photos to include.")
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--max-side", type=int, default=face.HAAR_MAX_SIDE or 640)
+    parser.add_argument("--json", help="Write the report to this path as JSON.")
+    args = parser.parse_args()
+
+    images = []
+    for size in args.size:
+        width, height = (int(value) for value in size.lower().split("x"))
+        images.append((size, synthetic_image(width, height, seed=len(images))))
+    for path in args.image:
+        with open(path, "rb") as handle:
+            image = decode_image(handle.read())
+        if image is not None:
+            images.append((path, image))
+
+    report = run(images, args.repeat, args.max_side)
+    print(f"repeat={report['repeat']} max_side={report['max_side']}")
+    print(f"{'image':<24}{'mode':<24}{'latency_ms':>12}{'faces':>7}")
+    for row in report["results"]:
+        print(f"{row['image']:<24}{row['mode']:<24}{row['latency_ms']:>12}{row['face_count']:>7}")
+    if args.json:
+        with open(args.json, "w") as handle:
+            json.dump(report, handle, indent=2)
+
+
+if __name__ == "__main__":
+    main()
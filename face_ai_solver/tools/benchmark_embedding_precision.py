@@ -0,0 +1,72 @@
+"""Similarity error, size, and decode cost of packed embedding encodings.
+
+Run from ``face_ai_solver``::
+
+    python -m tools.benchmark_embedding_precision --size 20000
+
+Exits non-zero when an encoding drifts past its similarity error bound.
+"""
+import argparse
+import json
+import sys
+import time
+
+import numpy as np
+
+from app.inference.embedding_codec import FLOAT16, FLOAT32, INT8, decode_embedding, encode_embedding
+from app.inference.gallery import embedding_matrix
+
+ERROR_BOUNDS = {FLOAT32: 0.0, FLOAT16: 2e-3, INT8: 2e-2}
+
+
+def run(size, dim, queries, seed):
+    random = np.random.default_rng(seed)
+    gallery = embedding_matrix(random.standard_normal((size, dim)))
+    probes = embedding_matrix(random.standard_normal((queries, dim)))
+    reference = probes @ gallery.T
+
+    rows = []
+    for encoding, bound in ERROR_BOUNDS.items():
+        packed = [encode_embedding(vector, encoding) for vector in gallery]
+        started_at = time.perf_counter()
+        decoded = np.stack([decode_embedding(item, encoding) for item in packed])
+        decode_us = (time.perf_counter() - started_at) * 1e6 / size
+        error = np.abs(probes @ embedding_matrix(decoded).T - reference)
+        rows.append({
+            "encoding": encoding,
+            "bytes_per_embedding": len(packed[0]),
+            "decode_us": round(decode_us, 3),
+            "max_abs_error": float(error.max()),
+            "mean_abs_error": float(error.mean()),
+            "bound": bound,
+            "within_bound": bool(error.max() <= bound + 1e-6),
+        })
+    return {"size": size, "dim": dim, "queries": queries, "results": rows}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=512)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Write the report to this path as JSON.")
+    args = parser.parse_args()
+
+    report = run(args.size, args.dim, args.queries, args.seed)
+    print(f"gallery={report['size']}x{report['dim']} queries={report['queries']}")
+    print(f"{'encoding':<10}{'bytes':>7}{'decode_us':>11}{'max_err':>11}{'mean_err':>11}{'bound':>8}")
+    for row in report["results"]:
+        print(
+            f"{row['encoding']:<10}{row['bytes_per_embedding']:>7}{row['decode_us']:>11}"
+            f"{row['max_abs_error']:>11.2e}{row['mean_abs_error']:>11.2e}{row['bound']:>8}"
+        )
+    if args.json:
+        with open(args.json, "w") as handle:
+            json.dump(report, handle, indent=2)
+    if not all(row["within_bound"] for row in report["results"]):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""Recall-vs-latency benchmark of the IVF gallery index against brute force.
+
+Run from ``face_ai_solver``::
+
+    python -m tools.benchmark_gallery --size 50000 --nprobe 1 4 8 16 32
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+from app.inference.gallery import IvfFlatIndex, embedding_matrix
+
+
+def synthetic_gallery(size, dim, clusters, spread, seed):
+    random = np.random.default_rng(seed)
+    centers = embedding_matrix(random.standard_normal((clusters, dim)))
+    members = centers[random.integers(0, clusters, size)] + spread * random.standard_normal((size, dim)) / np.sqrt(dim)
+    return embedding_matrix(members)
+
+
+def synthetic_probes(gallery, count, noise, seed):
+    random = np.random.default_rng(seed + 1)
+    targets = random.integers(0, len(gallery), count)
+    probes = gallery[targets] + noise * random.standard_normal((count, gallery.shape[1])) / np.sqrt(gallery.shape[1])
+    return targets, embedding_matrix(probes)
+
+
+def run(size, dim, clusters, spread, noise, queries, k, nlist, nprobes, seed):
+    gallery = synthetic_gallery(size, dim, clusters, spread, seed)
+    targets, probes = synthetic_probes(gallery, queries, noise, seed)
+
+    started_at = time.perf_counter()
+    exact = [np.argsort(-(gallery @ probe))[:k] for probe in probes]
+    brute_ms = (time.perf_counter() - started_at) * 1000 / queries
+
+    index = IvfFlatIndex(nlist=nlist, min_train_size=1)
+    started_at = time.perf_counter()
+    index.upsert(list(range(size)), gallery)
+    build_s = time.perf_counter() - started_at
+
+    rows = [{
+        "mode": "brute_force",
+        "nprobe": None,
+        "latency_ms": round(brute_ms, 3),
+        "recall_at_k": 1.0,
+        "top1_identity_rate": float(np.mean([found[0] == target for found, target in zip(exact, targets)])),
+    }]
+    for nprobe in nprobes:
+        index.nprobe = nprobe
+        started_at = time.perf_counter()
+        approximate = [[key for key, _score in index.search(probe, k)] for probe in probes]
+        latency_ms = (time.perf_counter() - started_at) * 1000 / queries
+        recall = np.mean([len(set(found) & set(truth.tolist())) / k for found, truth in zip(approximate, exact)])
+        rows.append({
+            "mode": "ivf_flat",
+            "nprobe": nprobe,
+            "latency_ms": round(latency_ms, 3),
+            "recall_at_k": round(float(recall), 4),
+            "top1_identity_rate": float(np.mean([bool(found) and found[0] == target for found, target in zip(approximate, targets)])),
+        })
+    return {
+        "size": size,
+        "dim": dim,
+        "k": k,
+        "nlist": len(index._lists),
+        "build_seconds": round(build_s, 3),
+        "results": rows,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=50000)
+    parser.add_argument("--dim", type=int, default=512)
+    parser.add_argument("--clusters", type=int, default=256)
+    parser.add_argument("--spread", type=float, default=2.0)
+    parser.add_argument("--noise", type=float, default=1.0)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nlist", type=int, default=0)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 8, 16, 32])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Write the report to this path as JSON.")
+    args = parser.parse_args()
+
+    report = run(
+        args.size, args.dim, args.clusters, args.spread, args.noise,
+        args.queries, args.k, args.nlist, args.nprobe, args.seed,
+    )
+    print(f"gallery={report['size']}x{report['dim']} nlist={report['nlist']} k={report['k']} build={report['build_seconds']}s")
+    print(f"{'mode':<12}{'nprobe':>8}{'latency_ms':>12}{'recall@k':>10}{'top1_id':>9}")
+    for row in report["results"]:
+        print(f"{row['mode']:<12}{str(row['nprobe'] or '-'):>8}{row['latency_ms']:>12}{row['recall_at_k']:>10}{row['top1_identity_rate']:>9.3f}")
+    if args.json:
+        with open(args.json, "w") as handle:
+            json.dump(report, handle, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""Latency of the face models on each available ONNX Runtime execution provider.
+
+Outputs are compared against the CPU provider on the same inputs. Run from
+``face_ai_solver``::
+
+    python -m tools.benchmark_providers --providers cpu openvino --repeat 50
+"""
+import argparse
+import glob
+import json
+import os
+import time
+
+import numpy as np
+import onnxruntime
+
+from app.inference.models import INSIGHTFACE_MODEL, INSIGHTFACE_MODULES, _model_task
+from app.inference.ort_session import create_session, parse_provider_chain
+
+DEFAULT_PROVIDERS = ["cpu", "openvino", "dnnl", "xnnpack"]
+
+
+def model_files(model_dir):
+    files = {}
+    for onnx_file in sorted(glob.glob(os.path.join(model_dir, "*.onnx"))):
+        taskname, _model_class = _model_task(onnx_file)
+        if taskname and taskname not in files and (not INSIGHTFACE_MODULES or taskname in INSIGHTFACE_MODULES):
+            files[taskname] = onnx_file
+    return files
+
+
+def model_inputs(session, det_size, seed):
+    random = np.random.default_rng(seed)
+    inputs = {}
+    for item in session.get_inputs():
+        shape = [dim if isinstance(dim, int) and dim > 0 else (1 if index == 0 else det_size) for index, dim in enumerate(item.shape)]
+        inputs[item.name] = random.standard_normal(shape).astype(np.float32)
+    return inputs
+
+
+def output_drift(reference, outputs):
+    drift = 0.0
+    for left, right in zip(reference, outputs):
+        left, right = np.ravel(left).astype(np.float64), np.ravel(right).astype(np.float64)
+        scale = max(float(np.max(np.abs(left))), 1e-6)
+        drift = max(drift, float(np.max(np.abs(left - right))) / scale)
+    return drift
+
+
+def run(files, providers, repeat, det_size):
+    rows = []
+    for role, onnx_file in files.items():
+        reference = None
+        for provider in providers:
+            try:
+                chain = parse_provider_chain(provider, role)
+                session = create_session(onnx_file, role, chain)
+            except Exception as exc:
+                rows.append({"model": role, "provider": provider, "error": str(exc)})
+                continue
+            inputs = model_inputs(session, det_size, seed=0)
+            outputs = session.run(None, inputs)
+            latencies = []
+            for _ in range(repeat):
+                started_at = time.perf_counter()
+                session.run(None, inputs)
+                latencies.append((time.perf_counter() - started_at) * 1000)
+            if reference is None and session.get_providers()[0] == "CPUExecutionProvider":
+                reference = outputs
+            rows.append({
+                "model": role,
+                "provider": provider,
+                "active": session.get_providers()[0],
+                "mean_ms": round(float(np.mean(latencies)), 2),
+                "p95_ms": round(float(np.percentile(latencies, 95)), 2),
+                "relative_drift": round(output_drift(reference, outputs), 6) if reference is not None else None,
+            })
+    return {"available": onnxruntime.get_available_providers(), "repeat": repeat, "results": rows}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--providers", nargs="*", default=DEFAULT_PROVIDERS, help="Start with cpu so drift has a reference.")
+    parser.add_argument("--model-dir", default=os.path.expanduser(os.path.join("~/.insightface/models", INSIGHTFACE_MODEL)))
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--det-size", type=int, default=640)
+    parser.add_argument("--json", help="Write the report to this path as JSON.")
+    args = parser.parse_args()
+
+    report = run(model_files(args.model_dir), args.providers, args.repeat, args.det_size)
+    print(f"available={','.join(report['available'])} repeat={report['repeat']}")
+    print(f"{'model':<14}{'provider':<12}{'active':<28}{'mean_ms':>10}{'p95_ms':>10}{'drift':>12}")
+    for row in report["results"]:
+        if "error" in row:
+            print(f"{row['model']:<14}{row['provider']:<12}error: {row['error']}")
+            continue
+        print(
+            f"{row['model']:<14}{row['provider']:<12}{row['active']:<28}"
+            f"{row['mean_ms']:>10}{row['p95_ms']:>10}{str(row['relative_drift']):>12}"
+        )
+    if args.json:
+        with open(args.json, "w") as handle:
+            json.dump(report, handle, indent=2)
+
+
+if __name__ == "__main__":
+    main()
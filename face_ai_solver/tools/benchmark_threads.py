@@ -0,0 +1,132 @@
+"""Throughput and latency of concurrent requests across thread configurations.
+
+Each configuration runs in a fresh process, because ONNX Runtime and torch
+fix their pool sizes when the first session or op is created. Run from
+``face_ai_solver``::
+
+    python -m tools.benchmark_threads --concurrency 1 4 8 --threads 1 2 4 --image portrait.jpg
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent import futures
+
+import numpy as np
+
+
+def request_latencies(images, concurrency, requests, spoofing):
+    from app.inference.face import detect_faces, extract_embedding
+    from app.inference.spoofing import AntiSpoofingVerifier
+
+    verifier = AntiSpoofingVerifier() if spoofing else None
+
+    def handle(index):
+        image = images[index % len(images)]
+        started_at = time.perf_counter()
+        if verifier is not None:
+            verifier.verify_no_device_spoofing(image)
+        faces = detect_faces(image)
+        if faces:
+            extract_embedding(image, faces[0])
+        return (time.perf_counter() - started_at) * 1000
+
+    for index in range(len(images)):
+        handle(index)
+    started_at = time.perf_counter()
+    with futures.ThreadPoolExecutor(max_workers=concurrency) as executor:
+        latencies = list(executor.map(handle, range(requests)))
+    return latencies, time.perf_counter() - started_at
+
+
+def load_images(paths, size):
+    from app.inference.media import decode_image
+
+    images = []
+    for path in paths:
+        with open(path, "rb") as handle:
+            image = decode_image(handle.read())
+        if image is not None:
+            images.append(image)
+    if not images:
+        width, height = (int(value) for value in size.lower().split("x"))
+        random = np.random.default_rng(0)
+        images.append(random.integers(0, 255, (height, width, 3), dtype=np.uint8))
+    return images
+
+
+def run_configuration(args):
+    from app.inference.threads import ThreadBudget, apply_thread_budget
+
+    budget = ThreadBudget(os.cpu_count(), 1, args.concurrency[0], args.threads[0], args.threads[0])
+    effective = apply_thread_budget(budget)
+    latencies, elapsed = request_latencies(load_images(args.image, args.size), args.concurrency[0], args.requests, args.spoofing)
+    print(json.dumps({
+        "concurrency": args.concurrency[0],
+        "threads": args.threads[0],
+        "requests_per_second": round(args.requests / elapsed, 2),
+        "p50_ms": round(float(np.percentile(latencies, 50)), 2),
+        "p95_ms": round(float(np.percentile(latencies, 95)), 2),
+        "effective": effective,
+    }))
+
+
+def sweep(args):
+    from app.inference.threads import available_cpus, plan_thread_budget
+
+    rows = []
+    for concurrency in args.concurrency:
+        planned = plan_thread_budget(grpc_workers=concurrency).threads_per_request
+        for threads in args.threads:
+            env = {
+                **os.environ,
+                "THREAD_BUDGET": "off",
+                "ORT_INTRA_OP_THREADS": str(threads),
+                "ORT_INTER_OP_THREADS": "1",
+            }
+            command = [
+                sys.executable, "-m", "tools.benchmark_threads", "--run",
+                "--concurrency", str(concurrency), "--threads", str(threads),
+                "--requests", str(args.requests), "--size", args.size,
+                *(["--image", *args.image] if args.image else []),
+                *(["--spoofing"] if args.spoofing else []),
+            ]
+            output = subprocess.run(command, env=env, check=True, capture_output=True, text=True).stdout
+            row = json.loads(output.strip().splitlines()[-1])
+            row["planned"] = threads == planned
+            rows.append(row)
+    return {"cpus": available_cpus(), "requests": args.requests, "results": rows}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", nargs="*", type=int, default=[1, 2, 4, 8])
+    parser.add_argument("--threads", nargs="*", type=int, default=[1, 2, 4])
+    parser.add_argument("--requests", type=int, default=64)
+    parser.add_argument("--image", nargs="*", default=[], help="Face photos to send; a noise image otherwise.")
+    parser.add_argument("--size", default="640x480")
+    parser.add_argument("--spoofing", action="store_true", help="Include the YOLO device check in each request.")
+    parser.add_argument("--json", help="Write the report to this path as JSON.")
+    parser.add_argument("--run", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.run:
+        run_configuration(args)
+        return
+
+    report = sweep(args)
+    print(f"cpus={report['cpus']} requests={report['requests']}  (* = planner's choice)")
+    print(f"{'concurrency':>12}{'threads':>9}{'req/s':>9}{'p50_ms':>10}{'p95_ms':>10}")
+    for row in report["results"]:
+        print(
+            f"{row['concurrency']:>12}{row['threads']:>9}{row['requests_per_second']:>9}"
+            f"{row['p50_ms']:>10}{row['p95_ms']:>10}{' *' if row['planned'] else ''}"
+        )
+    if args.json:
+        with open(args.json, "w") as handle:
+            json.dump(report, handle, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,275 @@
+"""Match accuracy and per-stage throughput of the inference service per configuration.
+
+The dataset is a local directory::
+
+    dataset/enroll/<person>/*.jpg           registration photos (first usable one per person)
+    dataset/probes/<person>/*.mp4|*.jpg     login clips or single frames; unenrolled people are impostors
+
+Every probe is scored against the whole enrolled gallery through
+``FaceInferenceService.register`` / ``analyze``. A configuration is a set of
+environment overrides and runs in a fresh process, since the service reads
+its settings at import. Run from ``face_ai_solver``::
+
+    python -m tools.evaluate dataset/ --config baseline: \\
+        --config det320:INSIGHTFACE_DET_SIZE=320 --config frames3:MAX_ANALYZE_FRAMES=3
+"""
+import argparse
+import functools
+import json
+import logging
+import os
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+import numpy as np
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+VIDEO_EXTENSIONS = (".mp4", ".avi", ".mov", ".mkv", ".webm")
+
+
+def dataset_files(root, section, extensions):
+    files = []
+    base = os.path.join(root, section)
+    for person in sorted(os.listdir(base)) if os.path.isdir(base) else []:
+        folder = os.path.join(base, person)
+        if not os.path.isdir(folder):
+            continue
+        for name in sorted(os.listdir(folder)):
+            if name.lower().endswith(extensions):
+                files.append((person, os.path.join(folder, name)))
+    return files
+
+
+def timed(name, call, stages):
+    from app.inference.tracing import start_trace
+
+    started_at = time.perf_counter()
+    with start_trace(name) as trace:
+        result = call()
+    elapsed_ms = (time.perf_counter() - started_at) * 1000
+    for item in trace.spans[1:]:
+        stages[item.name].append((item.end_ns - item.start_ns) / 1e6)
+    stages[name].append(elapsed_ms)
+    return result
+
+
+def evaluate(root, max_frames):
+    from app.inference.service import FaceInferenceService
+
+    service = FaceInferenceService()
+    stages = defaultdict(list)
+    people = {}
+    enroll_failures = defaultdict(int)
+    for person, path in dataset_files(root, "enroll", IMAGE_EXTENSIONS):
+        if person in people:
+            continue
+        with open(path, "rb") as handle:
+            result = timed("register", functools.partial(service.register, handle.read()), stages)
+        if result.get("embedding"):
+            employee_id = len(people) + 1
+            people[person] = {
+                "user_id": employee_id,
+                "employee_id": employee_id,
+                "threshold": 0.0,
+                "registered_embedding": result["embedding"],
+            }
+        else:
+            enroll_failures[result.get("error_code") or "UNKNOWN"] += 1
+    candidates = list(people.values())
+    identity = {candidate["employee_id"]: person for person, candidate in people.items()}
+
+    genuine, impostor, probes = [], [], []
+    for person, path in dataset_files(root, "probes", IMAGE_EXTENSIONS + VIDEO_EXTENSIONS):
+        with open(path, "rb") as handle:
+            payload = handle.read()
+        if path.lower().endswith(VIDEO_EXTENSIONS):
+            call = functools.partial(service.analyze, payload, candidates, max_frames)
+        else:
+            call = functools.partial(service.analyze_frames, [payload], candidates, max_frames)
+        result = timed("analyze", call, stages)
+        scores = {identity[item["employee_id"]]: item["max_similarity"] for item in result.get("candidates", [])}
+        for candidate_person, score in scores.items():
+            (genuine if candidate_person == person else impostor).append(score)
+        probes.append({
+            "person": person,
+            "enrolled": person in people,
+            "status": result.get("status"),
+            "error_code": result.get("error_code", ""),
+            "best": identity.get(result.get("best_candidate_employee_id")),
+            "best_score": result.get("max_similarity", 0.0),
+            "scores": scores,
+            "frames": result.get("processed_frame_count", 0),
+            "valid_frames": result.get("valid_frame_count", 0),
+            "spoofed_frames": result.get("spoofed_frame_count", 0),
+            "spoofing_error_rate": result.get("spoofing_error_rate", 0.0),
+        })
+    return {
+        "enrolled": len(people),
+        "enroll_failures": dict(enroll_failures),
+        "genuine": genuine,
+        "impostor": impostor,
+        "probes": probes,
+        "stages_ms": {name: values for name, values in stages.items()},
+    }
+
+
+def login_decision(probe, threshold, min_valid_frames=1, max_spoofing_error_rate=0.0):
+    """The person a probe logs in as under ``res.users._select_face_scan_match``, or None.
+
+    Every candidate shares ``threshold`` here, where Odoo uses each employee's own.
+    """
+    if probe["status"] != "OK":
+        return None
+    matches = [person for person, score in probe["scores"].items() if score >= threshold]
+    if len(matches) != 1:
+        return None
+    if probe["valid_frames"] < max(1, min_valid_frames):
+        return None
+    if probe["spoofing_error_rate"] > max_spoofing_error_rate:
+        return None
+    return matches[0]
+
+
+def summarize(raw, thresholds, min_valid_frames=1, max_spoofing_error_rate=0.0):
+    genuine, impostor = np.array(raw["genuine"], dtype=float), np.array(raw["impostor"], dtype=float)
+    summary = {
+        "enrolled": raw["enrolled"],
+        "enroll_failures": raw["enroll_failures"],
+        "probes": len(raw["probes"]),
+        "probe_errors": sum(1 for probe in raw["probes"] if probe["error_code"]),
+        "genuine": _distribution(genuine),
+        "impostor": _distribution(impostor),
+        "rank1_accuracy": _ratio(
+            sum(1 for probe in raw["probes"] if probe["enrolled"] and probe["best"] == probe["person"]),
+            sum(1 for probe in raw["probes"] if probe["enrolled"]),
+        ),
+        "thresholds": [],
+        "stages": {
+            name: {
+                "count": len(values),
+                "mean_ms": round(float(np.mean(values)), 2),
+                "p95_ms": round(float(np.percentile(values, 95)), 2),
+                "per_second": round(1000 / float(np.mean(values)), 2) if np.mean(values) else None,
+            }
+            for name, values in sorted(raw["stages_ms"].items())
+        },
+    }
+    for threshold in thresholds:
+        decisions = [
+            (probe, login_decision(probe, threshold, min_valid_frames, max_spoofing_error_rate))
+            for probe in raw["probes"]
+        ]
+        summary["thresholds"].append({
+            "threshold": threshold,
+            "far": _ratio(int(np.sum(impostor >= threshold)), len(impostor)),
+            "frr": _ratio(int(np.sum(genuine < threshold)), len(genuine)),
+            "false_logins": sum(1 for probe, person in decisions if person and person != probe["person"]),
+            "rejected_logins": sum(1 for probe, person in decisions if probe["enrolled"] and person is None),
+            "ambiguous_logins": sum(
+                1 for probe, _person in decisions
+                if probe["status"] == "OK" and sum(1 for score in probe["scores"].values() if score >= threshold) > 1
+            ),
+        })
+    summary["eer"] = _equal_error_rate(genuine, impostor)
+    return summary
+
+
+def _distribution(values):
+    if not len(values):
+        return {"count": 0}
+    return {
+        "count": int(len(values)),
+        "mean": round(float(values.mean()), 4),
+        "std": round(float(values.std()), 4),
+        "p5": round(float(np.percentile(values, 5)), 4),
+        "p50": round(float(np.percentile(values, 50)), 4),
+        "p95": round(float(np.percentile(values, 95)), 4),
+    }
+
+
+def _equal_error_rate(genuine, impostor):
+    if not len(genuine) or not len(impostor):
+        return None
+    best = None
+    for threshold in np.unique(np.concatenate([genuine, impostor])):
+        far, frr = np.mean(impostor >= threshold), np.mean(genuine < threshold)
+        if best is None or abs(far - frr) < best[0]:
+            best = (abs(far - frr), (far + frr) / 2, threshold)
+    return {"rate": round(float(best[1]), 4), "threshold": round(float(best[2]), 4)}
+
+
+def _ratio(count, total):
+    return round(count / total, 4) if total else None
+
+
+def parse_config(value):
+    name, _, assignments = value.partition(":")
+    overrides = {}
+    for item in assignments.split(","):
+        key, separator, setting = item.partition("=")
+        if separator:
+            overrides[key.strip()] = setting.strip()
+    return name, overrides
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("dataset")
+    parser.add_argument("--config", action="append", default=[], help="name:KEY=VALUE,KEY=VALUE (repeatable)")
+    parser.add_argument("--config-file", help="JSON object of configuration name to environment overrides.")
+    parser.add_argument("--threshold", nargs="*", type=float, default=[0.3, 0.4, 0.5, 0.6, 0.7])
+    parser.add_argument("--max-frames", type=int, default=7)
+    parser.add_argument("--min-valid-frames", type=int, default=1, help="Company face_min_valid_frames for login decisions.")
+    parser.add_argument(
+        "--max-spoofing-error-rate", type=float, default=0.0,
+        help="Company face_max_spoofing_error_rate for login decisions.",
+    )
+    parser.add_argument("--json", help="Write the report to this path as JSON.")
+    parser.add_argument("--run", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.run:
+        logging.basicConfig(level=os.getenv("LOG_LEVEL", "WARNING").upper())
+        print(json.dumps(evaluate(args.dataset, args.max_frames)))
+        return
+
+    configs = dict(parse_config(value) for value in args.config)
+    if args.config_file:
+        with open(args.config_file) as handle:
+            configs.update(json.load(handle))
+    configs = configs or {"baseline": {}}
+
+    report = {"dataset": os.path.abspath(args.dataset), "configurations": {}}
+    for name, overrides in configs.items():
+        env = {**os.environ, "LOG_LEVEL": "WARNING", **{key: str(value) for key, value in overrides.items()}}
+        command = [sys.executable, "-m", "tools.evaluate", args.dataset, "--run", "--max-frames", str(args.max_frames)]
+        output = subprocess.run(command, env=env, check=True, capture_output=True, text=True).stdout
+        raw = json.loads(output.strip().splitlines()[-1])
+        report["configurations"][name] = {"overrides": overrides, **summarize(
+            raw, args.threshold, args.min_valid_frames, args.max_spoofing_error_rate,
+        )}
+
+    print(f"{'configuration':<16}{'rank1':>8}{'eer':>8}{'genuine':>9}{'impostor':>10}{'register_ms':>13}{'analyze_ms':>12}")
+    for name, summary in report["configurations"].items():
+        stages = summary["stages"]
+        print(
+            f"{name:<16}{str(summary['rank1_accuracy']):>8}{str((summary['eer'] or {}).get('rate')):>8}"
+            f"{str(summary['genuine'].get('mean')):>9}{str(summary['impostor'].get('mean')):>10}"
+            f"{str(stages.get('register', {}).get('mean_ms')):>13}{str(stages.get('analyze', {}).get('mean_ms')):>12}"
+        )
+    for name, summary in report["configurations"].items():
+        print(f"\n{name}: " + ", ".join(f"{stage} {values['mean_ms']} ms" for stage, values in summary["stages"].items()))
+        print(f"{'threshold':>10}{'far':>8}{'frr':>8}{'false_logins':>14}{'rejected_logins':>17}{'ambiguous':>11}")
+        for row in summary["thresholds"]:
+            print(
+                f"{row['threshold']:>10}{str(row['far']):>8}{str(row['frr']):>8}"
+                f"{row['false_logins']:>14}{row['rejected_logins']:>17}{row['ambiguous_logins']:>11}"
+            )
+    if args.json:
+        with open(args.json, "w") as handle:
+            json.dump(report, handle, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""Inspect a gallery snapshot, or time writing and reopening a synthetic one.
+
+Run from ``face_ai_solver``::
+
+    python -m tools.gallery_snapshot ~/.insightface/gallery/gallery.json
+    python -m tools.gallery_snapshot --synthetic 100000 --nlist 316
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from app.inference.gallery import IvfFlatIndex, embedding_matrix
+from app.inference.gallery_store import read_gallery_snapshot, write_gallery_snapshot
+
+
+def inspect(path, queries):
+    started_at = time.perf_counter()
+    snapshot = read_gallery_snapshot(path)
+    if snapshot is None:
+        raise SystemExit(f"No gallery snapshot at {path}")
+    open_ms = (time.perf_counter() - started_at) * 1000
+    index = IvfFlatIndex(nlist=len(snapshot.centroids) if snapshot.centroids is not None else 0)
+    started_at = time.perf_counter()
+    index.restore(snapshot.keys, snapshot.vectors, snapshot.centroids, snapshot.list_ids)
+    restore_ms = (time.perf_counter() - started_at) * 1000
+    search_ms = []
+    random = np.random.default_rng(0)
+    for row in random.integers(0, len(snapshot), size=queries) if len(snapshot) else []:
+        started_at = time.perf_counter()
+        index.search(snapshot.vectors[row], 10)
+        search_ms.append((time.perf_counter() - started_at) * 1000)
+    return {
+        "path": os.path.abspath(path),
+        "generation": snapshot.generation,
+        "rows": len(snapshot),
+        "dim": int(snapshot.vectors.shape[1]),
+        "centroids": 0 if snapshot.centroids is None else len(snapshot.centroids),
+        "metadata": snapshot.metadata,
+        "open_ms": round(open_ms, 2),
+        "restore_ms": round(restore_ms, 2),
+        "first_search_ms": round(search_ms[0], 2) if search_ms else None,
+        "search_mean_ms": round(float(np.mean(search_ms)), 2) if search_ms else None,
+    }
+
+
+def synthetic(rows, dim, nlist, directory, queries):
+    random = np.random.default_rng(0)
+    index = IvfFlatIndex(nlist=nlist, min_train_size=rows + 1)
+    keys = [(row + 1, row + 1) for row in range(rows)]
+    index.upsert(keys, embedding_matrix(random.standard_normal((rows, dim)).astype(np.float32)))
+    started_at = time.perf_counter()
+    index.train()
+    train_ms = (time.perf_counter() - started_at) * 1000
+    path = os.path.join(directory, "gallery.json")
+    started_at = time.perf_counter()
+    write_gallery_snapshot(path, *index.export(), metadata={"synthetic": True})
+    write_ms = (time.perf_counter() - started_at) * 1000
+    report = inspect(path, queries)
+    report.update({"train_ms": round(train_ms, 2), "write_ms": round(write_ms, 2)})
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("path", nargs="?", help="Snapshot sidecar (GALLERY_SNAPSHOT_PATH).")
+    parser.add_argument("--synthetic", type=int, help="Build a random gallery with this many rows instead.")
+    parser.add_argument("--dim", type=int, default=512)
+    parser.add_argument("--nlist", type=int, default=0, help="IVF lists for the synthetic gallery; 0 is sqrt(rows).")
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("--json", help="Write the report to this path as JSON.")
+    args = parser.parse_args()
+    if args.synthetic:
+        with tempfile.TemporaryDirectory() as directory:
+            report = synthetic(args.synthetic, args.dim, args.nlist, directory, args.queries)
+    elif args.path:
+        report = inspect(os.path.expanduser(args.path), args.queries)
+    else:
+        parser.error("Pass a snapshot path or --synthetic ROWS.")
+
+    for key, value in report.items():
+        print(f"{key:<16}{value}")
+    if args.json:
+        with open(args.json, "w") as handle:
+            json.dump(report, handle, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,295 @@
+"""INT8 quantization of the face detector and recognizer, and an FP32 comparison report.
+
+Calibration inputs are built locally: from ``--images`` when given (a flat
+directory, or one sub-directory per person), otherwise from seeded synthetic
+images. The same images feed the report. Run from ``face_ai_solver``::
+
+    python -m tools.quantize_models quantize --images calibration/ --mode static
+    python -m tools.quantize_models report --images holdout/ --json int8_report.json
+
+The service loads the result when ``INSIGHTFACE_INT8=detection,recognition``.
+"""
+import argparse
+import glob
+import hashlib
+import itertools
+import json
+import os
+import time
+
+import cv2
+import numpy as np
+import onnxruntime
+from insightface.utils import face_align
+from onnxruntime.quantization import (
+    CalibrationDataReader,
+    CalibrationMethod,
+    QuantFormat,
+    QuantType,
+    quantize_dynamic,
+    quantize_static,
+)
+from onnxruntime.quantization.shape_inference import quant_pre_process
+
+from app.inference.media import decode_image
+from app.inference.models import INSIGHTFACE_INT8_DIR, INSIGHTFACE_MODEL, _model_task
+from app.inference.ort_session import create_session
+
+TASKS = ("detection", "recognition")
+_CALIBRATION_METHODS = {
+    "minmax": CalibrationMethod.MinMax,
+    "entropy": CalibrationMethod.Entropy,
+    "percentile": CalibrationMethod.Percentile,
+}
+
+
+class _Inputs(CalibrationDataReader):
+    def __init__(self, input_name, blobs):
+        self._items = iter([{input_name: blob} for blob in blobs])
+
+    def get_next(self):
+        return next(self._items, None)
+
+
+def load_images(images_dir, count, size, seed):
+    """(label, image) pairs, sorted for reproducibility; synthetic when no directory is given."""
+    items = []
+    if images_dir:
+        for path in sorted(glob.glob(os.path.join(images_dir, "**", "*"), recursive=True)):
+            if not path.lower().endswith((".jpg", ".jpeg", ".png", ".bmp", ".webp")):
+                continue
+            with open(path, "rb") as handle:
+                image = decode_image(handle.read())
+            if image is not None:
+                label = os.path.relpath(os.path.dirname(path), images_dir)
+                items.append((label if label != "." else path, image))
+        return items[:count] if count else items
+    random = np.random.default_rng(seed)
+    for index in range(count or 32):
+        base = random.integers(0, 255, (size // 16, size // 16, 3), dtype=np.uint8)
+        image = cv2.resize(base, (size, size), interpolation=cv2.INTER_CUBIC)
+        center = tuple(int(value) for value in random.integers(size // 4, 3 * size // 4, 2))
+        axes = (int(random.integers(size // 10, size // 5)), int(random.integers(size // 8, size // 4)))
+        cv2.ellipse(image, center, axes, 0, 0, 360, tuple(int(value) for value in random.integers(90, 230, 3)), -1)
+        items.append((f"synthetic-{index}", image))
+    return items
+
+
+def model_files(model_dir):
+    files = {}
+    for onnx_file in sorted(glob.glob(os.path.join(model_dir, "*.onnx"))):
+        taskname, model_class = _model_task(onnx_file)
+        if taskname in TASKS and taskname not in files:
+            files[taskname] = (onnx_file, model_class)
+    return files
+
+
+def load_model(files, taskname, session_file=None, det_size=640):
+    onnx_file, model_class = files[taskname]
+    session = create_session(session_file or onnx_file, taskname, ["CPUExecutionProvider"])
+    model = model_class(model_file=onnx_file, session=session)
+    if taskname == "detection":
+        model.prepare(0, input_size=(det_size, det_size), det_thresh=0.5)
+    else:
+        model.prepare(0)
+    return model
+
+
+def detection_blob(image, det_size):
+    # Same letterbox and normalization as RetinaFace.detect.
+    scale = min(det_size / image.shape[0], det_size / image.shape[1])
+    resized = cv2.resize(image, (int(image.shape[1] * scale), int(image.shape[0] * scale)))
+    canvas = np.zeros((det_size, det_size, 3), dtype=np.uint8)
+    canvas[:resized.shape[0], :resized.shape[1]] = resized
+    return cv2.dnn.blobFromImage(canvas, 1.0 / 128, (det_size, det_size), (127.5, 127.5, 127.5), swapRB=True)
+
+
+def face_crops(detector, images):
+    """Aligned 112x112 crops of the largest FP32-detected face per image."""
+    crops = []
+    for label, image in images:
+        boxes, kpss = detector.detect(image, max_num=1)
+        if boxes is not None and len(boxes) and kpss is not None:
+            crops.append((label, face_align.norm_crop(image, landmark=kpss[0])))
+    return crops
+
+
+def recognition_blob(recognizer, crop):
+    return cv2.dnn.blobFromImage(
+        crop,
+        1.0 / recognizer.input_std,
+        recognizer.input_size,
+        (recognizer.input_mean,) * 3,
+        swapRB=True,
+    )
+
+
+def quantize(args):
+    files = model_files(args.model_dir)
+    images = load_images(args.images, args.samples, args.det_size, args.seed)
+    detector = load_model(files, "detection", det_size=args.det_size)
+    blobs = {"detection": [detection_blob(image, args.det_size) for _label, image in images]}
+    if "recognition" in args.tasks:
+        recognizer = load_model(files, "recognition")
+        crops = face_crops(detector, images) or [(label, cv2.resize(image, (112, 112))) for label, image in images]
+        blobs["recognition"] = [recognition_blob(recognizer, crop) for _label, crop in crops]
+
+    os.makedirs(args.output, exist_ok=True)
+    manifest = {
+        "model": INSIGHTFACE_MODEL,
+        "mode": args.mode,
+        "calibration": args.calibration,
+        "seed": args.seed,
+        "onnxruntime": onnxruntime.__version__,
+        "images": args.images or "synthetic",
+        "models": {},
+    }
+    for taskname in args.tasks:
+        onnx_file, _model_class = files[taskname]
+        output = _quantized_file(args, files, taskname)
+        started_at = time.perf_counter()
+        if args.mode == "dynamic":
+            quantize_dynamic(onnx_file, output, weight_type=QuantType.QInt8)
+        else:
+            input_name = onnxruntime.InferenceSession(onnx_file, providers=["CPUExecutionProvider"]).get_inputs()[0].name
+            source = f"{output}.pre.onnx"
+            try:
+                quant_pre_process(onnx_file, source)
+            except Exception as exc:
+                print(f"{taskname}: pre-processing skipped ({exc})")
+                source = onnx_file
+            quantize_static(
+                source,
+                output,
+                _Inputs(input_name, blobs[taskname]),
+                quant_format=QuantFormat.QDQ,
+                per_channel=True,
+                activation_type=QuantType.QUInt8,
+                weight_type=QuantType.QInt8,
+                calibrate_method=_CALIBRATION_METHODS[args.calibration],
+            )
+            if source != onnx_file:
+                os.remove(source)
+        manifest["models"][taskname] = {
+            "source": os.path.basename(onnx_file),
+            "source_sha256": _sha256(onnx_file),
+            "output_sha256": _sha256(output),
+            "calibration_samples": len(blobs[taskname]) if args.mode == "static" else 0,
+            "seconds": round(time.perf_counter() - started_at, 1),
+        }
+        print(f"{taskname}: {output}")
+    with open(os.path.join(args.output, "quantization.json"), "w") as handle:
+        json.dump(manifest, handle, indent=2)
+    return manifest
+
+
+def report(args):
+    files = model_files(args.model_dir)
+    images = load_images(args.images, args.samples, args.det_size, args.seed)
+    result = {"images": len(images), "thresholds": args.threshold}
+
+    detectors = {
+        "fp32": load_model(files, "detection", det_size=args.det_size),
+        "int8": load_model(files, "detection", _quantized_file(args, files, "detection"), args.det_size),
+    }
+    detections = {name: [] for name in detectors}
+    latency = {}
+    for name, detector in detectors.items():
+        started_at = time.perf_counter()
+        for _label, image in images:
+            boxes, _kpss = detector.detect(image, max_num=1)
+            detections[name].append(boxes[0][:4] if boxes is not None and len(boxes) else None)
+        latency[f"detection_{name}_ms"] = round((time.perf_counter() - started_at) * 1000 / max(1, len(images)), 2)
+    both = [(left, right) for left, right in zip(detections["fp32"], detections["int8"]) if left is not None and right is not None]
+    result["detection"] = {
+        "fp32_found": sum(box is not None for box in detections["fp32"]),
+        "int8_found": sum(box is not None for box in detections["int8"]),
+        "mean_iou": round(float(np.mean([_iou(left, right) for left, right in both])), 4) if both else None,
+    }
+
+    crops = face_crops(detectors["fp32"], images)
+    recognizers = {
+        "fp32": load_model(files, "recognition"),
+        "int8": load_model(files, "recognition", _quantized_file(args, files, "recognition")),
+    }
+    embeddings = {}
+    for name, recognizer in recognizers.items():
+        started_at = time.perf_counter()
+        features = np.vstack([recognizer.get_feat(crop) for _label, crop in crops]) if crops else np.zeros((0, 512))
+        latency[f"recognition_{name}_ms"] = round((time.perf_counter() - started_at) * 1000 / max(1, len(crops)), 2)
+        embeddings[name] = features / np.maximum(np.linalg.norm(features, axis=1, keepdims=True), 1e-12)
+    drift = np.sum(embeddings["fp32"] * embeddings["int8"], axis=1) if crops else np.zeros(0)
+    result["embedding_cosine_fp32_vs_int8"] = {
+        "faces": len(crops),
+        "mean": round(float(drift.mean()), 5) if len(drift) else None,
+        "p5": round(float(np.percentile(drift, 5)), 5) if len(drift) else None,
+        "min": round(float(drift.min()), 5) if len(drift) else None,
+    }
+
+    pairs = list(itertools.combinations(range(len(crops)), 2))
+    scores = {name: np.array([float(matrix[i] @ matrix[j]) for i, j in pairs]) for name, matrix in embeddings.items()}
+    genuine = np.array([crops[i][0] == crops[j][0] for i, j in pairs], dtype=bool)
+    result["decisions"] = []
+    for threshold in args.threshold:
+        fp32_match, int8_match = scores["fp32"] >= threshold, scores["int8"] >= threshold
+        row = {
+            "threshold": threshold,
+            "pairs": len(pairs),
+            "flipped": int(np.sum(fp32_match != int8_match)),
+            "max_score_delta": round(float(np.max(np.abs(scores["fp32"] - scores["int8"]))), 5) if pairs else None,
+        }
+        if args.images and genuine.any() and (~genuine).any():
+            for name, match in (("fp32", fp32_match), ("int8", int8_match)):
+                row[f"{name}_frr"] = round(float(np.mean(~match[genuine])), 4)
+                row[f"{name}_far"] = round(float(np.mean(match[~genuine])), 4)
+        result["decisions"].append(row)
+    result["latency"] = latency
+    return result
+
+
+def _quantized_file(args, files, taskname):
+    # Same file name as the FP32 model, which is what the service loader expects.
+    return os.path.join(args.output, os.path.basename(files[taskname][0]))
+
+
+def _iou(left, right):
+    x1, y1 = max(left[0], right[0]), max(left[1], right[1])
+    x2, y2 = min(left[2], right[2]), min(left[3], right[3])
+    inter = max(0.0, x2 - x1) * max(0.0, y2 - y1)
+    union = (left[2] - left[0]) * (left[3] - left[1]) + (right[2] - right[0]) * (right[3] - right[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as handle:
+        for chunk in iter(lambda: handle.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("command", choices=["quantize", "report"])
+    parser.add_argument("--model-dir", default=os.path.expanduser(os.path.join("~/.insightface/models", INSIGHTFACE_MODEL)))
+    parser.add_argument("--output", default=INSIGHTFACE_INT8_DIR)
+    parser.add_argument("--images", help="Photo directory; seeded synthetic images otherwise.")
+    parser.add_argument("--samples", type=int, default=0, help="Use at most this many images (0 = all, 32 synthetic).")
+    parser.add_argument("--tasks", nargs="*", choices=TASKS, default=list(TASKS))
+    parser.add_argument("--mode", choices=["static", "dynamic"], default="static")
+    parser.add_argument("--calibration", choices=sorted(_CALIBRATION_METHODS), default="minmax")
+    parser.add_argument("--det-size", type=int, default=640)
+    parser.add_argument("--threshold", nargs="*", type=float, default=[0.4, 0.5, 0.6])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Write the manifest or report to this path as JSON.")
+    args = parser.parse_args()
+
+    output = quantize(args) if args.command == "quantize" else report(args)
+    print(json.dumps(output, indent=2))
+    if args.json:
+        with open(args.json, "w") as handle:
+            json.dump(output, handle, indent=2)
+
+
+if __name__ == "__main__":
+    main()